@@ -0,0 +1,98 @@
+"""
+Connections Benchmark
+
+Fetches the pages of a local synthetic website keeping its connections open,
+with a new connection per request as separate calls to `requests.get` do,
+then through the pooled session of the transport without and with its DNS
+cache, and prints the latency percentiles of the requests along with the
+connections opened by the server and reused by the client.
+
+The site is reached through the "localhost" host name, so that each new
+connection also resolves it.
+
+Usage:
+    PYTHONPATH=srcs python -m benchmarks.bench_connections [--requests N] [--threads N]
+"""
+
+import time
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from benchmarks.site import serve_site
+from tools import metrics, transport
+
+MODES = {
+    "fresh": None,
+    "pooled": 0,
+    "pooled+dns": 300,
+}
+
+
+def percentile(values: list, percent: float) -> float:
+    """Returns a percentile of a list of values."""
+    values = sorted(values)
+    return values[min(int(len(values) * percent / 100), len(values) - 1)]
+
+
+def fetch(get, url: str) -> float:
+    """Fetches a URL and returns the time it took."""
+    start = time.perf_counter()
+    response = get(url, timeout=transport.DEFAULT_TIMEOUT)
+    response.content  # pylint: disable=pointless-statement
+    return time.perf_counter() - start
+
+
+def run(args) -> None:
+    """
+    Fetches the pages of the synthetic website once per mode and prints the
+    results.
+
+    Args:
+        args (argparse.Namespace): The benchmark options.
+    """
+    for name, dns_ttl in MODES.items():
+        counter = {}
+        collector = metrics.Metrics()
+        metrics.configure(collector)
+        if dns_ttl is None:
+            get = requests.get
+        else:
+            transport.configure_connections(pool_size=args.threads, dns_ttl=dns_ttl)
+            get = transport.get
+        try:
+            with serve_site(
+                counter=counter, pages=args.requests, keep_alive=True
+            ) as url:
+                url = url.replace("127.0.0.1", "localhost")
+                urls = [f"{url}/page/{number}" for number in range(args.requests)]
+                start = time.perf_counter()
+                with ThreadPoolExecutor(args.threads) as executor:
+                    latencies = list(executor.map(lambda page: fetch(get, page), urls))
+                elapsed = time.perf_counter() - start
+        finally:
+            metrics.configure(None)
+
+        reused = collector.snapshot()["connections"].get("reused", 0)
+        print(
+            f"{name:<11} requests/s={len(urls) / elapsed:7.1f} "
+            f"p50={percentile(latencies, 50) * 1000:5.2f}ms "
+            f"p99={percentile(latencies, 99) * 1000:6.2f}ms "
+            f"connections={counter.get('connections', 0):<5} reused={reused}"
+        )
+    transport.configure_connections()
+
+
+def main():
+    """Parses the benchmark options and runs it."""
+    parser = argparse.ArgumentParser(description="Benchmarks connection reuse.")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Link Extraction Benchmark
+
+Compares the time spent extracting the references of a page with a full
+BeautifulSoup tree and with the streaming `LinkExtractor`, fed whole and in
+chunks. BeautifulSoup is only measured when it is installed.
+
+It then compares the regular expression that used to select the files to
+download among the `<a href>` and `<img src>` of a page with the compiled
+`FileMatcher` applied to every reference.
+
+Usage:
+    PYTHONPATH=srcs python -m benchmarks.bench_extract [--page PATH] [--repeat N]
+"""
+
+import argparse
+import re
+import time
+from tools.extract import extract_references, iter_references
+from tools.matcher import FileMatcher
+from tools.scrape import PAGE_CHUNK_SIZE, extract_files
+from tools.url_utils import clean_url
+
+# The references BeautifulSoup used to be asked for
+SOUP_REFERENCES = (("a", "href"), ("link", "href"), ("img", "src"))
+
+EXTENSIONS = ["jpg", "jpeg", "gif", "png", "bmp", "svg", "webp", "ico"]
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+
+def soup_references(content: str) -> set:
+    """
+    Extracts the references of a page by building a BeautifulSoup tree, as
+    the scraper did before.
+
+    Args:
+        content (str): The HTML content of the page.
+
+    Returns:
+        set: The referenced values.
+    """
+    soup = BeautifulSoup(content, "html.parser")
+    values = set(a.get("href") for a in soup.find_all(["a", "link"]) if a.get("href"))
+    values.update(img.get("src") for img in soup.find_all("img") if img.get("src"))
+    return values
+
+
+def streaming_references(content: str, chunk_size: int = None) -> set:
+    """
+    Extracts the references of a page with the streaming `LinkExtractor`.
+
+    Args:
+        content (str): The HTML content of the page.
+        chunk_size (int): The size of the chunks fed to the parser, or None to
+            feed the page whole.
+
+    Returns:
+        set: The referenced values.
+    """
+    if chunk_size is None:
+        _, references = extract_references(content)
+    else:
+        chunks = (
+            content[i : i + chunk_size] for i in range(0, len(content), chunk_size)
+        )
+        references = iter_references(chunks)
+    return set(
+        value
+        for tag, attribute, value in references
+        if value and (tag, attribute) in SOUP_REFERENCES
+    )
+
+
+def regex_files(content: str, webpage: str) -> set:
+    """
+    Selects the files of a page with the regular expression built for every
+    page before the extensions were compiled.
+
+    Args:
+        content (str): The HTML content of the page.
+        webpage (str): The URL of the page.
+
+    Returns:
+        set: The file URLs.
+    """
+    _, references = extract_references(content)
+    links = set(value for tag, _, value in references if tag in ("a", "img"))
+    pattern = r"(?:.(?!https?:\/\/))+.({})($|\?)".format("|".join(EXTENSIONS))
+    files = set()
+    for link in links:
+        word = re.search(pattern, link)
+        if word is not None:
+            files.add(clean_url(webpage, word.group(0)))
+    return files
+
+
+def matcher_files(content: str, webpage: str, matcher: FileMatcher) -> set:
+    """
+    Selects the files of a page with a compiled `FileMatcher`.
+
+    Args:
+        content (str): The HTML content of the page.
+        webpage (str): The URL of the page.
+        matcher (FileMatcher): The compiled extensions.
+
+    Returns:
+        set: The file URLs.
+    """
+    _, references = extract_references(content)
+    return extract_files(references, webpage, matcher)
+
+
+def measure(function, content: str, repeat: int) -> tuple:
+    """
+    Runs an extraction several times.
+
+    Args:
+        function (callable): The extraction function.
+        content (str): The HTML content of the page.
+        repeat (int): The number of runs.
+
+    Returns:
+        tuple: The references found and the mean time per run in milliseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        values = function(content)
+    return values, (time.perf_counter() - start) * 1000 / repeat
+
+
+def run(page: str, repeat: int) -> None:
+    """
+    Measures each extractor on a page and checks they agree.
+
+    Args:
+        page (str): The path of the HTML page.
+        repeat (int): The number of runs per extractor.
+    """
+    with open(page, "r", encoding="utf-8") as file:
+        content = file.read()
+
+    extractors = {
+        "streaming": streaming_references,
+        "streaming-chunked": lambda c: streaming_references(c, PAGE_CHUNK_SIZE // 8),
+    }
+    if BeautifulSoup is not None:
+        extractors = {"beautifulsoup": soup_references, **extractors}
+    else:
+        print("beautifulsoup4 is not installed, only the streaming parser is measured")
+
+    results = {}
+    for name, function in extractors.items():
+        results[name], elapsed = measure(function, content, repeat)
+        print(f"{name:<18} references={len(results[name]):<5} time={elapsed:8.2f}ms")
+
+    assert all(values == results["streaming"] for values in results.values())
+
+    webpage = "https://42.fr/"
+    matcher = FileMatcher(EXTENSIONS)
+    for name, function in {
+        "regex-files": lambda c: regex_files(c, webpage),
+        "matcher-files": lambda c: matcher_files(c, webpage, matcher),
+    }.items():
+        files, elapsed = measure(function, content, repeat)
+        print(f"{name:<18} files={len(files):<10} time={elapsed:8.2f}ms")
+
+
+def main():
+    """Parses the benchmark options and runs it."""
+    parser = argparse.ArgumentParser(description="Benchmarks the link extractors.")
+    parser.add_argument("--page", default="assets/page.html")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    run(args.page, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+HTTP/2 Benchmark
+
+Crawls a local synthetic website over HTTP/1.1 with connections kept open,
+then with its pages compressed, then over HTTP/2 with its pages compressed,
+and prints the crawl time, the connections opened by the server and the
+bytes of the pages transferred.
+
+Usage:
+    PYTHONPATH=srcs python -m benchmarks.bench_http2 [--pages N] [--concurrency N]
+"""
+
+import time
+import argparse
+import logging
+import tempfile
+from benchmarks.h2site import serve_h2_site
+from benchmarks.site import SiteConfig, render_page, serve_site
+from tools import transport
+from tools.pipeline import run_pipeline
+
+SETUPS = {
+    "http/1.1": (serve_site, False, None),
+    "http/1.1+compress": (serve_site, True, None),
+    "http/2+compress": (serve_h2_site, True, "prior-knowledge"),
+}
+
+
+def run(args) -> None:
+    """
+    Crawls the synthetic website once per setup and prints the results.
+
+    Args:
+        args (argparse.Namespace): The benchmark options.
+    """
+    options = {
+        "pages": args.pages,
+        "fanout": args.fanout,
+        "latency": args.latency,
+        "markup": args.markup,
+        "keep_alive": True,
+    }
+    config = SiteConfig(**options)
+    page_bytes = sum(len(render_page(number, config)) for number in range(args.pages))
+
+    for name, (serve, compress, http2) in SETUPS.items():
+        counter = {}
+        transport.configure_connections(pool_size=args.concurrency, http2=http2)
+        try:
+            with serve(counter=counter, compress=compress, **options) as base_url:
+                with tempfile.TemporaryDirectory() as directory:
+                    start = time.perf_counter()
+                    result = run_pipeline(
+                        base_url,
+                        100,
+                        ["png"],
+                        directory,
+                        (args.concurrency, 1, args.concurrency),
+                    )
+                    elapsed = time.perf_counter() - start
+        finally:
+            transport.configure_connections()
+
+        # The HTTP/1.1 site counts the compressed pages, the HTTP/2 site every body
+        transferred = counter.get("bytes", page_bytes) if compress else page_bytes
+        if http2 is not None:
+            transferred -= result.downloaded * config.image_size
+        print(
+            f"{name:<18} pages={result.html_pages:<5} files={result.downloaded:<5} "
+            f"time={elapsed:6.2f}s connections={counter.get('connections', 0):<4} "
+            f"page_kb={transferred / 1024:8.1f}"
+        )
+
+
+def main():
+    """Parses the benchmark options and runs it."""
+    parser = argparse.ArgumentParser(description="Benchmarks HTTP/2 crawls.")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--markup", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
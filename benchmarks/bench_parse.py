@@ -0,0 +1,69 @@
+"""
+Parse Pool Benchmark
+
+Crawls a local synthetic website of markup-heavy pages with the pipeline,
+parsing the pages in threads and then in a growing number of processes, and
+prints the pages parsed per second. Parsing only scales with processes on a
+machine with several cores.
+
+Usage:
+    PYTHONPATH=srcs python -m benchmarks.bench_parse [--pages N] [--markup N]
+"""
+
+import os
+import argparse
+import logging
+import tempfile
+import time
+from benchmarks.site import serve_site
+from tools.pipeline import run_pipeline
+
+
+def run(pages: int, markup: int, processes: list, fetch_workers: int) -> None:
+    """
+    Crawls the synthetic website once per number of processes and prints
+    timings.
+
+    Args:
+        pages (int): The total number of pages of the site.
+        markup (int): The number of extra elements in each page.
+        processes (list): The numbers of parse processes, 0 parsing in threads.
+        fetch_workers (int): The number of fetch threads.
+    """
+    with serve_site(pages=pages, fanout=5, markup=markup) as base_url:
+        for count in processes:
+            with tempfile.TemporaryDirectory() as directory:
+                start = time.perf_counter()
+                result = run_pipeline(
+                    base_url,
+                    100,
+                    ["png"],
+                    directory,
+                    workers=(fetch_workers, fetch_workers, 4),
+                    parse_processes=count,
+                )
+                elapsed = time.perf_counter() - start
+            name = f"processes={count}" if count else "threads"
+            print(
+                f"{name:<14} pages={len(result.pages):<6} time={elapsed:7.2f}s "
+                f"pages/s={len(result.pages) / elapsed:8.1f}"
+            )
+
+
+def main():
+    """Parses the benchmark options and runs it."""
+    parser = argparse.ArgumentParser(description="Benchmarks the parse pool.")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--markup", type=int, default=2000)
+    parser.add_argument(
+        "--processes", type=int, nargs="+", default=[0, 1, 2, os.cpu_count() or 1]
+    )
+    parser.add_argument("--fetch-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    run(args.pages, args.markup, args.processes, args.fetch_workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Pipeline Benchmark
+
+Compares the former three-phase crawl (discover every page, then download
+every file) with the staged pipeline, reporting the time to the first
+downloaded file and the total run time.
+
+Usage:
+    PYTHONPATH=srcs python -m benchmarks.bench_pipeline [--pages N] [--latency S]
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+from benchmarks.site import serve_site
+from tools.scrape import scrape_pages
+from tools.download import download_file
+from tools.pipeline import run_pipeline
+
+
+def run_phases(base_url: str, directory: str) -> tuple:
+    """
+    Crawls the website then downloads its files, one phase after the other.
+
+    Args:
+        base_url (str): The base URL of the website.
+        directory (str): The directory where files are downloaded.
+
+    Returns:
+        tuple: The time to the first downloaded file and the total time.
+    """
+    start = time.perf_counter()
+    pages = list(scrape_pages(base_url, 100, ["png"]))
+    first_download = None
+    for file in {file for page in pages for file in page.files}:
+        if download_file(directory, file) and first_download is None:
+            first_download = time.perf_counter() - start
+    return first_download, time.perf_counter() - start
+
+
+def run_staged(base_url: str, directory: str, workers: tuple) -> tuple:
+    """
+    Crawls the website and downloads its files through the pipeline.
+
+    Args:
+        base_url (str): The base URL of the website.
+        directory (str): The directory where files are downloaded.
+        workers (tuple): The number of fetch, parse and download workers.
+
+    Returns:
+        tuple: The time to the first downloaded file and the total time.
+    """
+    start = time.perf_counter()
+    result = run_pipeline(base_url, 100, ["png"], directory, workers=workers)
+    return result.first_download, time.perf_counter() - start
+
+
+def main():
+    """Parses the benchmark options and runs it."""
+    parser = argparse.ArgumentParser(description="Benchmarks the crawl pipeline.")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--image-size", type=int, default=64 * 1024)
+    parser.add_argument("--workers", type=int, nargs=3, default=[16, 1, 8])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    with serve_site(
+        pages=args.pages,
+        fanout=args.fanout,
+        latency=args.latency,
+        image_size=args.image_size,
+    ) as base_url:
+        runs = (
+            ("phases", lambda directory: run_phases(base_url, directory)),
+            (
+                "pipeline",
+                lambda directory: run_staged(base_url, directory, tuple(args.workers)),
+            ),
+        )
+        for name, run in runs:
+            with tempfile.TemporaryDirectory() as directory:
+                first_download, total = run(directory)
+            print(f"{name:<10} first file={first_download:8.2f}s total={total:8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Retry Benchmark
+
+Crawls a local synthetic website dropping every n-th connection and answering
+every m-th request after a long tail latency, without retries, with retries,
+and with retries and hedged requests, and prints the pages and files fetched,
+the crawl time and the latency percentiles of the requests.
+
+Usage:
+    PYTHONPATH=srcs python -m benchmarks.bench_retry [--pages N] [--reset-every N]
+"""
+
+import os
+import argparse
+import logging
+import time
+from benchmarks.site import serve_site
+from tools import transport
+from tools.pipeline import run_pipeline
+from tools.retry import RetryPolicy
+
+POLICIES = {
+    "none": lambda: None,
+    "retries": lambda: RetryPolicy(backoff=0.05),
+    "retries+hedge": lambda: RetryPolicy(backoff=0.05, hedge=True),
+}
+
+
+def timed_get(latencies: list):
+    """
+    Wraps `transport.get` to record the time of every request.
+
+    Args:
+        latencies (list): The list the latencies are appended to.
+
+    Returns:
+        callable: The original `transport.get`.
+    """
+    original = transport.get
+
+    def get(url, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(url, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    transport.get = get
+    return original
+
+
+def percentile(values: list, percent: float) -> float:
+    """Returns a percentile of a list of values."""
+    values = sorted(values)
+    return values[min(int(len(values) * percent / 100), len(values) - 1)]
+
+
+def run(args, directory: str) -> None:
+    """
+    Crawls the synthetic website once per policy and prints the results.
+
+    Args:
+        args (argparse.Namespace): The benchmark options.
+        directory (str): A directory where the files are downloaded.
+    """
+    for name, factory in POLICIES.items():
+        options = {
+            "pages": args.pages,
+            "fanout": args.fanout,
+            "latency": args.latency,
+            "reset_every": args.reset_every,
+            "tail_every": args.tail_every,
+            "tail_latency": args.tail_latency,
+        }
+        latencies = []
+        os.makedirs(f"{directory}/{name}", exist_ok=True)
+        transport.configure_retries(factory())
+        original = timed_get(latencies)
+        try:
+            with serve_site(**options) as base_url:
+                start = time.perf_counter()
+                result = run_pipeline(
+                    base_url, 100, ["png"], f"{directory}/{name}", (8, 1, 8)
+                )
+                elapsed = time.perf_counter() - start
+        finally:
+            transport.get = original
+            transport.configure_retries(None)
+
+        pages = len([page for page in result.pages if page.html])
+        print(
+            f"{name:<14} pages={pages:<5} files={result.downloaded:<5} "
+            f"time={elapsed:6.2f}s p50={percentile(latencies, 50) * 1000:6.1f}ms "
+            f"p99={percentile(latencies, 99) * 1000:7.1f}ms "
+            f"max={max(latencies) * 1000:7.1f}ms"
+        )
+
+
+def main():
+    """Parses the benchmark options and runs it."""
+    parser = argparse.ArgumentParser(description="Benchmarks the retry policy.")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--reset-every", type=int, default=50)
+    parser.add_argument("--tail-every", type=int, default=40)
+    parser.add_argument("--tail-latency", type=float, default=1.0)
+    parser.add_argument("--path", default="/tmp/bench_retry")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    run(args, args.path)
+
+
+if __name__ == "__main__":
+    main()
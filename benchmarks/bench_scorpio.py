@@ -0,0 +1,89 @@
+"""
+Scorpio Benchmark
+
+Generates a directory tree of JPEG images with EXIF data, then parses it with
+scorpio in a growing number of processes, and prints the files parsed per
+second. The output of every run is checked to be the same as the first one.
+Parsing only scales with processes on a machine with several cores.
+
+Usage:
+    PYTHONPATH=srcs python -m benchmarks.bench_scorpio [--files N] [--jobs N ...]
+"""
+
+import io
+import os
+import time
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+from PIL import Image
+from scorpio import display, find_files, parse_files
+
+
+def make_images(directory: str, files: int, size: int) -> None:
+    """
+    Writes JPEG images with EXIF data, 100 per subdirectory.
+
+    Args:
+        directory (str): The root of the tree.
+        files (int): The number of images.
+        size (int): The width and height of the images.
+    """
+    for number in range(files):
+        subdirectory = os.path.join(directory, f"{number // 100:04}")
+        os.makedirs(subdirectory, exist_ok=True)
+        exif = Image.Exif()
+        exif[0x010F] = "Benchmark"  # Make
+        exif[0x0110] = f"Model {number}"  # Model
+        Image.new("RGB", (size, size), (number % 256, 0, 0)).save(
+            os.path.join(subdirectory, f"{number:06}.jpg"), exif=exif.tobytes()
+        )
+
+
+def run(files: int, size: int, jobs: list) -> None:
+    """
+    Parses the generated tree once per number of processes and prints timings.
+
+    Args:
+        files (int): The number of images.
+        size (int): The width and height of the images.
+        jobs (list): The numbers of processes.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        make_images(directory, files, size)
+        expected = None
+        for count in jobs:
+            output = io.StringIO()
+            start = time.perf_counter()
+            with redirect_stdout(output):
+                paths = find_files([directory], recursive=True, extensions=["jpg"])
+                for information in parse_files(paths, False, count):
+                    display(information)
+            elapsed = time.perf_counter() - start
+            if expected is None:
+                expected = output.getvalue()
+            same = output.getvalue() == expected
+            print(
+                f"jobs={count:<4} files={len(paths):<7} time={elapsed:7.2f}s "
+                f"files/s={len(paths) / elapsed:8.1f} same_output={same}"
+            )
+
+
+def main():
+    """Parses the benchmark options and runs it."""
+    parser = argparse.ArgumentParser(description="Benchmarks scorpio.")
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument(
+        "--jobs", type=int, nargs="+", default=[1, 2, os.cpu_count() or 1]
+    )
+    args = parser.parse_args()
+
+    # The workers log to scorpio.log in the working directory
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        run(args.files, args.size, args.jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Sitemap Benchmark
+
+Compares the time to discover every page of a local synthetic website by
+following its links with the crawl pipeline and by reading its
+gzipped sitemaps, and the peak memory used to read the sitemaps.
+
+Usage:
+    PYTHONPATH=srcs python -m benchmarks.bench_sitemap [--pages N] [--latency S]
+    PYTHONPATH=srcs python -m benchmarks.bench_sitemap --pages 200000 --concurrency 0
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+import tracemalloc
+from benchmarks.site import serve_site
+from tools.pipeline import run_pipeline
+from tools.sitemap import sitemap_pages
+
+
+def run(pages: int, fanout: int, latency: float, concurrency: int) -> None:
+    """
+    Discovers the pages of the synthetic website both ways and prints timings.
+
+    Args:
+        pages (int): The total number of pages of the site.
+        fanout (int): The number of pages linked from each page.
+        latency (float): The delay in seconds added to every response.
+        concurrency (int): The number of pages fetched at once by the crawl,
+            which is skipped if 0.
+    """
+    options = {"pages": pages, "fanout": fanout, "latency": latency, "sitemap": 50000}
+    with serve_site(**options) as base_url:
+        if concurrency:
+            with tempfile.TemporaryDirectory() as directory:
+                start = time.perf_counter()
+                result = run_pipeline(
+                    base_url,
+                    100,
+                    [],
+                    directory,
+                    (concurrency, 1, 1),
+                    collect=False,
+                )
+                elapsed = time.perf_counter() - start
+            print(
+                f"{'links':<8} pages={result.html_pages:<8} time={elapsed:8.2f}s "
+                f"pages/s={result.html_pages / elapsed:10.1f}"
+            )
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        count = sum(1 for _ in sitemap_pages(base_url, 100))
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            f"{'sitemap':<8} pages={count:<8} time={elapsed:8.2f}s "
+            f"pages/s={count / elapsed:10.1f} peak={peak / 1024**2:.1f}MB"
+        )
+
+
+def main():
+    """Parses the benchmark options and runs it."""
+    parser = argparse.ArgumentParser(description="Benchmarks sitemap discovery.")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    run(args.pages, args.fanout, args.latency, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Startup Benchmark
+
+Measures the time the command-line tools take to start: each command runs in
+a fresh interpreter under `python -X importtime`, so that the cumulative
+import time of its modules is reported along with its wall time. A bare
+interpreter is measured too, the difference being the cost of the tools.
+
+The median of the repeated runs of each command is printed, compared with the
+last run of the same options in the history file, and appended to it as a
+JSON line along with the commit, like the benchmark suite. The modules taking
+the longest to import are listed with --top.
+
+Usage:
+    PYTHONPATH=srcs python -m benchmarks.bench_startup [--repeat N] [--top N]
+    PYTHONPATH=srcs python -m benchmarks.bench_startup --history startup.jsonl
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+from benchmarks.suite import current_commit, load_previous
+
+DEFAULT_HISTORY = "startup-history.jsonl"
+
+SRCS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "srcs")
+
+# The code run by each command, the entry points exiting on --help
+COMMANDS = {
+    "python": "pass",
+    "import spider": "import spider",
+    "import scorpio": "import scorpio",
+    "spider --help": "import sys, spider; sys.argv[1:] = ['--help']; spider.crawl()",
+    "scorpio --help": "import sys, scorpio; sys.argv[1:] = ['--help']; scorpio.parse()",
+}
+
+
+def parse_importtime(output: str) -> tuple:
+    """
+    Reads the import times printed by `-X importtime`.
+
+    Args:
+        output (str): The standard error of the interpreter.
+
+    Returns:
+        tuple: The microseconds spent importing the modules, and the
+        microseconds spent importing each module and the modules it
+        imported, by name.
+    """
+    total, modules = 0, {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        modules[name.strip()] = int(cumulative)
+        # The modules imported by others are indented under them
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return total, modules
+
+
+def measure(code: str) -> dict:
+    """
+    Runs code in a fresh interpreter, importing the tools from srcs.
+
+    Args:
+        code (str): The code run by the interpreter.
+
+    Returns:
+        dict: The wall time in seconds, the total import time in seconds and
+        the import time of each module.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [SRCS, os.environ.get("PYTHONPATH")])
+    )
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    elapsed = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+
+    total, modules = parse_importtime(process.stderr)
+    return {"seconds": elapsed, "import_seconds": total / 1e6, "modules": modules}
+
+
+def run(commands: list, repeat: int) -> tuple:
+    """
+    Runs each command repeatedly.
+
+    Args:
+        commands (list): The names of the commands to run.
+        repeat (int): The number of runs of each command.
+
+    Returns:
+        tuple: The median wall and import times of each command by name, in
+        milliseconds, and the median import time of each module of each
+        command, in milliseconds.
+    """
+    results, modules = {}, {}
+    for name in commands:
+        runs = [measure(COMMANDS[name]) for _ in range(repeat)]
+        results[name] = {
+            "wall_ms": round(statistics.median(r["seconds"] for r in runs) * 1e3, 1),
+            "import_ms": round(
+                statistics.median(r["import_seconds"] for r in runs) * 1e3, 1
+            ),
+        }
+        names = set().union(*(r["modules"] for r in runs))
+        modules[name] = {
+            module: statistics.median(r["modules"].get(module, 0) for r in runs) / 1e3
+            for module in names
+        }
+    return results, modules
+
+
+def report(results: dict, previous: dict) -> str:
+    """
+    Formats the results, with their change since the previous run.
+
+    Args:
+        results (dict): The wall and import times of each command.
+        previous (dict): The record of the previous run, or None.
+
+    Returns:
+        str: One line per command.
+    """
+    lines = []
+    for name, result in results.items():
+        before = (previous or {}).get("results", {}).get(name, {})
+        columns = [f"{name:<16}"]
+        for metric, value in result.items():
+            column = f"{metric}={value}"
+            if before.get(metric):
+                change = (value - before[metric]) / before[metric] * 100
+                column += f" ({change:+.1f}%)"
+            columns.append(f"{column:<28}")
+        lines.append(" ".join(columns).rstrip())
+    return "\n".join(lines)
+
+
+def main():
+    """Parses the benchmark options, runs it and records the results."""
+    parser = argparse.ArgumentParser(description="Benchmarks the startup time.")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--commands", nargs="+", choices=list(COMMANDS), default=list(COMMANDS)
+    )
+    parser.add_argument("--top", type=int, default=0)
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    options = {"repeat": args.repeat, "commands": args.commands}
+    previous = load_previous(args.history, options)
+    results, modules = run(args.commands, args.repeat)
+    print(report(results, previous))
+
+    if args.top:
+        for name in args.commands:
+            print(f"\n{name}: slowest imports (ms, with their own imports)")
+            slowest = sorted(modules[name].items(), key=lambda item: -item[1])
+            for module, milliseconds in slowest[: args.top]:
+                print(f"  {milliseconds:8.1f}  {module}")
+
+    if not args.no_save:
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": current_commit(),
+            "python": platform.python_version(),
+            "options": options,
+            "results": results,
+        }
+        with open(args.history, "a", encoding="utf-8") as file:
+            file.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
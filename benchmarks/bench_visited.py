@@ -0,0 +1,89 @@
+"""
+Visited Set Benchmark
+
+Compares the memory used by a Python set of URL strings with the compact
+visited sets of `tools.visited`, and measures their insertion time and their
+false-positive rate on URLs never added.
+
+The memory of the set counts the set itself and its strings, the memory of the
+compact structures counts their tables, which is what they keep once the URLs
+are dropped by the crawl.
+
+Usage:
+    PYTHONPATH=srcs python -m benchmarks.bench_visited [--counts 1000000 10000000]
+"""
+
+import argparse
+import sys
+import time
+from tools.visited import FingerprintSet, ScalableBloomFilter
+
+
+def generate_urls(count: int, offset: int = 0):
+    """
+    Generates distinct URLs shaped like the pages of a large website.
+
+    Args:
+        count (int): The number of URLs.
+        offset (int): The number of the first URL.
+
+    Yields:
+        str: The URLs.
+    """
+    for number in range(offset, offset + count):
+        yield f"https://www.example.com/catalog/{number % 997}/item-{number}"
+
+
+def set_memory(urls: set) -> int:
+    """Returns the bytes used by a set and its strings."""
+    return sys.getsizeof(urls) + sum(sys.getsizeof(url) for url in urls)
+
+
+def measure(name: str, factory, count: int, probes: int) -> None:
+    """
+    Fills a structure and prints its memory, time and false-positive rate.
+
+    Args:
+        name (str): The name of the structure.
+        factory (callable): Creates an empty structure.
+        count (int): The number of URLs added.
+        probes (int): The number of URLs never added that are looked up.
+    """
+    structure = factory()
+    start = time.perf_counter()
+    for url in generate_urls(count):
+        structure.add(url)
+    elapsed = time.perf_counter() - start
+
+    false_positives = sum(url in structure for url in generate_urls(probes, count))
+    if isinstance(structure, set):
+        memory = set_memory(structure)
+    else:
+        memory = structure.memory_size()
+    print(
+        f"{name:<24} urls={count:<10} memory={memory / 1024**2:9.1f}MB "
+        f"bytes/url={memory / count:6.1f} add={elapsed / count * 1e6:5.2f}us "
+        f"false-positives={false_positives / probes:.2e}"
+    )
+
+
+def main():
+    """Parses the benchmark options and runs it."""
+    parser = argparse.ArgumentParser(description="Benchmarks the visited sets.")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000000, 10000000])
+    parser.add_argument("--probes", type=int, default=100000)
+    parser.add_argument("--error-rate", type=float, default=0.001)
+    args = parser.parse_args()
+
+    structures = {
+        "set": set,
+        "fingerprints": FingerprintSet,
+        f"bloom({args.error_rate:g})": lambda: ScalableBloomFilter(args.error_rate),
+    }
+    for count in args.counts:
+        for name, factory in structures.items():
+            measure(name, factory, count, args.probes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Workers Benchmark
+
+Crawls several local synthetic websites, one host each, with a growing number
+of worker processes sharing a queue, and prints the pages crawled per second.
+Each host is crawled by one worker at a time, so the crawl scales with the
+workers up to the number of hosts.
+
+Usage:
+    PYTHONPATH=srcs python -m benchmarks.bench_workers [--sites N] [--pages N]
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from contextlib import ExitStack
+from benchmarks.site import serve_site
+from tools.workers import run_workers
+from tools.workqueue import WorkQueue
+
+
+def run(sites: int, pages: int, latency: float, workers: list, concurrency: int):
+    """
+    Crawls the synthetic websites once per number of workers and prints
+    timings.
+
+    Args:
+        sites (int): The number of websites, each on its own host.
+        pages (int): The number of pages of each site.
+        latency (float): The delay in seconds added to every response.
+        workers (list): The numbers of worker processes.
+        concurrency (int): The number of threads of each worker.
+    """
+    with ExitStack() as stack:
+        base_urls = [
+            stack.enter_context(serve_site(pages=pages, fanout=5, latency=latency))
+            for _ in range(sites)
+        ]
+        for count in workers:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "queue.db")
+                work_queue = WorkQueue(path)
+                for base_url in base_urls:
+                    work_queue.seed(base_url)
+                work_queue.close()
+
+                start = time.perf_counter()
+                result = run_workers(
+                    count,
+                    path,
+                    100,
+                    ["png"],
+                    directory,
+                    concurrency=concurrency,
+                    transport_options={"per_host": concurrency},
+                )
+                elapsed = time.perf_counter() - start
+            print(
+                f"workers={count:<3} pages={result.pages:<6} "
+                f"files={result.downloaded:<6} time={elapsed:7.2f}s "
+                f"pages/s={result.pages / elapsed:8.1f}"
+            )
+
+
+def main():
+    """Parses the benchmark options and runs it."""
+    parser = argparse.ArgumentParser(description="Benchmarks the crawl workers.")
+    parser.add_argument("--sites", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    run(args.sites, args.pages, args.latency, args.workers, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+HTTP/2 Synthetic Website Module
+
+This module serves the generated website of `benchmarks.site` over cleartext
+HTTP/2, which clients reach with prior knowledge, so that the HTTP/2 transport
+can be measured and tested without TLS. It relies on the h2 package.
+
+Each connection is served by a thread multiplexing its streams: the response
+to a request is sent once its latency elapsed, without waiting for the other
+requests of the connection, in frames fitting the flow-control windows of the
+client. The pages, images, redirections, missing pages and robots.txt of the
+site are served, pages being compressed when the site is configured to. The
+connections are counted under the "connections" key of the request counter
+and the bytes of the bodies under the "bytes" key.
+
+Usage:
+    with serve_h2_site(pages=500, latency=0.02, compress=True) as base_url:
+        ...
+"""
+
+import time
+import socket
+import select
+import threading
+from contextlib import contextmanager
+import h2.config
+import h2.connection
+import h2.events
+import h2.exceptions
+from benchmarks.site import (
+    SiteConfig,
+    encode_body,
+    page_path,
+    parse_number,
+    render_image,
+    render_page,
+)
+
+
+def respond(path: str, accept_encoding: str, config: SiteConfig, base_url: str):
+    """
+    Builds the response to a request of the site.
+
+    Args:
+        path (str): The requested path.
+        accept_encoding (str): The Accept-Encoding header of the request.
+        config (SiteConfig): The shape of the website.
+        base_url (str): The base URL of the site, for redirections.
+
+    Returns:
+        tuple: The status, the headers and the body of the response.
+    """
+    if path == "/robots.txt" and config.robots is not None:
+        return 200, [("content-type", "text/plain")], config.robots.encode()
+    if path.startswith("/go/"):
+        location = base_url + page_path(parse_number(path, "/go/"))
+        return 301, [("location", location)], b""
+
+    if path.startswith("/img/"):
+        number = parse_number(path, "/img/", ".png")
+    elif path == "/":
+        number = 0
+    else:
+        number = parse_number(path, "/page/")
+    if not 0 <= number < config.pages:
+        return 404, [("content-type", "text/plain")], b"Not Found"
+
+    if path.startswith("/img/"):
+        return 200, [("content-type", "image/png")], render_image(number, config)
+    body, coding = render_page(number, config), None
+    headers = [("content-type", "text/html; charset=utf-8")]
+    if config.compress:
+        body, coding = encode_body(body, accept_encoding)
+    if coding is not None:
+        headers += [("content-encoding", coding), ("vary", "accept-encoding")]
+    return 200, headers, body
+
+
+class _Stream:  # pylint: disable=too-few-public-methods
+    """A response waiting to be sent on a stream."""
+
+    def __init__(self, ready: float, status: int, headers: list, body: bytes):
+        self.ready = ready
+        self.headers = [(":status", str(status))] + headers
+        self.headers.append(("content-length", str(len(body))))
+        self.body = body
+        self.started = False
+
+
+def _send_ready(connection, streams: dict, now: float) -> None:
+    """Sends what the flow-control windows allow of the ready responses."""
+    for stream_id, stream in list(streams.items()):
+        if stream.ready > now:
+            continue
+        if not stream.started:
+            connection.send_headers(
+                stream_id, stream.headers, end_stream=not stream.body
+            )
+            stream.started = True
+        while stream.body:
+            size = min(
+                connection.local_flow_control_window(stream_id),
+                connection.max_outbound_frame_size,
+                len(stream.body),
+            )
+            if size <= 0:
+                break
+            connection.send_data(
+                stream_id, stream.body[:size], end_stream=size == len(stream.body)
+            )
+            stream.body = stream.body[size:]
+        if not stream.body:
+            del streams[stream_id]
+
+
+def _serve_connection(sock, config: SiteConfig, counter: dict, lock, base_url):
+    """Serves the streams of a connection until the client closes it."""
+    # pylint: disable=too-many-arguments
+    connection = h2.connection.H2Connection(
+        h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+    )
+    connection.initiate_connection()
+    streams = {}
+    try:
+        sock.sendall(connection.data_to_send())
+        while True:
+            now = time.monotonic()
+            waiting = [stream.ready - now for stream in streams.values()]
+            timeout = max(min(waiting), 0) if waiting else None
+            if select.select([sock], [], [], timeout)[0]:
+                data = sock.recv(65536)
+                if not data:
+                    return
+                for event in connection.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        headers = dict(event.headers)
+                        path = headers[":path"]
+                        with lock:
+                            counter[path] = counter.get(path, 0) + 1
+                        status, response_headers, body = respond(
+                            path, headers.get("accept-encoding", ""), config, base_url
+                        )
+                        with lock:
+                            counter["bytes"] = counter.get("bytes", 0) + len(body)
+                        streams[event.stream_id] = _Stream(
+                            time.monotonic() + config.latency,
+                            status,
+                            response_headers,
+                            body,
+                        )
+                    elif isinstance(event, h2.events.StreamReset):
+                        streams.pop(event.stream_id, None)
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+            _send_ready(connection, streams, time.monotonic())
+            sock.sendall(connection.data_to_send())
+    except (OSError, h2.exceptions.ProtocolError):
+        return
+    finally:
+        sock.close()
+
+
+@contextmanager
+def serve_h2_site(counter: dict = None, **options):
+    """
+    Serves a generated website over cleartext HTTP/2 on a random local port.
+
+    Args:
+        counter (dict): An optional dictionary filled with the number of
+            requests per path, the connections and the bytes sent.
+        **options: The `SiteConfig` attributes.
+
+    Yields:
+        str: The base URL of the website.
+    """
+    if counter is None:
+        counter = {}
+    config = SiteConfig(**options)
+    lock = threading.Lock()
+    listener = socket.create_server(("127.0.0.1", 0), backlog=256)
+    base_url = f"http://127.0.0.1:{listener.getsockname()[1]}"
+
+    def accept():
+        while True:
+            try:
+                sock, _ = listener.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with lock:
+                counter["connections"] = counter.get("connections", 0) + 1
+            threading.Thread(
+                target=_serve_connection,
+                args=(sock, config, counter, lock, base_url),
+                daemon=True,
+            ).start()
+
+    thread = threading.Thread(target=accept, daemon=True)
+    thread.start()
+    try:
+        yield base_url
+    finally:
+        # Wakes up the accepting thread
+        listener.shutdown(socket.SHUT_RDWR)
+        listener.close()
+        thread.join()
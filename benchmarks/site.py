@@ -0,0 +1,464 @@
+"""
+Synthetic Website Module
+
+This module serves a generated website from a local HTTP server so that crawls
+can be measured without touching the network. Pages are numbered from 0 and
+each page links to `fanout` other pages, so the whole site is reachable from
+the root page. Each page also references one image `/img/<number>.png`.
+Responses carry an ETag and a Last-Modified header, and conditional requests
+are answered with `304 Not Modified`, counted under the "304" key of the
+request counter.
+
+The site may also serve a `/robots.txt`, and answer its first requests with
+`429 Too Many Requests`, counted under the "429" key, to exercise politeness.
+The site may also publish its pages in gzipped sitemaps listed by a
+`/sitemap.xml` sitemap index, every page having a `<lastmod>` on the day of
+its Last-Modified header.
+
+To exercise retries, it may drop the connection of every n-th request,
+counted under the "reset" key, and delay every m-th response by a long tail
+latency, counted under the "slow" key.
+
+The site may compress its pages with the best content coding the client
+accepts among zstd, brotli and gzip, zstd and brotli being offered when the
+zstandard and brotli packages are installed. The bytes of the compressed pages
+are counted under the "bytes" key.
+
+The site may keep connections open between requests, counting them under the
+"connections" key, to measure connection reuse.
+
+The site may also be limited to a number of levels of links, link to some
+pages through a `301` redirection from `/go/<number>`, and link from some
+pages to a missing `/missing/<number>` page answering `404`.
+
+Usage:
+    with serve_site(pages=500, fanout=5, latency=0.02) as base_url:
+        ...
+"""
+
+import sys
+import gzip
+import time
+import itertools
+import hashlib
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+LAST_MODIFIED = "Mon, 02 Oct 2023 08:00:00 GMT"
+
+SITEMAP_LASTMOD = "2023-10-02"
+
+
+@dataclass
+class SiteConfig:
+    """
+    The shape of the generated website.
+
+    Attributes:
+        pages (int): The total number of pages of the site.
+        fanout (int): The number of pages linked from each page.
+        latency (float): The delay in seconds added to every response.
+        image_size (int): The size in bytes of each image.
+        robots (str): The content of /robots.txt, which is missing if None.
+        throttle (int): The number of requests answered with a 429 and a
+            `Retry-After: 0` before the site serves normally.
+        reset_every (int): The connection of every `reset_every`-th request
+            is closed without a response, none if 0.
+        tail_every (int): Every `tail_every`-th request is delayed by
+            `tail_latency`, none if 0.
+        tail_latency (float): The delay in seconds of the slow responses.
+        markup (int): The number of extra elements in each page, to make
+            pages heavier to parse.
+        sitemap (int): The number of pages per sitemap, listed by the
+            `/sitemap.xml` index. No sitemap is served if 0.
+        depth (int): The number of levels of links below the root page, the
+            pages of the last level linking to no page. No limit if 0.
+        redirect_every (int): Every `redirect_every`-th page is linked through
+            a redirection, none if 0.
+        error_every (int): Every `error_every`-th page also links to a
+            missing page, none if 0.
+        keep_alive (bool): If True, connections are kept open between
+            requests, which are served over HTTP/1.1, and counted under the
+            "connections" key.
+        compress (bool): If True, pages are compressed with the best content
+            coding accepted by the client.
+    """
+
+    pages: int = 100
+    fanout: int = 5
+    latency: float = 0.0
+    image_size: int = 1024
+    robots: str = None
+    throttle: int = 0
+    reset_every: int = 0
+    tail_every: int = 0
+    tail_latency: float = 0.0
+    sitemap: int = 0
+    markup: int = 0
+    depth: int = 0
+    redirect_every: int = 0
+    error_every: int = 0
+    keep_alive: bool = False
+    compress: bool = False
+
+
+def page_path(number: int) -> str:
+    """
+    Returns the path of a generated page.
+
+    Args:
+        number (int): The page number.
+
+    Returns:
+        str: The path of the page, the root page being "/".
+    """
+    return "/" if number == 0 else f"/page/{number}"
+
+
+def page_depth(number: int, fanout: int) -> int:
+    """
+    Returns the number of links between the root page and a generated page.
+
+    Args:
+        number (int): The page number.
+        fanout (int): The number of pages linked from each page.
+
+    Returns:
+        int: The depth of the page, 0 for the root page.
+    """
+    depth = 0
+    while number > 0:
+        number = (number - 1) // fanout
+        depth += 1
+    return depth
+
+
+def every(number: int, period: int) -> bool:
+    """Returns whether a positive number is a multiple of a non-zero period."""
+    return bool(period) and number > 0 and number % period == 0
+
+
+def link_path(number: int, config: SiteConfig) -> str:
+    """Returns the path linking to a page, through a redirection or not."""
+    if every(number, config.redirect_every):
+        return f"/go/{number}"
+    return page_path(number)
+
+
+def render_page(number: int, config: SiteConfig) -> bytes:
+    """
+    Renders a generated HTML page linking to its children and its image.
+
+    Args:
+        number (int): The page number.
+        config (SiteConfig): The shape of the website.
+
+    Returns:
+        bytes: The HTML content of the page.
+    """
+    first_child = number * config.fanout + 1
+    children = range(first_child, min(first_child + config.fanout, config.pages))
+    if config.depth and page_depth(number, config.fanout) >= config.depth:
+        children = ()
+    links = "".join(
+        f'<a href="{link_path(child, config)}">page {child}</a>\n' for child in children
+    )
+    if every(number, config.error_every):
+        links += f'<a href="/missing/{number}">missing</a>\n'
+
+    markup = '<div class="item"><span>text</span> <a href="#top">top</a></div>\n'
+    return (
+        "<!DOCTYPE html>\n<html><body>\n"
+        f"<h1>Page {number}</h1>\n"
+        f'<img src="/img/{number}.png">\n{links}'
+        f"{markup * config.markup}"
+        "</body></html>\n"
+    ).encode()
+
+
+def render_image(number: int, config: SiteConfig) -> bytes:
+    """
+    Renders the bytes of a generated image.
+
+    Args:
+        number (int): The image number.
+        config (SiteConfig): The shape of the website.
+
+    Returns:
+        bytes: A body starting with the PNG signature, unique to the image.
+    """
+    header = PNG_SIGNATURE + str(number).encode()
+    return header + b"\0" * max(config.image_size - len(header), 0)
+
+
+def render_sitemap(path: str, config: SiteConfig, base_url: str) -> bytes:
+    """
+    Renders the sitemap index or one of the gzipped sitemaps it lists.
+
+    Args:
+        path (str): "/sitemap.xml" or "/sitemaps/<number>.xml.gz".
+        config (SiteConfig): The shape of the website.
+        base_url (str): The URL of the website.
+
+    Returns:
+        bytes: The sitemap, or None if the path is not a sitemap.
+    """
+    namespace = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+    if path == "/sitemap.xml":
+        entries = "".join(
+            f"<sitemap><loc>{base_url}/sitemaps/{number}.xml.gz</loc></sitemap>\n"
+            for number in range((config.pages + config.sitemap - 1) // config.sitemap)
+        )
+        return (
+            f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex {namespace}>\n'
+            f"{entries}</sitemapindex>\n"
+        ).encode()
+
+    number = parse_number(path, "/sitemaps/", ".xml.gz")
+    first_page = number * config.sitemap
+    if not 0 <= first_page < config.pages:
+        return None
+    entries = "".join(
+        f"<url><loc>{base_url}{page_path(page)}</loc>"
+        f"<lastmod>{SITEMAP_LASTMOD}</lastmod></url>\n"
+        for page in range(first_page, min(first_page + config.sitemap, config.pages))
+    )
+    return gzip.compress(
+        (
+            f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset {namespace}>\n'
+            f"{entries}</urlset>\n"
+        ).encode()
+    )
+
+
+def encode_body(body: bytes, accept_encoding: str) -> tuple:
+    """
+    Compresses a body with the best content coding a client accepts.
+
+    Args:
+        body (bytes): The body.
+        accept_encoding (str): The Accept-Encoding header of the request.
+
+    Returns:
+        tuple: The compressed body and its coding, or the body and None.
+    """
+    accepted = {coding.split(";")[0].strip() for coding in accept_encoding.split(",")}
+    if "zstd" in accepted and zstandard is not None:
+        return zstandard.ZstdCompressor().compress(body), "zstd"
+    if "br" in accepted and brotli is not None:
+        return brotli.compress(body), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body), "gzip"
+    return body, None
+
+
+def parse_number(path: str, prefix: str, suffix: str = "") -> int:
+    """
+    Extracts the number from a generated path.
+
+    Args:
+        path (str): The requested path.
+        prefix (str): The path prefix, such as "/page/".
+        suffix (str): The path suffix, such as ".png".
+
+    Returns:
+        int: The number, or -1 if the path does not match.
+    """
+    if not path.startswith(prefix) or not path.endswith(suffix):
+        return -1
+    number = path[len(prefix) : len(path) - len(suffix)].rstrip("/")
+    return int(number) if number.isdigit() else -1
+
+
+def make_handler(config: SiteConfig, counter: dict):
+    """
+    Builds a request handler class serving the generated site.
+
+    Args:
+        config (SiteConfig): The shape of the website.
+        counter (dict): A dictionary counting the requests per path.
+
+    Returns:
+        type: A BaseHTTPRequestHandler subclass.
+    """
+
+    lock = threading.Lock()
+    sequence = itertools.count(1)
+
+    class SiteHandler(BaseHTTPRequestHandler):
+        """Serves the generated pages and images."""
+
+        protocol_version = "HTTP/1.1" if config.keep_alive else "HTTP/1.0"
+        # The headers and the body are sent apart, which Nagle's algorithm
+        # would delay until the client acknowledges the headers
+        disable_nagle_algorithm = config.keep_alive
+
+        def handle(self):
+            """Serves the requests of a connection."""
+            if config.keep_alive:
+                with lock:
+                    counter["connections"] = counter.get("connections", 0) + 1
+            super().handle()
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Serves a generated page, an image or a 404."""
+            with lock:
+                counter[self.path] = counter.get(self.path, 0) + 1
+                number = next(sequence)
+                reset = config.reset_every and number % config.reset_every == 0
+                slow = config.tail_every and number % config.tail_every == 0
+                if slow:
+                    counter["slow"] = counter.get("slow", 0) + 1
+                if reset:
+                    counter["reset"] = counter.get("reset", 0) + 1
+            if reset:
+                self.close_connection = True
+                return
+            if config.latency:
+                time.sleep(config.latency)
+            if slow:
+                time.sleep(config.tail_latency)
+
+            with lock:
+                throttled = counter.get("429", 0) < config.throttle
+                if throttled:
+                    counter["429"] = counter.get("429", 0) + 1
+            if throttled:
+                self.send_response(429)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if self.path == "/robots.txt" and config.robots is not None:
+                body = config.robots.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            if config.sitemap and self.path.startswith("/sitemap"):
+                host, port = self.server.server_address[:2]
+                body = render_sitemap(self.path, config, f"http://{host}:{port}")
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/xml")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            if self.path.startswith("/go/"):
+                number = parse_number(self.path, "/go/")
+                host, port = self.server.server_address[:2]
+                self.send_response(301)
+                self.send_header("Location", f"http://{host}:{port}{page_path(number)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if self.path == "/":
+                number, content_type = 0, "text/html; charset=utf-8"
+            elif self.path.startswith("/img/"):
+                number = parse_number(self.path, "/img/", ".png")
+                content_type = "image/png"
+            else:
+                number = parse_number(self.path, "/page/")
+                content_type = "text/html; charset=utf-8"
+
+            if not 0 <= number < config.pages:
+                self.send_error(404)
+                return
+
+            if content_type == "image/png":
+                body = render_image(number, config)
+            else:
+                body = render_page(number, config)
+
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                with lock:
+                    counter["304"] = counter.get("304", 0) + 1
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            coding = None
+            if config.compress and content_type != "image/png":
+                body, coding = encode_body(
+                    body, self.headers.get("Accept-Encoding", "")
+                )
+                with lock:
+                    counter["bytes"] = counter.get("bytes", 0) + len(body)
+
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", LAST_MODIFIED)
+            if coding is not None:
+                self.send_header("Content-Encoding", coding)
+                self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            """Silences the default request logging."""
+
+    return SiteHandler
+
+
+class SiteServer(ThreadingHTTPServer):
+    """A threading HTTP server accepting many simultaneous connections."""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        """Ignores the connections closed by the client, such as lost hedges."""
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+@contextmanager
+def serve_site(counter: dict = None, **options):
+    """
+    Serves a generated website on a random local port.
+
+    Args:
+        counter (dict): An optional dictionary filled with the number of
+            requests per path.
+        **options: The `SiteConfig` attributes.
+
+    Yields:
+        str: The base URL of the website.
+    """
+    if counter is None:
+        counter = {}
+    server = SiteServer(("127.0.0.1", 0), make_handler(SiteConfig(**options), counter))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,285 @@
+"""
+Benchmark Suite
+
+Runs the spider end to end against local synthetic websites and records its
+throughput, so that runs can be compared over time:
+
+- `crawl_website`: the whole spider, crawling a site with redirections and
+  missing pages and downloading its images,
+- `scrape_urls`: the discovery of the pages of the same site,
+- `download_file`: the download of large images one after the other.
+
+Each scenario runs in a fresh process, so that its peak resident memory is its
+own, while the site is served by this process and counts the requests. The
+pages and megabytes per second, the peak RSS and the request counts of each
+scenario are printed, compared with the last run of the same options in the
+history file, and appended to it as a JSON line along with the commit.
+
+Usage:
+    PYTHONPATH=srcs python -m benchmarks.suite [--pages N] [--latency S]
+    PYTHONPATH=srcs python -m benchmarks.suite --history results.jsonl --no-save
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+import multiprocessing
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from benchmarks.site import serve_site
+
+DEFAULT_HISTORY = "bench-history.jsonl"
+
+# The metrics compared between runs, and whether higher is better
+COMPARED = {
+    "pages_per_second": True,
+    "mb_per_second": True,
+    "peak_rss_mb": False,
+    "requests": False,
+}
+
+
+def _crawl_website(base_url: str, options: dict) -> dict:
+    """Runs the spider on the site, downloading its images."""
+    # pylint: disable=import-outside-toplevel
+    from spider import crawl_website
+    from tools import transport
+
+    transport.configure(per_host=options["concurrency"], retries=3)
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            crawl_website(
+                base_url,
+                100,
+                ["png"],
+                directory,
+                False,
+                concurrency=options["concurrency"],
+            )
+        elapsed = time.perf_counter() - start
+        size = sum(entry.stat().st_size for entry in os.scandir(directory))
+    return {"seconds": elapsed, "bytes": size}
+
+
+def _scrape_urls(base_url: str, options: dict) -> dict:
+    """Discovers the pages of the site."""
+    # pylint: disable=import-outside-toplevel,unused-argument
+    from tools.scrape import scrape_urls
+
+    start = time.perf_counter()
+    scrape_urls(base_url, 100)
+    return {"seconds": time.perf_counter() - start, "bytes": 0}
+
+
+def _download_file(base_url: str, options: dict) -> dict:
+    """Downloads the images of the site one after the other."""
+    # pylint: disable=import-outside-toplevel
+    from tools.download import download_file
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        for number in range(options["files"]):
+            download_file(directory, f"{base_url}/img/{number}.png")
+        elapsed = time.perf_counter() - start
+        size = sum(entry.stat().st_size for entry in os.scandir(directory))
+    return {"seconds": elapsed, "bytes": size}
+
+
+SCENARIOS = {
+    "crawl_website": _crawl_website,
+    "scrape_urls": _scrape_urls,
+    "download_file": _download_file,
+}
+
+
+def _run_scenario(name: str, base_url: str, options: dict) -> dict:
+    """Runs a scenario in a worker process and adds its peak memory."""
+    logging.basicConfig(level=logging.CRITICAL)
+    result = SCENARIOS[name](base_url, options)
+    # Kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["peak_rss_mb"] = peak / (1024**2 if sys.platform == "darwin" else 1024)
+    return result
+
+
+def site_options(name: str, options: dict) -> dict:
+    """
+    Returns the shape of the synthetic site of a scenario.
+
+    Args:
+        name (str): The name of the scenario.
+        options (dict): The options of the suite.
+
+    Returns:
+        dict: The `SiteConfig` attributes.
+    """
+    if name == "download_file":
+        return {
+            "pages": options["files"],
+            "latency": options["latency"],
+            "image_size": options["file_size"],
+        }
+    return {
+        "pages": options["pages"],
+        "fanout": options["fanout"],
+        "depth": options["depth"],
+        "latency": options["latency"],
+        "image_size": options["image_size"],
+        "redirect_every": options["redirect_every"],
+        "error_every": options["error_every"],
+    }
+
+
+def run(options: dict, scenarios: list) -> dict:
+    """
+    Runs the scenarios, each against its own synthetic site.
+
+    Args:
+        options (dict): The options of the suite.
+        scenarios (list): The names of the scenarios to run.
+
+    Returns:
+        dict: The metrics of each scenario by name.
+    """
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in scenarios:
+        counter = {}
+        with serve_site(counter=counter, **site_options(name, options)) as base_url:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(_run_scenario, name, base_url, options)
+                result = result.result()
+
+        paths = {path: count for path, count in counter.items() if path[0] == "/"}
+        pages = sum(
+            count
+            for path, count in paths.items()
+            if path == "/" or path.startswith("/page/")
+        )
+        seconds = result["seconds"]
+        results[name] = {
+            "seconds": round(seconds, 3),
+            "pages": pages,
+            "requests": sum(paths.values()),
+            "pages_per_second": round(pages / seconds, 1),
+            "mb_per_second": round(result["bytes"] / 1e6 / seconds, 3),
+            "peak_rss_mb": round(result["peak_rss_mb"], 1),
+        }
+    return results
+
+
+def current_commit() -> str:
+    """Returns the commit of the working tree, None outside of a git repository."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous(history: str, options: dict) -> dict:
+    """
+    Returns the last run of the same options recorded in the history.
+
+    Args:
+        history (str): The path of the history file.
+        options (dict): The options of the suite.
+
+    Returns:
+        dict: The record of the run, None if there is none.
+    """
+    previous = None
+    if not os.path.exists(history):
+        return None
+    with open(history, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("options") == options:
+                previous = record
+    return previous
+
+
+def report(results: dict, previous: dict) -> str:
+    """
+    Formats the results, with their change since the previous run.
+
+    Args:
+        results (dict): The metrics of each scenario.
+        previous (dict): The record of the previous run, or None.
+
+    Returns:
+        str: One line per scenario.
+    """
+    lines = []
+    for name, result in results.items():
+        before = (previous or {}).get("results", {}).get(name, {})
+        columns = [f"{name:<14}"]
+        for metric in COMPARED:
+            column = f"{metric}={result[metric]}"
+            if before.get(metric):
+                change = (result[metric] - before[metric]) / before[metric] * 100
+                column += f" ({change:+.1f}%)"
+            columns.append(f"{column:<30}")
+        lines.append(" ".join(columns).rstrip())
+    return "\n".join(lines)
+
+
+def main():
+    """Parses the suite options, runs it and records the results."""
+    parser = argparse.ArgumentParser(description="Runs the benchmark suite.")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--image-size", type=int, default=32 * 1024)
+    parser.add_argument("--redirect-every", type=int, default=10)
+    parser.add_argument("--error-every", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--file-size", type=int, default=4 * 1024**2)
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    options = {
+        name: value
+        for name, value in vars(args).items()
+        if name not in ("scenarios", "history", "no_save")
+    }
+    previous = load_previous(args.history, options)
+    results = run(options, args.scenarios)
+    print(report(results, previous))
+
+    if not args.no_save:
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": current_commit(),
+            "python": platform.python_version(),
+            "options": options,
+            "results": results,
+        }
+        with open(args.history, "a", encoding="utf-8") as file:
+            file.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
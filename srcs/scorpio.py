@@ -11,8 +11,17 @@ Usage:
     scorpio [OPTIONS] files
 
 Options:
-    files               A list of files to parse.
+    files               A list of files and directories to parse.
     -t, --thumbnail     Generate and download thumbnails for image files.
+    -r, --recursive     Also parse the files of the subdirectories of the directories.
+    -e, --extension     Only parse the files of the directories with this extension,
+                        repeated for each extension.
+    -g, --glob          Only parse the files of the directories whose name matches
+                        this pattern, such as "IMG_*", repeated for each pattern.
+    -j, --jobs          The number of processes parsing files (default: 1).
+
+Files are displayed in the order they are given, the files of a directory
+sorted by path, whatever the number of processes parsing them.
 
 Developed by louisabricot
 
@@ -25,15 +34,24 @@ Example usage:
 
 3. Display EXIF information for an image file:
     scorpio image.jpg
+
+4. Display metadata for the JPEG images of a directory tree with 8 processes:
+    scorpio -r -e jpg -e jpeg -j 8 ./data
 """
 
 import argparse
+import fnmatch
 import logging
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from PIL import Image, UnidentifiedImageError
-import exifread
+from functools import partial
 from termcolor import cprint
+from tools.parse_utils import positive_int_type
+
+# The largest number of files sent at once to a worker process
+CHUNK_SIZE = 64
 
 
 def display(information: dict):
@@ -92,14 +110,61 @@ def display(information: dict):
             print(f"{key.capitalize():40} {value}")
 
 
-def parse_file(filepath: str, thumbnail: bool) -> None:
+def find_files(
+    paths: list, recursive: bool = False, extensions=None, patterns=None
+) -> list:
+    """
+    List the files to parse from the files and directories given.
+
+    :param paths: The paths of the files and directories, in order.
+    :param recursive: Whether the subdirectories of the directories are searched.
+    :param extensions: The extensions of the files of the directories to parse,
+     such as "jpg" or ".jpg", all of them if None.
+    :param patterns: The glob patterns one of which the names of the files of
+     the directories must match, all of them if None.
+
+    The files given are kept whatever their extension and name, in their order.
+    The files of a directory follow each other, sorted by path. Paths which are
+    neither files nor directories are logged to the log file and skipped.
+
+    Example usage:
+    find_files(["image.jpg", "./data"], recursive=True, extensions=["png"])
     """
-    Parse metadata from a file, including owner ID, creation time, and EXIF data (if available).
+    if extensions:
+        extensions = tuple(
+            "." + extension.lower().lstrip(".") for extension in extensions
+        )
+
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+            continue
+        if not os.path.isdir(path):
+            logging.error("%s is not a file", path)
+            continue
+        for root, directories, names in os.walk(path):
+            # Walks the subdirectories in order, or not at all
+            directories[:] = sorted(directories) if recursive else []
+            for name in sorted(names):
+                if extensions and not name.lower().endswith(extensions):
+                    continue
+                if patterns and not any(
+                    fnmatch.fnmatch(name, pattern) for pattern in patterns
+                ):
+                    continue
+                files.append(os.path.join(root, name))
+    return files
+
+
+def read_file(filepath: str, thumbnail: bool) -> dict:
+    """
+    Read metadata from a file, including owner ID, creation time, and EXIF data (if available).
 
     :param filepath: A string representing the path to the file.
     :param thumbnail: A boolean indicating whether to generate a thumbnail if possible.
 
-    This function parses various metadata from the specified file,
+    This function reads various metadata from the specified file,
     including the filename, extension, file stats, image format, resolution,
     and any additional image information. If the file is an image,
     it also extracts EXIF (Exchangeable Image File Format) data.
@@ -110,19 +175,25 @@ def parse_file(filepath: str, thumbnail: bool) -> None:
     saved in the same directory with "_thumbnail" appended to
     the original filename.
 
-    Note: This function may raise an UnidentifiedImageError
-     if the specified file is not an image. In this case, a log is added to the log file.
+    Files which are not images or cannot be read, and thumbnails which cannot
+    be written, are logged to the log file, and the metadata read until then
+    is returned.
 
     Example usage:
-    parse_file("example.jpg", thumbnail=True)
+    information = read_file("example.jpg", thumbnail=True)
     """
+    # pylint: disable=import-outside-toplevel
+    # Pillow and exifread are only imported once a file is parsed
+    from PIL import Image, UnidentifiedImageError
+    import exifread
+
     information = {}
     filename, extension = os.path.splitext(filepath)
     information["filename"] = filename
     information["extension"] = extension
-    information["stats"] = os.stat(filepath)
 
     try:
+        information["stats"] = os.stat(filepath)
         with Image.open(filepath) as img:
             information["format"] = img.format
             information["resolution"] = img.size
@@ -135,18 +206,69 @@ def parse_file(filepath: str, thumbnail: bool) -> None:
                     information[key] = value
     except UnidentifiedImageError:
         logging.error("%s is not an image", filepath)
+    except OSError as error:
+        logging.error("Could not read %s: %s", filepath, error)
 
-    finally:
-        display(information)
-        if (
-            thumbnail
-            and "exif" in information
-            and "JPEGThumbnail" in information["exif"]
-        ):
-            basename, extension = os.path.splitext(filepath)
-            thumbnailpath = f"{basename}_thumbnail{extension}"
+    if thumbnail and "exif" in information and "JPEGThumbnail" in information["exif"]:
+        thumbnailpath = f"{filename}_thumbnail{extension}"
+        try:
             with open(thumbnailpath, "wb") as file:
                 file.write(information["exif"]["JPEGThumbnail"])
+        except OSError as error:
+            logging.error("Could not write %s: %s", thumbnailpath, error)
+    return information
+
+
+def parse_file(filepath: str, thumbnail: bool) -> None:
+    """
+    Parse metadata from a file and display it.
+
+    :param filepath: A string representing the path to the file.
+    :param thumbnail: A boolean indicating whether to generate a thumbnail if possible.
+
+    Example usage:
+    parse_file("example.jpg", thumbnail=True)
+    """
+    display(read_file(filepath, thumbnail))
+
+
+def _initialize() -> None:
+    """Logs the errors of a worker process to the log file."""
+    logging.basicConfig(filename="scorpio.log", encoding="utf-8", level=logging.ERROR)
+
+
+def parse_files(filepaths: list, thumbnail: bool, jobs: int = 1):
+    """
+    Read metadata from files, in worker processes if there are several jobs.
+
+    :param filepaths: The paths of the files.
+    :param thumbnail: A boolean indicating whether to generate thumbnails if possible.
+    :param jobs: The number of processes reading the files.
+
+    The metadata of the files is yielded in the order of the paths, as soon as
+    the files before it are read, so that the output of a run does not depend
+    on the number of processes. The files are sent to the workers in chunks.
+    Workers are started with the "spawn" method, like those parsing pages.
+
+    Example usage:
+    for information in parse_files(["a.jpg", "b.jpg"], thumbnail=False, jobs=2):
+        display(information)
+    """
+    if jobs == 1 or len(filepaths) < 2:
+        for filepath in filepaths:
+            yield read_file(filepath, thumbnail)
+        return
+
+    # Chunks keep every worker busy until the last files
+    chunksize = max(1, min(CHUNK_SIZE, len(filepaths) // (jobs * 4)))
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_initialize,
+    ) as executor:
+        yield from executor.map(
+            partial(read_file, thumbnail=thumbnail), filepaths, chunksize=chunksize
+        )
 
 
 def parse():
@@ -160,8 +282,12 @@ def parse():
         scorpio [OPTIONS] files
 
     Options:
-        files               A list of files.
+        files               A list of files and directories.
         -t, --thumbnail     Downloads the file's thumbnail.
+        -r, --recursive     Also parse the files of the subdirectories.
+        -e, --extension     An extension of the files of the directories to parse.
+        -g, --glob          A pattern of the names of the files of the directories.
+        -j, --jobs          The number of processes parsing files (default: 1).
     """
 
     parser = argparse.ArgumentParser(
@@ -169,7 +295,9 @@ def parse():
         epilog="Developed by louisabricot",
     )
 
-    parser.add_argument("files", nargs="+", help="the files to parse")
+    parser.add_argument(
+        "files", nargs="+", help="the files, and directories of files, to parse"
+    )
 
     parser.add_argument(
         "--thumbnail",
@@ -177,13 +305,43 @@ def parse():
         action="store_true",
         help="Downloads the file's thumbnail",
     )
+
+    parser.add_argument(
+        "--recursive",
+        "-r",
+        action="store_true",
+        help="Also parses the files of the subdirectories of the directories",
+    )
+
+    parser.add_argument(
+        "--extension",
+        "-e",
+        action="append",
+        default=None,
+        help="Only parses the files of the directories with this extension, "
+        "repeated for each extension",
+    )
+
+    parser.add_argument(
+        "--glob",
+        "-g",
+        action="append",
+        default=None,
+        help="Only parses the files of the directories whose name matches this "
+        "pattern, such as 'IMG_*', repeated for each pattern",
+    )
+
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=positive_int_type,
+        default=1,
+        help="The number of processes parsing files. Default is 1",
+    )
     args = parser.parse_args()
 
     logging.basicConfig(filename="scorpio.log", encoding="utf-8", level=logging.ERROR)
 
-    for file in args.files:
-        if not os.path.isfile(file):
-            logging.error("%s is not a file", file)
-            args.files.remove(file)
-        else:
-            parse_file(file, args.thumbnail)
+    files = find_files(args.files, args.recursive, args.extension, args.glob)
+    for information in parse_files(files, args.thumbnail, args.jobs):
+        display(information)
@@ -6,6 +6,8 @@ This module defines a web crawling and file downloading tool called "Spider".
 Spider is designed to crawl a specified website, extract files,
 and download them to a specified directory.
 It supports recursive crawling and allows users to filter files by extensions.
+Files are found in links, images and their `srcset`, `<picture>` sources,
+CSS `url(...)` and `og:image` meta tags.
 
 Usage:
 To use Spider, run this script from the command line with the following options:
@@ -24,6 +26,129 @@ Options:
 
 - `-p`: Specify the path where downloaded files will be saved (default: ./data).
 
+- `-c, --concurrency`: The maximum number of pages fetched at once (default: 1).
+
+- `--per-host`: The maximum number of pages fetched at once from a single host
+        (default: same as --concurrency).
+
+- `--max-size, --max-bytes`: The maximum size of a downloaded file, such as
+        500K or 10M (default: no limit).
+
+- `--min-bytes`: The minimum size of a downloaded file, such as 2K. Files
+        announcing a smaller Content-Length are skipped before their body is
+        transferred (default: no limit).
+
+- `--min-dimensions`: The minimum width and height of a downloaded image,
+        such as 64x64. The dimensions are read from the first bytes of PNG,
+        GIF, BMP, WebP and JPEG images, and smaller images are skipped before
+        the rest of their body is transferred (default: no limit).
+
+- `--verify-type`: Skip files served as, or whose first bytes are, another
+        type than the one of their extension, such as HTML error pages
+        served under image URLs.
+
+- `--pool-size`: The number of connections kept open to each host, so that
+        requests skip the TCP and TLS handshakes (default: 10, or --per-host
+        if higher).
+
+- `--pool-hosts`: The number of hosts whose connections are kept open
+        (default: 10).
+
+- `--dns-ttl`: The number of seconds the addresses of a host are cached,
+        0 to resolve them on every new connection (default: 300).
+
+- `--http2`: Send the requests over HTTP/2 to the hosts offering it in the
+        TLS handshake, multiplexing the requests to a host over a single
+        connection. Requires the httpx and h2 packages.
+
+- `--http2-prior-knowledge`: Send the requests over HTTP/2 to every host,
+        including over cleartext connections.
+
+- `--parse-workers`: The number of threads parsing pages (default: 1).
+
+- `--parse-processes`: The number of processes parsing pages, so that
+        parsing runs on several cores (default: 0, pages are parsed by the
+        --parse-workers threads).
+
+- `--download-workers`: The number of threads downloading files (default: 4).
+
+- `--cache`: The directory of the HTTP cache. Pages and files are revalidated
+        with conditional requests and served from it when unchanged.
+
+- `--state`: The SQLite file where the progress of the crawl is checkpointed.
+
+- `--resume`: Resume the crawl saved in the --state file.
+
+- `--store`: Save files under --path by the hash of their content, in a
+        sharded ab/cd/<hash>.<ext> layout with a manifest.jsonl mapping URLs
+        to hashes. Identical files are stored once.
+
+- `--priority`: The order in which pages are crawled: `bfs` crawls by
+        increasing number of links from the URL, `files` first crawls the
+        pages linked from pages where files were found (default: bfs).
+
+- `--max-hops`: The maximum number of links followed from the URL
+        (default: no limit).
+
+- `--rate`: The maximum number of requests per second sent to a host
+        (default: no limit until the host answers 429 or 503). Requests to a
+        host are also spaced by the Crawl-delay of its robots.txt, slowed down
+        on 429 and 503 responses and paused for their Retry-After.
+
+- `--ignore-robots`: Do not read robots.txt.
+
+- `--sitemap`: Also crawl the pages listed by the sitemaps of the website,
+        read from the Sitemap lines of its robots.txt or /sitemap.xml. With
+        --cache, pages whose lastmod is older than their cached copy are
+        skipped.
+
+- `--retries`: The number of times a request failing with a connection
+        error, a timeout or a server error is sent again, after an
+        exponential backoff with jitter (default: 3). Timeouts adapt to the
+        latency observed on each host.
+
+- `--hedge`: Send a second request when a response takes longer than the
+        95th percentile latency of its host, and use the first answer.
+
+- `--queue`: The SQLite file of a queue shared by workers crawling together,
+        on this host or on other hosts sharing the file. Each host is crawled
+        by a single worker at a time, and the pages and files claimed by a
+        worker which stopped are handed out again after --lease seconds. A
+        crawl started again with the same file resumes. The workers fetch
+        --concurrency pages and files at once, and --queue cannot be used
+        with --state, --store, --sitemap, --manifest, --visited-error-rate,
+        --priority or the --parse and --download options.
+
+- `--workers`: The number of worker processes crawling the --queue on this
+        host (default: 1). As each host is crawled by a single worker, the
+        pages of one website are all fetched by one worker, at --concurrency
+        pages at once: more workers only help once the queue holds several
+        hosts, such as files served by other hosts, or other websites queued
+        by running the spider against the same --queue with their URL.
+
+- `--lease`: The number of seconds after which the work of a stopped worker
+        is handed out again (default: 60).
+
+- `--manifest`: The JSON Lines file where a record of each page and file is
+        written as soon as it is done, with its URL, status, depth, size,
+        content type, duration and saved path.
+
+- `--stats`: The JSON file where the metrics of the crawl are saved
+        periodically: the latency of the requests per host, the time to parse
+        a page, the pages, files and bytes per second, the depth of the
+        queues and the errors per class. They are also saved in the
+        Prometheus text format to the same path with a .prom extension. With
+        --workers, each worker process saves its own files, named after its
+        process ID.
+
+- `--stats-interval`: The number of seconds between two saves of the
+        --stats files (default: 10).
+
+- `--visited-error-rate`: Record the URLs seen in a compact structure taking
+        an unseen URL for a seen one at most at this rate, between 0 and 1:
+        64-bit fingerprints below 1e-6, a scalable Bloom filter above
+        (default: exact sets).
+
 This script utilizes the termcolor library to provide colored console output
 for better user experience. It also logs errors to a file named "spider.log".
 
@@ -36,12 +161,29 @@ Developed by louisabricot
 
 import sys
 import os
+import sqlite3
 import argparse
 import logging
 from termcolor import cprint, colored
-from tools.parse_utils import url_type, range_limited_int_type
-from tools.scrape import scrape_urls, scrape_files
-from tools.download import download_file
+from tools.parse_utils import (
+    url_type,
+    range_limited_int_type,
+    positive_int_type,
+    positive_float_type,
+    rate_type,
+    size_type,
+    dimensions_type,
+)
+from tools.filters import FileFilter
+from tools.frontier import PRIORITIES
+from tools import metrics
+from tools.state import CrawlState
+from tools.store import ContentStore
+from tools.url_utils import normalize_url
+from tools.workqueue import FILE, PAGE, WorkQueue
+
+# The modules importing requests, bs4 or httpx are imported by the functions
+# using them, so that --help and invalid options answer without loading them
 
 LOGO = r"""                   .                                          ||
                    .                                          || 
@@ -60,8 +202,26 @@ LOGO = r"""                   .                                          ||
                                                       (  // ()\/() \\  ) """
 
 
-def crawl_website(
-    url: str, depth: int, extensions: list, directory: str, verbose: bool
+def crawl_website(  # pylint: disable=too-many-arguments
+    url: str,
+    depth: int,
+    extensions: list,
+    directory: str,
+    verbose: bool,
+    concurrency: int = 1,
+    per_host: int = None,
+    max_size: int = None,
+    file_filter: FileFilter = None,
+    parse_workers: int = 1,
+    download_workers: int = 4,
+    parse_processes: int = 0,
+    state: CrawlState = None,
+    store: ContentStore = None,
+    priority: str = "bfs",
+    max_hops: int = None,
+    false_positive_rate: float = None,
+    sitemap: bool = False,
+    manifest: str = None,
 ) -> None:
     """
     Crawls a website, extracts files, and dowloads them.
@@ -70,6 +230,25 @@ def crawl_website(
         url (str): The URL of the website to crawl.
         depth (int): The maximum depth of recursive crawling.
         directory (str): The directory where downloaded files.
+        concurrency (int): The maximum number of pages fetched at once.
+        per_host (int): The maximum number of pages fetched at once from a
+            single host.
+        max_size (int): The maximum size in bytes of a downloaded file.
+        file_filter (FileFilter): The filter the files must pass to be
+            downloaded.
+        parse_workers (int): The number of threads parsing pages.
+        download_workers (int): The number of threads downloading files.
+        parse_processes (int): The number of processes parsing pages, 0 to
+            parse them in the parse threads.
+        state (CrawlState): The checkpoint of the crawl.
+        store (ContentStore): The content-addressed store of the files.
+        priority (str): The name of the priority of the frontier.
+        max_hops (int): The maximum number of links followed from the URL.
+        false_positive_rate (float): The false-positive rate of the visited
+            set, None for exact sets.
+        sitemap (bool): If True, the pages of the sitemaps are crawled too.
+        manifest (str): The JSON Lines file where the record of each page and
+            file is written as soon as it is done.
 
     Returns:
         None
@@ -77,47 +256,169 @@ def crawl_website(
 
     if depth > 0:
         cprint(
-            f"\n\n 🕸️   Finding paths from {url} with depth {depth}...",
+            f"\n\n 🕸️   Finding paths and files ending with {extensions} "
+            f"from {url} with depth {depth}, downloading them to {directory}...",
             "white",
             attrs=["bold"],
         )
-
-        # Scrape nested URLs
-        urls = scrape_urls(url, depth)
-        print(f"Found {colored(len(urls), 'white', 'on_yellow')} URLs")
     else:
-        urls = [url]
+        cprint(
+            f" 🔍  Scraping {url} for files ending with {extensions}, "
+            f"downloading them to {directory}...",
+            "white",
+            attrs=["bold"],
+        )
 
-    if verbose:
-        for url in urls:
-            print(url)
-    # Scraping files with provided extensions
-    cprint(
-        f" 🔍  Scraping {len(urls)} URLs for files ending with {extensions}...",
-        "white",
-        attrs=["bold"],
-    )
+    # pylint: disable=import-outside-toplevel
+    from tools.pipeline import run_pipeline
+    from tools.records import ManifestWriter
+
+    writer = ManifestWriter(manifest) if manifest is not None else None
+    # Pages are fetched, parsed and their files downloaded concurrently, and
+    # only collected to be listed
+    try:
+        result = run_pipeline(
+            url,
+            depth,
+            extensions,
+            directory,
+            workers=(concurrency, parse_workers, download_workers),
+            per_host=per_host,
+            max_size=max_size,
+            file_filter=file_filter,
+            state=state,
+            store=store,
+            priority=PRIORITIES[priority],
+            max_hops=max_hops,
+            false_positive_rate=false_positive_rate,
+            sitemap=sitemap,
+            parse_processes=parse_processes,
+            on_record=writer.write if writer is not None else None,
+            collect=verbose,
+        )
+    finally:
+        if writer is not None:
+            writer.close()
 
-    files = {file for url in urls for file in scrape_files(url, extensions)}
-    print(f"Found {colored(len(files), 'white', 'on_yellow')} files")
+    if depth > 0:
+        print(
+            f"Found {colored(result.html_pages, 'white', 'on_yellow')} URLs "
+            f"in {result.requests} requests"
+        )
+        if result.unchanged:
+            print(f"Skipped {result.unchanged} pages unchanged since cached")
+        if verbose:
+            for url in {page.url for page in result.pages if page.html}:
+                print(url)
+
+    print(f"Found {colored(result.found_files, 'white', 'on_yellow')} files")
     if verbose:
-        for file in files:
+        for file in result.files:
             print(file)
 
-    # Downloads files
+    downloaded = result.downloaded
+    print(f"Successfully downloaded {colored(downloaded, 'white', 'on_yellow')} files")
+    if result.skipped:
+        print(f"Skipped {result.skipped} files rejected by the filters")
+    if verbose and result.first_download is not None:
+        print(f"First file downloaded after {result.first_download:.2f}s")
+
+    cprint(" ✅  Done!", "light_green", attrs=["bold"])
+    if writer is not None:
+        print(f"Wrote {writer.count} records to {manifest}")
+    if downloaded + result.skipped < result.found_files:
+        print("Check the spider.log file for more information\n")
+
+
+def crawl_queue(  # pylint: disable=too-many-arguments
+    url: str,
+    depth: int,
+    extensions: list,
+    directory: str,
+    path: str,
+    workers: int = 1,
+    concurrency: int = 1,
+    lease: float = 60.0,
+    max_size: int = None,
+    max_hops: int = None,
+    file_filter: FileFilter = None,
+    transport_options: dict = None,
+    stats: tuple = None,
+) -> None:
+    """
+    Crawls a website with workers sharing a queue, extracts files, and
+    downloads them.
+
+    Args:
+        url (str): The URL of the website to crawl.
+        depth (int): The maximum depth of recursive crawling.
+        directory (str): The directory where downloaded files.
+        path (str): The path of the queue shared by the workers.
+        workers (int): The number of worker processes on this host.
+        concurrency (int): The number of pages and files fetched at once by
+            each worker.
+        lease (float): The number of seconds after which the work of a
+            stopped worker is handed out again.
+        max_size (int): The maximum size in bytes of a downloaded file.
+        max_hops (int): The maximum number of links followed from the URL.
+        file_filter (FileFilter): The filter the files must pass to be
+            downloaded.
+        transport_options (dict): The options of the transport of the workers.
+        stats (tuple): The path and the interval of the metrics of the
+            worker processes.
+
+    Returns:
+        None
+    """
+    from tools.workers import run_workers  # pylint: disable=import-outside-toplevel
+
     cprint(
-        f" ⬇️   Downloading {len(files)} files to {directory}...",
+        f"\n\n 🕸️   Crawling {url} with {workers} workers sharing {path}, "
+        f"downloading files ending with {extensions} to {directory}...",
         "white",
         attrs=["bold"],
     )
 
-    downloaded = sum(download_file(directory, file) for file in files)
-
-    print(f"Successfully downloaded {colored(downloaded, 'white', 'on_yellow')} files")
+    work_queue = WorkQueue(path, lease=lease)
+    try:
+        work_queue.seed(url)
+    finally:
+        work_queue.close()
+
+    result = run_workers(
+        workers,
+        path,
+        depth,
+        extensions,
+        directory,
+        concurrency=concurrency,
+        lease=lease,
+        max_size=max_size,
+        max_hops=max_hops,
+        file_filter=file_filter,
+        transport_options=transport_options,
+        stats=stats,
+    )
 
+    work_queue = WorkQueue(path, lease=lease)
+    try:
+        counts = work_queue.counts()
+    finally:
+        work_queue.close()
+    pages = sum(count for (kind, _), count in counts.items() if kind == PAGE)
+    files = sum(count for (kind, _), count in counts.items() if kind == FILE)
+    print(
+        f"Fetched {colored(result.pages, 'white', 'on_yellow')} pages "
+        f"in {result.requests} requests, {pages} in the whole crawl"
+    )
+    print(f"Found {colored(files, 'white', 'on_yellow')} files in the whole crawl")
+    print(
+        "Successfully downloaded "
+        f"{colored(result.downloaded, 'white', 'on_yellow')} files"
+    )
+    if result.skipped:
+        print(f"Skipped {result.skipped} files rejected by the filters")
     cprint(" ✅  Done!", "light_green", attrs=["bold"])
-    if downloaded < len(files):
-        print("Check the spider.log file for more information\n")
 
 
 def crawl():
@@ -137,6 +438,38 @@ def crawl():
         -e, --extension             The file extensions we want to download
             (default: jpg, jpeg, png, gif and bmp)
         -p                          The path where downloaded files will be saved (default: ./data)
+        -c, --concurrency           The maximum number of pages fetched at once (default: 1)
+        --per-host                  The maximum number of pages fetched at once from a single host
+        --max-size, --max-bytes     The maximum size of a downloaded file (default: no limit)
+        --min-bytes                 The minimum size of a downloaded file (default: no limit)
+        --min-dimensions            The minimum WxH of a downloaded image (default: no limit)
+        --verify-type               Skip files whose content is not of the type of their extension
+        --pool-size                 The connections kept open per host (default: 10 or --per-host)
+        --pool-hosts                The hosts whose connections are kept open (default: 10)
+        --dns-ttl                   The seconds host addresses are cached (default: 300)
+        --http2                     Use HTTP/2 with the hosts offering it over TLS
+        --http2-prior-knowledge     Use HTTP/2 with every host, even without TLS
+        --parse-workers             The number of threads parsing pages (default: 1)
+        --parse-processes           The number of processes parsing pages (default: 0)
+        --download-workers          The number of threads downloading files (default: 4)
+        --cache                     The directory of the HTTP cache (default: no cache)
+        --state                     The file where the progress of the crawl is checkpointed
+        --resume                    Resume the crawl saved in the --state file
+        --store                     Save files by content hash with a URL manifest
+        --priority                  The crawl order, bfs or files (default: bfs)
+        --max-hops                  The maximum number of links followed from the URL
+        --rate                      The maximum number of requests per second to a host
+        --ignore-robots             Do not read robots.txt
+        --sitemap                   Also crawl the pages listed by the sitemaps
+        --retries                   The number of times a failed request is retried (default: 3)
+        --hedge                     Hedge requests slower than the p95 latency of their host
+        --queue                     The SQLite file of a queue shared by several workers
+        --workers                   The number of worker processes on this host (default: 1)
+        --lease                     The seconds before the work of a stopped worker is handed out
+        --manifest                  The JSON Lines file where page and file records are streamed
+        --stats                     The JSON file where metrics are saved, along a .prom file
+        --stats-interval            The seconds between two saves of the metrics (default: 10)
+        --visited-error-rate        The false-positive rate of a compact visited set
     """
     # Se up command-line argument parser
     parser = argparse.ArgumentParser(
@@ -186,9 +519,266 @@ def crawl():
         help="file extensions to download. Default is jpg, jpeg, gif, png and bmp",
     )
 
+    parser.add_argument(
+        "--concurrency",
+        "-c",
+        type=positive_int_type,
+        default=1,
+        help="the maximum number of pages fetched at once. Default is 1",
+    )
+
+    parser.add_argument(
+        "--per-host",
+        type=positive_int_type,
+        default=None,
+        help="the maximum number of pages fetched at once from a single host. "
+        "Default is the value of --concurrency",
+    )
+
+    parser.add_argument(
+        "--max-size",
+        "--max-bytes",
+        type=size_type,
+        default=None,
+        help="the maximum size of a downloaded file, such as 500K or 10M. "
+        "Larger files are skipped. Default is no limit",
+    )
+
+    parser.add_argument(
+        "--min-bytes",
+        type=size_type,
+        default=None,
+        help="the minimum size of a downloaded file, such as 2K. Smaller files "
+        "are skipped, before their body is transferred when their size is "
+        "announced. Default is no limit",
+    )
+
+    parser.add_argument(
+        "--min-dimensions",
+        type=dimensions_type,
+        default=None,
+        help="the minimum width and height of a downloaded image, such as "
+        "64x64, read from its first bytes. Smaller images are skipped before "
+        "the rest of their body is transferred. Default is no limit",
+    )
+
+    parser.add_argument(
+        "--verify-type",
+        action="store_true",
+        help="skip files served as, or whose first bytes are, another type "
+        "than the one of their extension",
+    )
+
+    parser.add_argument(
+        "--pool-size",
+        type=positive_int_type,
+        default=None,
+        help="the number of connections kept open to each host, so that "
+        "requests skip the TCP and TLS handshakes. Default is 10, or the "
+        "value of --per-host if higher",
+    )
+
+    parser.add_argument(
+        "--pool-hosts",
+        type=positive_int_type,
+        default=None,
+        help="the number of hosts whose connections are kept open. Default is 10",
+    )
+
+    parser.add_argument(
+        "--dns-ttl",
+        type=float,
+        default=None,
+        help="the number of seconds the addresses of a host are cached, 0 to "
+        "resolve them on every new connection. Default is 300",
+    )
+
+    # The modes of tools.http2, which imports httpx
+    parser.add_argument(
+        "--http2",
+        action="store_const",
+        const="negotiate",
+        default=None,
+        help="send the requests over HTTP/2 to the hosts offering it in the TLS "
+        "handshake, multiplexing the requests to a host over one connection. "
+        "Requires the httpx and h2 packages",
+    )
+
+    parser.add_argument(
+        "--http2-prior-knowledge",
+        dest="http2",
+        action="store_const",
+        const="prior-knowledge",
+        help="send the requests over HTTP/2 to every host, including over "
+        "cleartext connections",
+    )
+
+    parser.add_argument(
+        "--parse-workers",
+        type=positive_int_type,
+        default=1,
+        help="the number of threads parsing pages. Default is 1",
+    )
+
+    parser.add_argument(
+        "--parse-processes",
+        type=int,
+        default=0,
+        help="the number of processes parsing pages, to parse on several "
+        "cores. Default is 0, pages are parsed by the --parse-workers threads",
+    )
+
+    parser.add_argument(
+        "--download-workers",
+        type=positive_int_type,
+        default=4,
+        help="the number of threads downloading files. Default is 4",
+    )
+
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help="the directory of the HTTP cache. Unchanged pages and files are "
+        "served from it on re-crawls. Default is no cache",
+    )
+
+    parser.add_argument(
+        "--state",
+        type=str,
+        default=None,
+        help="the SQLite file where the progress of the crawl is checkpointed",
+    )
+
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="resume the crawl saved in the --state file",
+    )
+
+    parser.add_argument(
+        "--store",
+        action="store_true",
+        help="save files by the hash of their content in a sharded layout, "
+        "with a manifest mapping each URL to its hash",
+    )
+
+    parser.add_argument(
+        "--priority",
+        choices=sorted(PRIORITIES),
+        default="bfs",
+        help="the order in which pages are crawled: bfs by increasing number "
+        "of links from the URL, files first near pages with files. Default is bfs",
+    )
+
+    parser.add_argument(
+        "--max-hops",
+        type=positive_int_type,
+        default=None,
+        help="the maximum number of links followed from the URL. Default is no limit",
+    )
+
+    parser.add_argument(
+        "--rate",
+        type=positive_float_type,
+        default=None,
+        help="the maximum number of requests per second sent to a host. "
+        "Default is no limit until the host answers 429 or 503",
+    )
+
+    parser.add_argument(
+        "--ignore-robots",
+        action="store_true",
+        help="do not read robots.txt, nor honor its rules and Crawl-delay",
+    )
+
+    parser.add_argument(
+        "--sitemap",
+        action="store_true",
+        help="also crawl the pages listed by the sitemaps of the website, "
+        "skipping those older than their copy in the --cache",
+    )
+
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="the number of times a request failing with a connection error, "
+        "a timeout or a server error is sent again. Default is 3",
+    )
+
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="send a second request when a response is slower than the 95th "
+        "percentile latency of its host, and use the first answer",
+    )
+
+    parser.add_argument(
+        "--queue",
+        type=str,
+        default=None,
+        help="the SQLite file of a queue shared by workers crawling together, "
+        "on this host or on other hosts sharing the file. Each host is crawled "
+        "by one worker at a time",
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=positive_int_type,
+        default=1,
+        help="the number of worker processes crawling the --queue on this "
+        "host. Each host is crawled by a single worker, so the pages of one "
+        "website are fetched by one worker. Default is 1",
+    )
+
+    parser.add_argument(
+        "--lease",
+        type=positive_float_type,
+        default=60.0,
+        help="the number of seconds after which the pages and files claimed by "
+        "a stopped worker are handed out again. Default is 60",
+    )
+
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="the JSON Lines file where a record of each page and file is "
+        "written as soon as it is done, with its URL, status, depth, size, "
+        "content type, duration and saved path",
+    )
+
+    parser.add_argument(
+        "--stats",
+        type=str,
+        default=None,
+        help="the JSON file where the metrics of the crawl are saved "
+        "periodically, also saved in the Prometheus text format to the same "
+        "path with a .prom extension",
+    )
+
+    parser.add_argument(
+        "--stats-interval",
+        type=positive_float_type,
+        default=metrics.DEFAULT_INTERVAL,
+        help="the number of seconds between two saves of the --stats files. "
+        "Default is 10",
+    )
+
+    parser.add_argument(
+        "--visited-error-rate",
+        type=rate_type,
+        default=None,
+        help="record the URLs seen in a compact structure wrongly taking an "
+        "unseen URL for a seen one at this rate, such as 1e-9 for 64-bit "
+        "fingerprints or 0.001 for a Bloom filter. Default is exact sets",
+    )
+
     args = parser.parse_args()
 
     logging.basicConfig(filename="spider.log", level=logging.ERROR)
+    base_url = normalize_url(args.url)
 
     # Creates the download directory if it doesn't exist
     if not os.path.exists(args.path):
@@ -206,6 +796,74 @@ def crawl():
         parser.error("--level requires --recursive.")
     if not args.recursive:
         args.level = 0
+    if args.resume and args.state is None:
+        parser.error("--resume requires --state.")
+    if args.retries < 0:
+        parser.error("--retries must not be negative.")
+    if args.dns_ttl is not None and args.dns_ttl < 0:
+        parser.error("--dns-ttl must not be negative.")
+    # pylint: disable-next=import-outside-toplevel
+    from tools import http2, transport
+
+    if args.http2 is not None and not http2.available():
+        parser.error(
+            "--http2 requires the httpx and h2 packages: pip install 'httpx[http2]'."
+        )
+    if args.parse_processes < 0:
+        parser.error("--parse-processes must not be negative.")
+    if args.queue is None and args.workers > 1:
+        parser.error("--workers requires --queue.")
+    # The queue workers fetch and parse each URL they claim, in the order of
+    # the queue, which is also their record of the URLs seen
+    unsupported = [
+        "--" + name.replace("_", "-")
+        for name in (
+            "state",
+            "store",
+            "sitemap",
+            "manifest",
+            "visited_error_rate",
+            "priority",
+            "parse_processes",
+            "parse_workers",
+            "download_workers",
+        )
+        if getattr(args, name) != parser.get_default(name)
+    ]
+    if args.queue is not None and unsupported:
+        parser.error(f"--queue cannot be used with {', '.join(unsupported)}.")
+
+    state = None
+    if args.state is not None:
+        try:
+            state = CrawlState(args.state)
+            state.start(base_url, args.level, args.resume)
+        except (sqlite3.Error, ValueError) as error:
+            print(f"Could not use state file {args.state}: {error}")
+            sys.exit(-1)
+
+    # Every host is crawled politely, adapting to its responses
+    transport_options = {
+        "cache": args.cache,
+        "rate": args.rate,
+        "per_host": args.per_host or args.concurrency,
+        "robots": not args.ignore_robots,
+        "retries": args.retries,
+        "hedge": args.hedge,
+        "pool_hosts": args.pool_hosts,
+        "pool_size": args.pool_size,
+        "dns_ttl": args.dns_ttl,
+        "http2": args.http2,
+    }
+    # The options left unset keep the defaults of tools.connections
+    transport_options = {
+        name: value for name, value in transport_options.items() if value is not None
+    }
+    try:
+        transport.configure(**transport_options)
+    except OSError as error:
+        print(f"Could not create cache directory {args.cache}: {error}")
+        sys.exit(-1)
 
     cprint(LOGO, "light_grey", attrs=["bold"])
 
@@ -225,16 +883,82 @@ def crawl():
         print(
             f"    :: Recursion        : {colored(args.recursive, 'white', attrs=['bold'])}"
         )
+    print(
+        f"    :: Concurrency      : {colored(args.concurrency, 'white', attrs=['bold'])}"
+    )
     cprint(
         " ............................................................................\n",
         "dark_grey",
     )
 
+    store = ContentStore(args.path) if args.store else None
+
+    # Files are filtered from the headers and first bytes of their response
+    file_filter = None
+    if args.min_bytes is not None or args.min_dimensions or args.verify_type:
+        file_filter = FileFilter(args.min_bytes, args.min_dimensions, args.verify_type)
+
+    # Worker processes save their own metrics
+    writer = None
+    stats = (args.stats, args.stats_interval) if args.stats is not None else None
+    if stats is not None and (args.queue is None or args.workers == 1):
+        collector = metrics.Metrics()
+        metrics.configure(collector)
+        writer = metrics.StatsWriter(collector, args.stats, args.stats_interval)
+
+    if args.queue is not None:
+        try:
+            crawl_queue(
+                url=base_url,
+                depth=args.level,
+                extensions=args.extension,
+                directory=args.path,
+                path=args.queue,
+                workers=args.workers,
+                concurrency=args.concurrency,
+                lease=args.lease,
+                max_size=args.max_size,
+                max_hops=args.max_hops,
+                file_filter=file_filter,
+                transport_options=transport_options,
+                stats=stats,
+            )
+        except sqlite3.Error as error:
+            print(f"Could not use queue file {args.queue}: {error}")
+            sys.exit(-1)
+        finally:
+            if writer is not None:
+                writer.close()
+        return
+
     # Start crawling
-    crawl_website(
-        url=args.url.rstrip("/"),
-        depth=args.level,
-        extensions=args.extension,
-        directory=args.path,
-        verbose=args.verbose,
-    )
+    try:
+        crawl_website(
+            url=base_url,
+            depth=args.level,
+            extensions=args.extension,
+            directory=args.path,
+            verbose=args.verbose,
+            concurrency=args.concurrency,
+            per_host=args.per_host,
+            max_size=args.max_size,
+            file_filter=file_filter,
+            parse_workers=args.parse_workers,
+            download_workers=args.download_workers,
+            parse_processes=args.parse_processes,
+            state=state,
+            store=store,
+            priority=args.priority,
+            max_hops=args.max_hops,
+            false_positive_rate=args.visited_error_rate,
+            sitemap=args.sitemap,
+            manifest=args.manifest,
+        )
+    finally:
+        # Saves the progress even if the crawl is interrupted
+        if state is not None:
+            state.close()
+        if store is not None:
+            store.close()
+        if writer is not None:
+            writer.close()
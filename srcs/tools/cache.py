@@ -0,0 +1,333 @@
+"""
+HTTP Cache Module
+
+This module provides a persistent on-disk cache of HTTP responses, so that
+re-crawling a website only transfers what changed since the previous run.
+
+Each response is stored under the SHA-256 of its canonical URL, sharded by the
+first two hexadecimal digits of the key:
+
+    <directory>/ab/abcdef....json   the ETag, Last-Modified, content type,
+                                    body digest, and last saved path with
+                                    its size and modification time
+    <directory>/ab/abcdef....body   the body
+
+On the next request for the same URL, the stored validators are sent as
+`If-None-Match` and `If-Modified-Since`, and a `304 Not Modified` response is
+served from the stored body.
+
+The module includes the following:
+
+1. `cache_key`: Computes the key of a URL.
+
+2. `HTTPCache`: The on-disk cache.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+from urllib.parse import urlsplit, urlunsplit
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+def cache_key(url: str) -> str:
+    """
+    Computes the cache key of a URL. The scheme and host are case insensitive
+    and the fragment is never sent to the server, so they do not change the key.
+
+    Args:
+        url (str): The URL of the response.
+
+    Returns:
+        str: The hexadecimal SHA-256 of the canonical URL.
+    """
+    parts = urlsplit(url)
+    canonical = urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", parts.query, "")
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class HTTPCache:
+    """
+    A persistent on-disk cache of HTTP responses revalidated with conditional
+    requests.
+
+    Attributes:
+        directory (str): The directory where responses are stored.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url: str, suffix: str) -> str:
+        """Returns the path of the metadata or body file of a URL."""
+        key = cache_key(url)
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def body_path(self, url: str) -> str:
+        """
+        Returns the path of the cached body of a URL.
+
+        Args:
+            url (str): The requested URL.
+
+        Returns:
+            str: The path of the body file, which may not exist.
+        """
+        return self._path(url, ".body")
+
+    def _write_atomically(self, path: str, data: bytes) -> None:
+        """Writes a file through a temporary file renamed into place."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=os.path.dirname(path), suffix=".part", delete=False
+        ) as file:
+            file.write(data)
+        os.replace(file.name, path)
+
+    def _copy_atomically(self, source: str, path: str) -> None:
+        """Copies a file through a temporary file renamed into place."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=os.path.dirname(path), suffix=".part", delete=False
+        ) as file:
+            try:
+                with open(source, "rb") as source_file:
+                    shutil.copyfileobj(source_file, file)
+            except OSError:
+                file.close()
+                os.remove(file.name)
+                raise
+        os.replace(file.name, path)
+
+    def lookup(self, url: str) -> dict:
+        """
+        Returns the cache entry of a URL.
+
+        Args:
+            url (str): The requested URL.
+
+        Returns:
+            dict: The stored metadata, or None if the URL is not cached.
+        """
+        try:
+            with open(self._path(url, ".json"), "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self.body_path(url)):
+            return None
+        return entry
+
+    def stored_at(self, url: str) -> float:
+        """
+        Returns when the cached response of a URL was stored.
+
+        Args:
+            url (str): The requested URL.
+
+        Returns:
+            float: The POSIX timestamp, or None if the URL is not cached.
+        """
+        entry = self.lookup(url)
+        if not entry:
+            return None
+        return entry.get("stored")
+
+    @staticmethod
+    def conditional_headers(entry: dict) -> dict:
+        """
+        Builds the conditional request headers revalidating a cache entry.
+
+        Args:
+            entry (dict): The cache entry returned by `lookup`.
+
+        Returns:
+            dict: The `If-None-Match` and `If-Modified-Since` headers.
+        """
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    @staticmethod
+    def is_cacheable(response: requests.Response) -> bool:
+        """
+        Checks that a response can be revalidated later.
+
+        Args:
+            response (requests.Response): The response of a GET request.
+
+        Returns:
+            bool: True for successful responses carrying an ETag or a Last-Modified.
+        """
+        if response.status_code != 200:
+            return False
+        if "no-store" in response.headers.get("cache-control", ""):
+            return False
+        return "etag" in response.headers or "last-modified" in response.headers
+
+    def store(  # pylint: disable=too-many-arguments
+        self,
+        url: str,
+        response: requests.Response,
+        body: bytes = None,
+        path: str = None,
+        digest: str = None,
+    ) -> None:
+        """
+        Stores a response, with either its body in memory or the path of the
+        file where it was saved.
+
+        Args:
+            url (str): The requested URL.
+            response (requests.Response): The response to store.
+            body (bytes): The body of the response.
+            path (str): The file where the body was saved. It is copied into
+                the cache, so that editing the file does not change the
+                cached body.
+            digest (str): The SHA-256 of the saved file, computed if None.
+        """
+        body_path = self.body_path(url)
+        try:
+            if path is not None:
+                digest = digest or file_digest(path)
+                self._copy_atomically(path, body_path)
+            else:
+                digest = hashlib.sha256(body).hexdigest()
+                self._write_atomically(body_path, body)
+
+            self._write_entry(url, response, digest, path)
+        except OSError as e:
+            logging.error("Could not cache %s: %s", url, str(e))
+
+    def _write_entry(
+        self, url: str, response: requests.Response, digest: str, path: str
+    ) -> None:
+        """Writes the metadata of a stored response."""
+        saved = None
+        if path is not None:
+            # Tells whether the saved file was modified since, see
+            # transport.is_saved_copy_current
+            stat = os.stat(path)
+            saved = [stat.st_size, stat.st_mtime_ns]
+        entry = {
+            "url": url,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "content_type": response.headers.get("content-type", ""),
+            "digest": digest,
+            "path": path,
+            "saved": saved,
+            "stored": time.time(),
+        }
+        self._write_atomically(self._path(url, ".json"), json.dumps(entry).encode())
+
+    def store_stream(self, url: str, response: requests.Response, chunks):
+        """
+        Stores a response while its body is streamed, writing each chunk to
+        the cache as it is passed on. The body is only stored once the
+        stream is fully consumed.
+
+        Args:
+            url (str): The requested URL.
+            response (requests.Response): The response to store.
+            chunks (iterable): The chunks of the body, as bytes.
+
+        Yields:
+            bytes: The same chunks.
+        """
+        body_path = self.body_path(url)
+        digest = hashlib.sha256()
+        try:
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            # pylint: disable-next=consider-using-with
+            file = tempfile.NamedTemporaryFile(
+                "wb", dir=os.path.dirname(body_path), suffix=".part", delete=False
+            )
+        except OSError as e:
+            logging.error("Could not cache %s: %s", url, str(e))
+            yield from chunks
+            return
+
+        try:
+            with file:
+                for chunk in chunks:
+                    file.write(chunk)
+                    digest.update(chunk)
+                    yield chunk
+            os.replace(file.name, body_path)
+            self._write_entry(url, response, digest.hexdigest(), None)
+        except OSError as e:
+            logging.error("Could not cache %s: %s", url, str(e))
+        finally:
+            if os.path.exists(file.name):
+                os.remove(file.name)
+
+    def response(
+        self, url: str, entry: dict, stream: bool = False
+    ) -> requests.Response:
+        """
+        Builds a response from a cache entry.
+
+        Args:
+            url (str): The requested URL.
+            entry (dict): The cache entry returned by `lookup`.
+            stream (bool): If True, the body is read lazily from the cache so
+                that large files can be streamed.
+
+        Returns:
+            requests.Response: A 200 response flagged with `from_cache`.
+        """
+        body_path = self.body_path(url)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict({"content-type": entry["content_type"]})
+        response.headers["content-length"] = str(os.path.getsize(body_path))
+        if entry.get("etag"):
+            response.headers["etag"] = entry["etag"]
+        if entry.get("last_modified"):
+            response.headers["last-modified"] = entry["last_modified"]
+        response.encoding = get_encoding_from_headers(response.headers)
+
+        if stream:
+            # pylint: disable-next=consider-using-with
+            response.raw = open(body_path, "rb")
+        else:
+            with open(body_path, "rb") as file:
+                # pylint: disable=protected-access
+                response._content = file.read()
+                response._content_consumed = True
+
+        response.from_cache = True
+        response.cache_entry = entry
+        return response
+
+
+def file_digest(path: str) -> str:
+    """
+    Computes the SHA-256 of a file without loading it in memory.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,245 @@
+"""
+Connections Module
+
+This module keeps the connections of the crawl open between requests. The
+session built by `make_session` pools keep-alive connections per host, so
+that the requests following the first one to a host skip the TCP and TLS
+handshakes, and resolves host names through a `DNSCache`, so that the
+connections opened to a known host skip the DNS lookup. The session is shared
+by all the threads of a process: its pools are thread-safe, and it keeps no
+cookies between requests, like separate calls to `requests.get`.
+
+The connections opened and reused are counted in the "connections" metric.
+
+The module includes the following:
+
+1. `DNSCache`: A thread-safe cache of the addresses of host names, with a TTL.
+
+2. `PooledAdapter`: A transport adapter pooling the connections of each host
+   and resolving host names through a `DNSCache`.
+
+3. `make_session`: Builds a session pooling its connections, over HTTP/1.1
+   or HTTP/2.
+"""
+
+import time
+import socket
+import ipaddress
+import threading
+from functools import partial
+from http.cookiejar import DefaultCookiePolicy
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from tools import metrics
+
+# The number of hosts whose connections are kept open
+POOL_HOSTS = 10
+
+# The number of connections kept open per host
+POOL_SIZE = 10
+
+# The number of seconds a resolved host name is cached
+DNS_TTL = 300.0
+
+
+class DNSCache:
+    """
+    A thread-safe cache of the addresses of host names. Failed lookups are
+    not cached, so that they are retried by the next connection.
+
+    Attributes:
+        ttl (float): The number of seconds the addresses of a host are kept.
+    """
+
+    def __init__(self, ttl: float = DNS_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> list:
+        """
+        Returns the addresses of a host, looking them up if they are not
+        cached or expired.
+
+        Args:
+            host (str): The host name.
+            port (int): The port to connect to.
+
+        Returns:
+            list: The IP addresses of the host, in the order given by the
+            resolver.
+
+        Raises:
+            socket.gaierror: If the host name cannot be resolved.
+        """
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((host, port))
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        addresses = []
+        for *_, sockaddr in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM):
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        with self._lock:
+            self._entries[host, port] = (addresses, now + self.ttl)
+        return addresses
+
+    def forget(self, host: str, port: int) -> None:
+        """Removes the addresses of a host, which will be looked up again."""
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+
+class _ResolvedConnection:  # pylint: disable=too-few-public-methods
+    """Opens connections to the addresses of the host given by a `DNSCache`."""
+
+    dns_cache = None
+
+    def _new_conn(self) -> socket.socket:
+        """Connects to each address of the host in turn, until one answers."""
+        host = self._dns_host
+        # Without cache or address, urllib3 resolves and reports the errors
+        addresses = [host]
+        if self.dns_cache is not None:
+            try:
+                addresses = self.dns_cache.resolve(host, self.port) or addresses
+            except OSError:
+                pass
+
+        try:
+            for index, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    sock = super()._new_conn()
+                    break
+                except (NewConnectionError, ConnectTimeoutError):
+                    if index == len(addresses) - 1:
+                        if self.dns_cache is not None:
+                            self.dns_cache.forget(host, self.port)
+                        raise
+        finally:
+            self._dns_host = host
+        metrics.increment("connections", label="opened")
+        return sock
+
+
+class _ResolvedHTTPConnection(_ResolvedConnection, HTTPConnection):
+    """An HTTP connection resolving its host through a `DNSCache`."""
+
+
+class _ResolvedHTTPSConnection(_ResolvedConnection, HTTPSConnection):
+    """An HTTPS connection resolving its host through a `DNSCache`."""
+
+
+class _CountedPool:
+    """Counts the requests sent on connections kept open by a pool."""
+
+    def __init__(self, *args, dns_cache: DNSCache = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dns_cache = dns_cache
+
+    def _new_conn(self):
+        """Creates a connection resolving its host through the cache."""
+        conn = super()._new_conn()
+        conn.dns_cache = self.dns_cache
+        return conn
+
+    def _get_conn(self, timeout: float = None):
+        """Takes a connection from the pool, counting it if it is still open."""
+        conn = super()._get_conn(timeout)
+        if conn.sock is not None:
+            metrics.increment("connections", label="reused")
+        return conn
+
+
+class _HTTPConnectionPool(_CountedPool, HTTPConnectionPool):
+    """The HTTP connections kept open to a host."""
+
+    ConnectionCls = _ResolvedHTTPConnection
+
+
+class _HTTPSConnectionPool(_CountedPool, HTTPSConnectionPool):
+    """The HTTPS connections kept open to a host."""
+
+    ConnectionCls = _ResolvedHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    A transport adapter keeping up to `pool_size` connections open to each
+    of the last `pool_hosts` hosts it sent requests to. More connections are
+    opened when all those of a host are in use, and closed once used.
+
+    Attributes:
+        dns_cache (DNSCache): The cache resolving the host names, None to
+            resolve them on every connection.
+    """
+
+    def __init__(
+        self,
+        pool_hosts: int = POOL_HOSTS,
+        pool_size: int = POOL_SIZE,
+        dns_cache: DNSCache = None,
+    ):
+        self.dns_cache = dns_cache
+        super().__init__(pool_connections=pool_hosts, pool_maxsize=pool_size)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        """Creates the pool manager, using pools resolving through the cache."""
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": partial(_HTTPConnectionPool, dns_cache=self.dns_cache),
+            "https": partial(_HTTPSConnectionPool, dns_cache=self.dns_cache),
+        }
+
+
+def make_session(
+    pool_hosts: int = POOL_HOSTS,
+    pool_size: int = POOL_SIZE,
+    dns_ttl: float = DNS_TTL,
+    http2: str = None,
+) -> requests.Session:
+    """
+    Builds a session pooling its connections and caching the addresses of
+    the hosts.
+
+    Args:
+        pool_hosts (int): The number of hosts whose connections are kept open.
+        pool_size (int): The number of connections kept open per host.
+        dns_ttl (float): The number of seconds the addresses of a host are
+            cached. Host names are resolved on every connection if 0.
+        http2 (str): The mode of an `HTTP2Adapter` sending the requests over
+            HTTP/2 with a single connection per host, see `tools.http2`. The
+            addresses are then resolved by httpx. HTTP/1.1 is used if None.
+
+    Returns:
+        requests.Session: The session.
+
+    Raises:
+        ImportError: If HTTP/2 is requested without the httpx and h2 packages.
+    """
+    if http2 is not None:
+        # httpx is only imported when HTTP/2 is used
+        from tools.http2 import HTTP2Adapter  # pylint: disable=import-outside-toplevel
+
+        adapter = HTTP2Adapter(http2, pool_hosts)
+    else:
+        dns_cache = DNSCache(dns_ttl) if dns_ttl > 0 else None
+        adapter = PooledAdapter(pool_hosts, pool_size, dns_cache)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # Cookies are only kept across the redirections of a request
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
@@ -1,21 +1,51 @@
 """
 A collection of utility functions for file operations and downloading files from URLs.
 
-This module provides two main functions:
+This module provides the following:
 
 1. `generate_unique_filename(directory, filename)`:
    Generate a unique filename by appending a numeric counter if a file with the same name
    already exists in the specified directory.
 
-2. `download_file(directory, url)`:
+2. `FileResult`: The outcome of the download of a file: its status, size,
+   content type, duration and saved path.
+
+3. `fetch_file(directory, url, max_size, chunk_size, store, file_filter)`:
    Download a file from a given URL and save it to the specified directory.
+   The body is streamed in fixed-size chunks to a temporary file which is only
+   linked into place once complete, without replacing a file of the same name
+   saved meanwhile by another process. Files unchanged since a previous run are
+   served from the HTTP cache when it is enabled. Files can also be saved in a
+   content-addressed `ContentStore` which stores identical files only once.
+   A `FileFilter` skips files from the headers and first bytes of their
+   response, closing it before the rest of the body is transferred.
+
+4. `download_file(directory, url, max_size, chunk_size, store, file_filter)`:
+   Like `fetch_file`, only telling whether the file was saved.
 
 These functions are designed to assist in managing files and handling file downloads efficiently.
 """
 
 import os
+import time
+import hashlib
 import logging
+import itertools
+import tempfile
+import threading
+from dataclasses import dataclass
 import requests
+from tools import metrics, transport
+from tools.filters import HEAD_SIZE, FileFilter
+from tools.store import ContentStore
+
+CHUNK_SIZE = 64 * 1024
+
+# Serializes the allocation of unique filenames between download threads
+_filename_lock = threading.Lock()
+
+# The known names and the last counter of each filename, per directory
+_directory_names = {}
 
 
 def generate_unique_filename(directory: str, filename: str) -> str:
@@ -23,6 +53,10 @@ def generate_unique_filename(directory: str, filename: str) -> str:
     Generate a unique filename by appending a numeric counter if a file
     with the same name already exists in the directory.
 
+    The names of each directory are listed once and kept in memory along with
+    the last counter used for each filename, so allocating the N-th copy of a
+    common name such as "image.jpg" does not take N calls to `os.path.exists`.
+
     Parameters:
         directory (str): The directory where the file should be saved.
         filename (str): The desired filename.
@@ -30,52 +64,289 @@ def generate_unique_filename(directory: str, filename: str) -> str:
     Returns:
         str: A unique filename that does not already exist in the directory.
     """
-    # Get the full path of the desired file
-    fullpath = os.path.join(directory, filename)
-
-    if not os.path.exists(fullpath):
-        return fullpath
+    key = os.path.abspath(directory)
+    if key not in _directory_names:
+        _directory_names[key] = (set(os.listdir(directory)), {})
+    names, counters = _directory_names[key]
 
     # If the file exists, generate a unique filename
     basename, extension = os.path.splitext(filename)
-    counter = 1
+    counter = counters.get(filename, 0)
+    new_filename = filename if counter == 0 else f"{basename}_{counter}{extension}"
 
-    while True:
+    # Files may also be created by other processes
+    while new_filename in names or os.path.exists(
+        os.path.join(directory, new_filename)
+    ):
         # Generate a new filename with a numeric counter
+        counter += 1
         new_filename = f"{basename}_{counter}{extension}"
-        fullpath = os.path.join(directory, new_filename)
 
-        # If the new filename does not exist, return it
-        if not os.path.exists(fullpath):
-            return fullpath
+    counters[filename] = counter
+    names.add(new_filename)
+    return os.path.join(directory, new_filename)
 
-        counter += 1
 
+@dataclass
+class FileResult:  # pylint: disable=too-many-instance-attributes
+    """
+    The outcome of the download of a file.
 
-def download_file(directory: str, url: str) -> bool:
+    Attributes:
+        url (str): The URL of the file.
+        saved (bool): True if the file was saved, or was already saved
+            unchanged by a previous run.
+        status (int): The HTTP status of the response, None without response.
+        size (int): The number of bytes of the body.
+        content_type (str): The Content-Type of the response.
+        path (str): The path where the file is saved.
+        seconds (float): The duration of the download.
+        unchanged (bool): True if the file did not change since it was saved
+            by a previous run, so nothing was written.
+        skipped (str): The reason the file was rejected by the filter, None
+            if it was not.
     """
-    Download a file from a given URL and save it to a specified directory.
+
+    url: str
+    saved: bool = False
+    status: int = None
+    size: int = 0
+    content_type: str = None
+    path: str = None
+    seconds: float = 0.0
+    unchanged: bool = False
+    skipped: str = None
+
+
+def download_file(
+    directory: str,
+    url: str,
+    max_size: int = None,
+    chunk_size: int = CHUNK_SIZE,
+    store: ContentStore = None,
+    file_filter: FileFilter = None,
+) -> bool:
+    """
+    Download a file from a given URL and save it to a specified directory,
+    see `fetch_file`.
 
     Parameters:
         directory (str): The directory where the downloaded file should be saved.
         url (str): The URL of the file to be downloaded.
+        max_size (int): The maximum size of the file in bytes. No limit if None.
+        chunk_size (int): The size of the buffer used to stream the body.
+        store (ContentStore): If set, the file is saved in this content-addressed
+            store instead of under its name in the directory.
+        file_filter (FileFilter): If set, the file is only saved if it passes
+            this filter.
 
     Returns:
         bool: True if the file was successfully downloaded and saved, False otherwise.
     """
+    return fetch_file(directory, url, max_size, chunk_size, store, file_filter).saved
+
+
+def fetch_file(
+    directory: str,
+    url: str,
+    max_size: int = None,
+    chunk_size: int = CHUNK_SIZE,
+    store: ContentStore = None,
+    file_filter: FileFilter = None,
+) -> FileResult:
+    """
+    Download a file from a given URL and save it to a specified directory.
+
+    The body is streamed in chunks of `chunk_size` bytes to a temporary file in
+    the directory, so memory usage does not depend on the size of the file and
+    no partial file is ever left under its final name.
+
+    Parameters:
+        directory (str): The directory where the downloaded file should be saved.
+        url (str): The URL of the file to be downloaded.
+        max_size (int): The maximum size of the file in bytes. The download is
+            aborted as soon as it is exceeded. No limit if None.
+        chunk_size (int): The size of the buffer used to stream the body.
+        store (ContentStore): If set, the file is saved in this content-addressed
+            store instead of under its name in the directory.
+        file_filter (FileFilter): If set, the file is rejected as soon as the
+            headers or the first bytes of the response fail this filter, and
+            the response is closed without reading the rest of the body.
+            Files already saved unchanged by a previous run are kept.
+
+    Returns:
+        FileResult: The outcome of the download.
+    """
+    result = FileResult(url)
+    start = time.perf_counter()
+    temporary_path = None
     try:
-        # Sends GET request to the file URL
-        response = requests.get(url, allow_redirects=False, timeout=5)
+        # Sends GET request to the file URL, the body is read lazily
+        with transport.get(
+            url, allow_redirects=False, timeout=transport.DEFAULT_TIMEOUT, stream=True
+        ) as response:
+            result.status = response.status_code
+            result.content_type = response.headers.get("content-type")
+            response.raise_for_status()
 
-        response.raise_for_status()
+            # Nothing to write if the file did not change since the last run
+            if store is None and transport.is_saved_copy_current(response, directory):
+                result.path = response.cache_entry["path"]
+            elif store is not None:
+                result.path = _stored_path(store, url, response)
+            if result.path is not None:
+                result.size = os.path.getsize(result.path)
+                result.saved = result.unchanged = True
+                return result
 
-        fullpath = generate_unique_filename(directory, os.path.basename(url))
+            # Abort early if the announced size exceeds the limit
+            length = response.headers.get("content-length", "")
+            if max_size is not None and length.isdigit() and int(length) > max_size:
+                logging.error("File too large (%s bytes) for URL: %s", length, url)
+                return result
+
+            chunks = response.iter_content(chunk_size=chunk_size)
+            if file_filter is not None:
+                chunks, result.skipped = _filter(file_filter, url, response, chunks)
+                if result.skipped is not None:
+                    return result
 
-        # Copy the content of the file locally
-        with open(fullpath, "wb") as file:
-            file.write(response.content)
-        return True
+            with tempfile.NamedTemporaryFile(
+                "wb", dir=directory, prefix=".", suffix=".part", delete=False
+            ) as file:
+                temporary_path = file.name
+                size = 0
+                digest = hashlib.sha256()
+                for chunk in chunks:
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        logging.error(
+                            "File larger than %d bytes for URL: %s", max_size, url
+                        )
+                        return result
+                    digest.update(chunk)
+                    file.write(chunk)
+            if not getattr(response, "from_cache", False):
+                metrics.increment("bytes", size)
+            if file_filter is not None:
+                result.skipped = file_filter.check_size(size)
+                if result.skipped is not None:
+                    _log_skipped(url, result.skipped)
+                    return result
+
+        # Moves the complete file into place
+        if store is not None:
+            fullpath = store.add(url, temporary_path, digest.hexdigest())
+        else:
+            with _filename_lock:
+                fullpath = _move_unique(temporary_path, directory, url)
+        temporary_path = None
+        transport.store_download(url, response, fullpath, digest.hexdigest())
+        metrics.increment("files")
+        result.size, result.path, result.saved = size, fullpath, True
 
     except requests.exceptions.RequestException as e:
         logging.error("%s", str(e))
-    return False
+    except OSError as e:
+        logging.error("Could not save %s: %s", url, str(e))
+    finally:
+        if temporary_path is not None and os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        result.seconds = time.perf_counter() - start
+    return result
+
+
+def _filter(file_filter: FileFilter, url: str, response, chunks) -> tuple:
+    """
+    Checks a response against a filter, reading the first `HEAD_SIZE` bytes
+    of its body if the filter needs them.
+
+    Parameters:
+        file_filter (FileFilter): The filter.
+        url (str): The URL of the file.
+        response (requests.Response): The streamed response.
+        chunks (iterator): The chunks of the body.
+
+    Returns:
+        tuple: The chunks of the whole body, including those read, and the
+            reason the file is rejected, None if it is accepted.
+    """
+    reason = file_filter.check_headers(url, response.headers)
+    if reason is None and file_filter.reads_head:
+        head = []
+        size = 0
+        for chunk in chunks:
+            head.append(chunk)
+            size += len(chunk)
+            if size >= HEAD_SIZE:
+                break
+        reason = file_filter.check_head(url, b"".join(head)[:HEAD_SIZE])
+        chunks = itertools.chain(head, chunks)
+    if reason is not None:
+        _log_skipped(url, reason)
+    return chunks, reason
+
+
+def _log_skipped(url: str, reason: str) -> None:
+    """Records a file rejected by the filter."""
+    logging.info("Skipped %s: %s", url, reason)
+    metrics.increment("skipped", label=reason.split(":")[0])
+
+
+def _move_unique(temporary_path: str, directory: str, url: str) -> str:
+    """
+    Moves a downloaded file under a unique name in the directory. The file is
+    linked under the name, which unlike a rename fails instead of replacing a
+    file of the same name saved meanwhile by another process, in which case
+    the next name is tried. On file systems without hard links, the name is
+    reserved by creating an empty file, which the downloaded file replaces.
+
+    Parameters:
+        temporary_path (str): The path of the downloaded file.
+        directory (str): The directory where the file should be saved.
+        url (str): The URL of the file.
+
+    Returns:
+        str: The path of the saved file.
+    """
+    links = True
+    while True:
+        fullpath = generate_unique_filename(directory, os.path.basename(url))
+        try:
+            if links:
+                os.link(temporary_path, fullpath)
+            else:
+                os.close(os.open(fullpath, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        except OSError:
+            if not links:
+                raise
+            # The file system does not support hard links
+            links = False
+            continue
+        if links:
+            os.remove(temporary_path)
+        else:
+            os.replace(temporary_path, fullpath)
+        return fullpath
+
+
+def _stored_path(store: ContentStore, url: str, response: requests.Response) -> str:
+    """
+    Checks whether a response served from the HTTP cache is already in the
+    content-addressed store, in which case only its URL is recorded.
+
+    Parameters:
+        store (ContentStore): The content-addressed store.
+        url (str): The URL of the file.
+        response (requests.Response): The response returned by `transport.get`.
+
+    Returns:
+        str: The path of the stored content, None if it is not stored.
+    """
+    entry = getattr(response, "cache_entry", None)
+    extension = os.path.splitext(os.path.basename(url))[1]
+    if not entry or not store.contains(entry["digest"], extension):
+        return None
+    return store.record(url, entry["digest"], extension)
@@ -0,0 +1,206 @@
+"""
+Link Extraction Module
+
+This module extracts the URLs referenced by an HTML page without building a
+document tree. It is built on the event-based `html.parser.HTMLParser`: only
+the start tags carrying a reference are looked at, and the page can be fed in
+chunks as they arrive from the network, so references are emitted before the
+body is complete and a page is never buffered whole.
+
+Besides links and images, it collects the candidates of `srcset` attributes,
+the sources of `<picture>`, `<video>` and `<audio>` elements, the `url(...)`
+of inline styles and `<style>` elements, and the `og:image` and
+`twitter:image` meta tags.
+
+The module includes the following:
+
+1. `LinkExtractor`: An incremental parser collecting the references of a page.
+
+2. `iter_references`: Yields the references of a page fed in chunks.
+
+3. `extract_references`: Returns the references of a complete page.
+
+A reference is a `(tag, attribute, value)` tuple, such as `("a", "href", "/")`.
+"""
+
+import re
+from html.parser import HTMLParser
+
+# The attributes collected for each tag
+REFERENCE_ATTRIBUTES = {
+    "a": ("href",),
+    "link": ("href",),
+    "img": ("src", "srcset"),
+    "source": ("src", "srcset"),
+    "video": ("poster",),
+}
+
+# The attributes holding a comma-separated list of "url descriptor" candidates
+SRCSET_ATTRIBUTES = frozenset(("srcset",))
+
+# The meta tags whose content is the URL of an image of the page
+META_IMAGES = frozenset(
+    ("og:image", "og:image:url", "og:image:secure_url", "twitter:image")
+)
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""", re.IGNORECASE)
+
+
+def css_urls(css: str) -> list:
+    """
+    Returns the URLs of the `url(...)` functions of a style sheet.
+
+    Args:
+        css (str): The CSS declarations or style sheet.
+
+    Returns:
+        list: The URLs, in order.
+    """
+    return [match.group(2).strip() for match in CSS_URL.finditer(css)]
+
+
+def srcset_urls(srcset: str) -> list:
+    """
+    Returns the URLs of the candidates of a `srcset` attribute, such as
+    "small.jpg 480w, large.jpg 1080w".
+
+    Args:
+        srcset (str): The value of the attribute.
+
+    Returns:
+        list: The URLs, in order.
+    """
+    urls = []
+    for candidate in srcset.split(","):
+        parts = candidate.split()
+        if parts:
+            urls.append(parts[0])
+    return urls
+
+
+class LinkExtractor(HTMLParser):
+    """
+    An incremental HTML parser collecting the references of a page.
+
+    Attributes:
+        document (bool): True once the `<!DOCTYPE html>` declaration was seen.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.document = False
+        self._references = []
+        self._style = None
+
+    def handle_decl(self, decl: str) -> None:
+        """Records the HTML doctype declaration."""
+        if decl == "DOCTYPE html":
+            self.document = True
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        """Collects the reference attributes of a start tag."""
+        if tag == "style":
+            # The style sheet may come in several chunks
+            self._style = []
+        if not attrs:
+            return
+
+        # The last occurrence of a duplicated attribute wins
+        values = dict(attrs)
+        for name in REFERENCE_ATTRIBUTES.get(tag, ()):
+            if name not in values:
+                continue
+            value = values[name] or ""
+            if name in SRCSET_ATTRIBUTES:
+                for url in srcset_urls(value):
+                    self._references.append((tag, name, url))
+            else:
+                self._references.append((tag, name, value))
+
+        if tag == "meta" and values.get("content"):
+            kind = values.get("property") or values.get("name") or ""
+            if kind.lower() in META_IMAGES:
+                self._references.append((tag, "content", values["content"]))
+
+        style = values.get("style")
+        if style and "url(" in style.lower():
+            for url in css_urls(style):
+                self._references.append((tag, "style", url))
+
+    def handle_startendtag(self, tag: str, attrs: list) -> None:
+        """Collects the reference attributes of a self-closing tag."""
+        self.handle_starttag(tag, attrs)
+        if tag == "style":
+            self._style = None
+
+    def handle_data(self, data: str) -> None:
+        """Buffers the content of a style element."""
+        if self._style is not None:
+            self._style.append(data)
+
+    def handle_endtag(self, tag: str) -> None:
+        """Collects the URLs of a complete style element."""
+        if tag == "style" and self._style is not None:
+            for url in css_urls("".join(self._style)):
+                self._references.append(("style", "url", url))
+            self._style = None
+
+    def feed(self, data: str) -> list:
+        """
+        Feeds a chunk of the page to the parser.
+
+        Args:
+            data (str): The next chunk of the page.
+
+        Returns:
+            list: The references completed by this chunk.
+        """
+        super().feed(data)
+        references, self._references = self._references, []
+        return references
+
+    def close(self) -> list:
+        """
+        Ends the page, flushing any buffered data.
+
+        Returns:
+            list: The references found in the buffered data.
+        """
+        super().close()
+        references, self._references = self._references, []
+        return references
+
+
+def iter_references(chunks, extractor: LinkExtractor = None):
+    """
+    Yields the references of a page as soon as the chunk completing them is fed.
+
+    Args:
+        chunks (iterable): The successive chunks of the page, as strings.
+        extractor (LinkExtractor): The parser to use, so that the caller can
+            inspect its `document` attribute afterwards.
+
+    Yields:
+        tuple: The `(tag, attribute, value)` references.
+    """
+    if extractor is None:
+        extractor = LinkExtractor()
+    for chunk in chunks:
+        if chunk:
+            yield from extractor.feed(chunk)
+    yield from extractor.close()
+
+
+def extract_references(content: str) -> tuple:
+    """
+    Extracts the references of a complete page.
+
+    Args:
+        content (str): The HTML content of the page.
+
+    Returns:
+        tuple: Whether the page declares an HTML doctype, and the list of references.
+    """
+    extractor = LinkExtractor()
+    references = list(iter_references([content], extractor))
+    return extractor.document, references
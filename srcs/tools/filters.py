@@ -0,0 +1,261 @@
+"""
+File Filter Module
+
+This module decides whether a file is worth downloading before its body is
+transferred. Tracking pixels, icons and HTML error pages served under image
+URLs are rejected from the headers of the response and the first bytes of its
+body, which hold the signature and the dimensions of an image, so that only
+those bytes are received before the connection is closed.
+
+A rejection is described by a reason starting with the threshold it fails,
+such as "size: smaller than 1024 bytes", "type: content is html, not png" or
+"dimensions: 16x16 image".
+
+The module includes the following:
+
+1. `sniff_type`: Recognizes the type of a file from its first bytes.
+
+2. `image_dimensions`: Reads the width and height of a PNG, GIF, BMP, WebP
+   or JPEG image from its first bytes.
+
+3. `FileFilter`: The thresholds a file must pass to be downloaded.
+"""
+
+import os
+import struct
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+# The number of bytes read to recognize a file and find its dimensions
+HEAD_SIZE = 64 * 1024
+
+# The type expected for each extension
+EXTENSION_TYPES = {
+    "jpg": "jpeg",
+    "jpeg": "jpeg",
+    "png": "png",
+    "gif": "gif",
+    "bmp": "bmp",
+    "webp": "webp",
+    "ico": "ico",
+    "tif": "tiff",
+    "tiff": "tiff",
+    "svg": "svg",
+    "pdf": "pdf",
+    "html": "html",
+    "htm": "html",
+    "txt": "text",
+}
+
+# The types of the text content types, checked against the expected type
+SERVED_TYPES = {"text/html": "html", "text/plain": "text"}
+
+# The types whose content is not always recognized from its first bytes
+UNSNIFFED_TYPES = frozenset(("html", "text"))
+
+# The start of the files of each type
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+    (b"\x00\x00\x01\x00", "ico"),
+    (b"%PDF-", "pdf"),
+)
+
+# The JPEG markers starting a frame, which holds the dimensions
+JPEG_FRAME_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def sniff_type(head: bytes) -> str:
+    """
+    Recognizes the type of a file from its first bytes.
+
+    Args:
+        head (bytes): The first bytes of the file.
+
+    Returns:
+        str: The type, such as "png", "jpeg" or "html", None if unknown.
+    """
+    for signature, file_type in SIGNATURES:
+        if head.startswith(signature):
+            return file_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+
+    text = head[:512].lstrip().lower()
+    if text.startswith((b"<!doctype html", b"<html", b"<head", b"<body")):
+        return "html"
+    if text.startswith(b"<svg") or (text.startswith(b"<?xml") and b"<svg" in text):
+        return "svg"
+    return None
+
+
+def image_dimensions(head: bytes) -> tuple:
+    """
+    Reads the dimensions of an image from its first bytes: the IHDR chunk of
+    a PNG, the logical screen of a GIF, the info header of a BMP, the frame
+    header of a WebP, or the first SOF segment of a JPEG.
+
+    Args:
+        head (bytes): The first bytes of the image.
+
+    Returns:
+        tuple: The width and height, None if they are not in these bytes.
+    """
+    file_type = sniff_type(head)
+    try:
+        if file_type == "png" and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        if file_type == "gif":
+            return struct.unpack("<HH", head[6:10])
+        if file_type == "bmp":
+            width, height = struct.unpack("<ii", head[18:26])
+            return width, abs(height)
+        if file_type == "webp":
+            return _webp_dimensions(head)
+        if file_type == "jpeg":
+            return _jpeg_dimensions(head)
+    except struct.error:
+        # The head is truncated
+        return None
+    return None
+
+
+def _webp_dimensions(head: bytes) -> tuple:
+    """Reads the dimensions of a WebP image from its first chunk."""
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def _jpeg_dimensions(head: bytes) -> tuple:
+    """Reads the dimensions of a JPEG image from its first frame header."""
+    offset = 2
+    while offset + 4 <= len(head):
+        if head[offset] != 0xFF:
+            return None
+        marker = head[offset + 1]
+        if marker == 0xFF:
+            # Fill byte
+            offset += 1
+            continue
+        if marker in JPEG_FRAME_MARKERS:
+            height, width = struct.unpack(">HH", head[offset + 5 : offset + 9])
+            return width, height
+        (length,) = struct.unpack(">H", head[offset + 2 : offset + 4])
+        offset += 2 + length
+    return None
+
+
+def _expected_type(url: str) -> str:
+    """Returns the type expected for the extension of a URL, None if unknown."""
+    extension = os.path.splitext(urlsplit(url).path)[1].lower().lstrip(".")
+    return EXTENSION_TYPES.get(extension)
+
+
+@dataclass
+class FileFilter:
+    """
+    The thresholds a file must pass to be downloaded. A file is rejected as
+    soon as the headers of its response or the first `HEAD_SIZE` bytes of its
+    body show that it fails one of them.
+
+    Attributes:
+        min_bytes (int): The minimum size of a file, no minimum if None.
+        min_dimensions (tuple): The minimum width and height of an image, no
+            minimum if None. Images whose dimensions are not found in their
+            first bytes are accepted.
+        verify_type (bool): If True, files whose extension expects a type
+            (`EXTENSION_TYPES`) but which are served as, or whose content is,
+            another type are rejected, such as HTML error pages served under
+            image URLs.
+    """
+
+    min_bytes: int = None
+    min_dimensions: tuple = None
+    verify_type: bool = False
+
+    @property
+    def reads_head(self) -> bool:
+        """Whether the first bytes of the body are needed."""
+        return self.min_dimensions is not None or self.verify_type
+
+    def check_headers(self, url: str, headers) -> str:
+        """
+        Checks the headers of the response of a file.
+
+        Args:
+            url (str): The URL of the file, whose extension gives its
+                expected type.
+            headers (dict): The headers of the response.
+
+        Returns:
+            str: The reason the file is rejected, None if it is accepted.
+        """
+        length = headers.get("content-length", "")
+        if self.min_bytes is not None and length.isdigit():
+            if int(length) < self.min_bytes:
+                return f"size: smaller than {self.min_bytes} bytes"
+        if self.verify_type:
+            content_type = headers.get("content-type", "").split(";")[0].strip()
+            served = SERVED_TYPES.get(content_type.lower())
+            expected = _expected_type(url)
+            if served is not None and expected is not None and served != expected:
+                return f"type: served as {content_type}, not {expected}"
+        return None
+
+    def check_head(self, url: str, head: bytes) -> str:
+        """
+        Checks the first bytes of a file.
+
+        Args:
+            url (str): The URL of the file, whose extension gives its
+                expected type.
+            head (bytes): The first bytes of the body.
+
+        Returns:
+            str: The reason the file is rejected, None if it is accepted.
+        """
+        if self.verify_type:
+            file_type = sniff_type(head)
+            expected = _expected_type(url)
+            if expected is not None and file_type != expected:
+                # Text files are accepted unless they look like another type
+                if file_type is not None or expected not in UNSNIFFED_TYPES:
+                    return f"type: content is {file_type or 'unknown'}, not {expected}"
+
+        if self.min_dimensions is not None:
+            dimensions = image_dimensions(head)
+            min_width, min_height = self.min_dimensions
+            if dimensions is not None and (
+                dimensions[0] < min_width or dimensions[1] < min_height
+            ):
+                return f"dimensions: {dimensions[0]}x{dimensions[1]} image"
+        return None
+
+    def check_size(self, size: int) -> str:
+        """
+        Checks the size of a complete file, when it was not announced.
+
+        Args:
+            size (int): The size of the file in bytes.
+
+        Returns:
+            str: The reason the file is rejected, None if it is accepted.
+        """
+        if self.min_bytes is not None and size < self.min_bytes:
+            return f"size: smaller than {self.min_bytes} bytes"
+        return None
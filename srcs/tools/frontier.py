@@ -0,0 +1,152 @@
+"""
+Crawl Frontier Module
+
+This module holds the URLs waiting to be fetched. Each URL is recorded with
+its hop depth, the number of links followed from the base URL to reach it, and
+pages are handed out by priority, lowest first. The default priority is the
+hop depth, so the website is crawled breadth-first: every page one link away
+from the base URL is fetched before any page two links away.
+
+The module includes the following:
+
+1. `breadth_first`: The default priority, crawling by increasing hop depth.
+
+2. `prefer_files`: A priority crawling first the pages linked from pages
+   where files were found.
+
+3. `PRIORITIES`: The priority functions by name, as chosen on the command line.
+
+4. `Frontier`: The priority queue of URLs to fetch.
+
+A priority function is called as `priority(url, hops, parent)` with the URL,
+its hop depth and the `PageResult` of the page linking to it (None for the
+base URL), and returns a number. Ties are broken in insertion order.
+"""
+
+import heapq
+import itertools
+from tools.url_utils import normalize_url
+
+
+# pylint: disable-next=unused-argument
+def breadth_first(url: str, hops: int, parent) -> float:
+    """
+    Crawls the pages by increasing hop depth.
+
+    Args:
+        url (str): The URL to schedule.
+        hops (int): The hop depth of the URL.
+        parent (PageResult): The page linking to the URL.
+
+    Returns:
+        float: The hop depth.
+    """
+    return hops
+
+
+# pylint: disable-next=unused-argument
+def prefer_files(url: str, hops: int, parent) -> float:
+    """
+    Crawls the pages linked from pages where files were found one hop earlier,
+    as their neighbourhood is likely to hold more files.
+
+    Args:
+        url (str): The URL to schedule.
+        hops (int): The hop depth of the URL.
+        parent (PageResult): The page linking to the URL.
+
+    Returns:
+        float: The hop depth, minus one if the parent page had files.
+    """
+    if parent is not None and parent.files:
+        return hops - 1
+    return hops
+
+
+PRIORITIES = {"bfs": breadth_first, "files": prefer_files}
+
+
+class Frontier:
+    """
+    The URLs to fetch with their hop depth, ordered by priority, and the set
+    of every URL ever scheduled, so that each page is scheduled only once.
+
+    Attributes:
+        priority (callable): The priority function.
+        max_hops (int): The maximum hop depth scheduled, None for no limit.
+        seen (set): The normalized URLs ever scheduled, a set or one of the
+            compact structures of `tools.visited`.
+    """
+
+    def __init__(self, priority=None, max_hops: int = None, seen=None):
+        self.priority = priority or breadth_first
+        self.max_hops = max_hops
+        self.seen = set() if seen is None else seen
+        self._heap = []
+        self._order = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, url: str) -> bool:
+        return normalize_url(url) in self.seen
+
+    def push(self, url: str, hops: int = 0, parent=None) -> bool:
+        """
+        Schedules a URL, unless it was already scheduled or is too deep.
+
+        Args:
+            url (str): The URL to schedule.
+            hops (int): The hop depth of the URL.
+            parent (PageResult): The page linking to the URL.
+
+        Returns:
+            bool: True if the URL was scheduled.
+        """
+        key = normalize_url(url)
+        if key in self.seen:
+            return False
+        if self.max_hops is not None and hops > self.max_hops:
+            return False
+        self.seen.add(key)
+        entry = (self.priority(url, hops, parent), next(self._order), url, hops)
+        heapq.heappush(self._heap, entry)
+        return True
+
+    def extend(self, urls, hops: int, parent=None) -> list:
+        """
+        Schedules the URLs linked from a page.
+
+        Args:
+            urls (iterable): The URLs to schedule.
+            hops (int): The hop depth of the URLs.
+            parent (PageResult): The page linking to the URLs.
+
+        Returns:
+            list: The URLs newly scheduled.
+        """
+        # Sorted so that the order of the crawl does not depend on set order
+        return [url for url in sorted(urls) if self.push(url, hops, parent)]
+
+    def mark_seen(self, url: str) -> None:
+        """
+        Records a URL as scheduled without queuing it, such as a page visited
+        by an interrupted crawl.
+
+        Args:
+            url (str): The URL.
+        """
+        self.seen.add(normalize_url(url))
+
+    def pop(self) -> tuple:
+        """
+        Takes the URL with the lowest priority.
+
+        Returns:
+            tuple: The URL and its hop depth.
+
+        Raises:
+            IndexError: If the frontier is empty.
+        """
+        _, _, url, hops = heapq.heappop(self._heap)
+        return url, hops
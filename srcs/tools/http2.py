@@ -0,0 +1,241 @@
+"""
+HTTP/2 Module
+
+This module sends the requests of a `requests.Session` over HTTP/2, so that
+the pages and files requested at once from a host share a single connection
+instead of taking one connection each. It relies on the optional `httpx` and
+`h2` packages, installed with `pip install httpx[http2]`.
+
+The requests of all the threads are sent by an asynchronous httpx client
+running in an event loop of its own, which the threads hand their requests
+and reads to. The HTTP/2 connections of the synchronous client are not safe
+to share between threads, while the event loop serializes every use of a
+connection without waiting for the responses of the other streams.
+
+The bodies of the responses are decoded as they are streamed. Besides gzip
+and deflate, brotli and zstd are negotiated when the `brotli` and `zstandard`
+packages are installed.
+
+The module includes the following:
+
+1. `available`: Whether the packages needed by HTTP/2 are installed.
+
+2. `HTTP2Adapter`: A transport adapter sending requests over HTTP/2.
+"""
+
+import asyncio
+import threading
+import importlib.util
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from tools import metrics
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# How HTTP/2 is used: negotiated during the TLS handshake, falling back to
+# HTTP/1.1, or assumed on every connection, including cleartext ones
+NEGOTIATE = "negotiate"
+PRIOR_KNOWLEDGE = "prior-knowledge"
+MODES = (NEGOTIATE, PRIOR_KNOWLEDGE)
+
+# The headers bound to an HTTP/1.1 connection, which HTTP/2 forbids
+CONNECTION_HEADERS = frozenset(
+    ["connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade"]
+)
+
+# The content codings decoded by httpx with the packages installed
+ACCEPT_ENCODING = ", ".join(
+    ["gzip", "deflate"]
+    + ["br"] * any(importlib.util.find_spec(name) for name in ("brotli", "brotlicffi"))
+    + ["zstd"] * (importlib.util.find_spec("zstandard") is not None)
+)
+
+
+def available() -> bool:
+    """Returns whether the httpx and h2 packages are installed."""
+    return httpx is not None and importlib.util.find_spec("h2") is not None
+
+
+class _Body:
+    """
+    The body of an httpx response, read like the raw body of `requests`. The
+    chunks are read in the event loop of the client, by `run`.
+    """
+
+    def __init__(self, response, run):
+        self._response = response
+        self._run = run
+        self._chunks = None
+        self._buffer = bytearray()
+
+    def stream(self, chunk_size: int = None, decode_content: bool = True):
+        """Yields the decoded chunks of the body."""
+        # pylint: disable=unused-argument
+        chunks = self._response.aiter_bytes(chunk_size)
+        try:
+            while True:
+                try:
+                    yield self._run(chunks.__anext__())
+                except StopAsyncIteration:
+                    return
+        except httpx.DecodingError as error:
+            raise requests.exceptions.ContentDecodingError(error) from error
+        except httpx.TransportError as error:
+            raise requests.exceptions.ChunkedEncodingError(error) from error
+        finally:
+            self._run(chunks.aclose())
+            self.close()
+
+    def read(self, amt: int = None, **kwargs) -> bytes:
+        """Reads up to `amt` decoded bytes of the body, all of them if None."""
+        # pylint: disable=unused-argument
+        if self._chunks is None:
+            self._chunks = self.stream()
+        while amt is None or len(self._buffer) < amt:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        size = len(self._buffer) if amt is None else min(amt, len(self._buffer))
+        data = bytes(self._buffer[:size])
+        # Deleting from the start of a bytearray does not move the rest
+        del self._buffer[:size]
+        return data
+
+    def close(self) -> None:
+        """Closes the response, releasing its stream."""
+        if not self._response.is_closed:
+            self._run(self._response.aclose())
+
+    def release_conn(self) -> None:
+        """Releases the stream of the response."""
+        self.close()
+
+
+def _timeout(timeout):
+    """Converts a `requests` timeout, a number or a (connect, read) tuple."""
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+class HTTP2Adapter(BaseAdapter):
+    """
+    A transport adapter sending requests over HTTP/2 through an asynchronous
+    httpx client shared by all the threads of the process, in an event loop
+    running in a thread of its own. The requests sent at once to a host are
+    multiplexed over one connection, up to the number of concurrent streams
+    the host allows.
+
+    Certificates are always verified, whatever the `verify` argument of a
+    request.
+
+    Attributes:
+        mode (str): `NEGOTIATE` to use HTTP/2 with the hosts offering it in
+            the TLS handshake and HTTP/1.1 otherwise, or `PRIOR_KNOWLEDGE`
+            to use HTTP/2 on every connection.
+    """
+
+    def __init__(self, mode: str = NEGOTIATE, pool_hosts: int = 10):
+        if not available():
+            raise ImportError("HTTP/2 requires the httpx and h2 packages")
+        super().__init__()
+        self.mode = mode
+        self._client = httpx.AsyncClient(
+            http1=mode != PRIOR_KNOWLEDGE,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=None, max_keepalive_connections=pool_hosts
+            ),
+        )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def _run(self, coroutine):
+        """Runs a coroutine in the event loop of the client and returns its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def send(  # pylint: disable=too-many-arguments
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ) -> requests.Response:
+        """
+        Sends a prepared request over HTTP/2.
+
+        Args:
+            request (requests.PreparedRequest): The request.
+            stream (bool): Whether the body is read lazily. The body is
+                streamed anyway, the session reads it when False.
+            timeout: The timeout of the request, a number or a (connect,
+                read) tuple.
+            verify, cert, proxies: Unused, the client settings apply.
+
+        Returns:
+            requests.Response: The response, whose body is read lazily.
+
+        Raises:
+            requests.exceptions.ConnectionError: If the request failed.
+            requests.exceptions.Timeout: If the request timed out.
+        """
+        # pylint: disable=unused-argument
+        headers = {
+            name: value
+            for name, value in request.headers.items()
+            if name.lower() not in CONNECTION_HEADERS
+        }
+        headers["Accept-Encoding"] = ACCEPT_ENCODING
+        connected = []
+
+        async def trace(event: str, info: dict) -> None:
+            # pylint: disable=unused-argument
+            if event == "connection.connect_tcp.complete":
+                connected.append(True)
+
+        try:
+            reply = self._run(
+                self._client.send(
+                    self._client.build_request(
+                        request.method,
+                        request.url,
+                        headers=headers,
+                        content=request.body,
+                        timeout=_timeout(timeout),
+                        extensions={"trace": trace},
+                    ),
+                    stream=True,
+                )
+            )
+        except httpx.ConnectTimeout as error:
+            raise requests.exceptions.ConnectTimeout(error, request=request) from error
+        except httpx.TimeoutException as error:
+            raise requests.exceptions.ReadTimeout(error, request=request) from error
+        except httpx.TransportError as error:
+            raise requests.exceptions.ConnectionError(error, request=request) from error
+        metrics.increment("connections", label="opened" if connected else "reused")
+
+        response = requests.Response()
+        response.status_code = reply.status_code
+        response.reason = reply.reason_phrase
+        response.headers = CaseInsensitiveDict(reply.headers.items())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.raw = _Body(reply, self._run)
+        return response
+
+    def close(self) -> None:
+        """Closes the connections of the client and stops its event loop."""
+        # The adapter is mounted twice, and closed by each mount
+        if self._loop.is_closed():
+            return
+        self._run(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
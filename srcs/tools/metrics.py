@@ -0,0 +1,373 @@
+"""
+Crawl Metrics Module
+
+This module records where the time of a crawl goes. Each layer of the spider
+reports what it does: the transport the latency of every request per host,
+its status and the class of its errors, the scrape and download modules the
+pages, files and bytes received, the parse stages the time to parse each
+page, and the crawl engines the depth of their queues. Nothing is recorded
+until a `Metrics` collector is enabled with `configure`, so the reporting
+functions of this module cost a single test otherwise.
+
+A `StatsWriter` periodically saves the metrics as a JSON file and as a file
+in the Prometheus text format, which a node exporter textfile collector can
+scrape.
+
+The module includes the following:
+
+1. `Histogram`: A histogram of durations with fixed buckets.
+
+2. `Metrics`: The counters, histograms and gauges of a crawl.
+
+3. `StatsWriter`: Saves the metrics periodically.
+
+4. `configure`, `increment`, `observe`, `gauge` and `remove_gauge`: Report
+   to the enabled collector.
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+
+# The upper bounds of the buckets of the histograms, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# The type, the description and the label of each metric
+DEFINITIONS = {
+    "fetch_seconds": (
+        "histogram",
+        "Time to the response headers of a request, per host.",
+        "host",
+    ),
+    "parse_seconds": ("histogram", "Time to parse a fetched page.", None),
+    "pages": ("counter", "Pages fetched.", None),
+    "files": ("counter", "Files downloaded.", None),
+    "bytes": ("counter", "Bytes of pages and files received.", None),
+    "connections": (
+        "counter",
+        "Connections opened, and requests sent on a connection kept open.",
+        "state",
+    ),
+    "responses": ("counter", "Responses received, per status code.", "status"),
+    "errors": ("counter", "Failed requests, per class of error.", "class"),
+    "skipped": ("counter", "Files skipped by the filter, per threshold.", "reason"),
+    "queue_depth": ("gauge", "Items waiting in a queue of the crawl.", "queue"),
+}
+
+# The prefix of the names of the Prometheus metrics
+PREFIX = "spider_"
+
+# The number of seconds between two saves of the metrics
+DEFAULT_INTERVAL = 10.0
+
+_metrics = None
+
+
+class Histogram:
+    """
+    A histogram of durations with the fixed buckets `BUCKETS`.
+
+    Attributes:
+        counts (list): The number of durations in each bucket, the last
+            bucket holding the durations above the last bound.
+        count (int): The number of durations.
+        sum (float): The sum of the durations.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Adds a duration."""
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, percent: float) -> float:
+        """
+        Returns an upper bound of a percentile of the durations, the bound of
+        the bucket holding it.
+
+        Args:
+            percent (float): The percentile, between 0 and 100.
+
+        Returns:
+            float: The bound, infinite if the percentile is above the last
+                bound, None if there are no durations.
+        """
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        cumulated = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), self.counts):
+            cumulated += count
+            if cumulated >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> dict:
+        """Returns the histogram as a JSON-serializable dictionary."""
+        percentiles = {
+            f"p{percent}": self.percentile(percent) for percent in (50, 90, 99)
+        }
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            # JSON has no infinity
+            **{
+                name: "+Inf" if bound == float("inf") else bound
+                for name, bound in percentiles.items()
+            },
+            "buckets": {
+                str(bound): count
+                for bound, count in zip(BUCKETS + ("+Inf",), self.counts)
+            },
+        }
+
+
+class Metrics:
+    """
+    The counters, histograms and gauges of a crawl. It is thread-safe.
+
+    Attributes:
+        start (float): When the collection started, as a `time.time()`.
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def increment(self, name: str, amount: int = 1, label: str = None) -> None:
+        """Adds an amount to a counter."""
+        with self._lock:
+            self._counters[name, label] = self._counters.get((name, label), 0) + amount
+
+    def observe(self, name: str, value: float, label: str = None) -> None:
+        """Adds a duration to a histogram."""
+        with self._lock:
+            histogram = self._histograms.get((name, label))
+            if histogram is None:
+                histogram = self._histograms[name, label] = Histogram()
+            histogram.observe(value)
+
+    def gauge(self, name: str, function, label: str = None) -> None:
+        """Registers a function returning the current value of a gauge."""
+        with self._lock:
+            self._gauges[name, label] = function
+
+    def remove_gauge(self, name: str, label: str = None) -> None:
+        """Unregisters a gauge."""
+        with self._lock:
+            self._gauges.pop((name, label), None)
+
+    def snapshot(self) -> dict:
+        """
+        Returns the current value of every metric, along with the uptime and
+        the average pages and bytes received per second.
+
+        Returns:
+            dict: The metrics by name. Labeled metrics are dictionaries of
+                their values by label, histograms dictionaries of their
+                statistics.
+        """
+        with self._lock:
+            values = dict(self._counters)
+            values.update(
+                (key, histogram.to_dict())
+                for key, histogram in self._histograms.items()
+            )
+            gauges = dict(self._gauges)
+        # Gauges may take locks of the crawl, so they are read without this one
+        values.update((key, function()) for key, function in gauges.items())
+
+        now = time.time()
+        uptime = max(now - self.start, 1e-9)
+        snapshot = {"time": now, "uptime_seconds": round(uptime, 3)}
+        for name, (kind, _, label) in DEFINITIONS.items():
+            if label is None:
+                snapshot[name] = values.get(
+                    (name, None), 0 if kind == "counter" else None
+                )
+            else:
+                snapshot[name] = {
+                    key_label: value
+                    for (key_name, key_label), value in sorted(
+                        values.items(), key=lambda item: str(item[0])
+                    )
+                    if key_name == name
+                }
+        snapshot["pages_per_second"] = round(snapshot["pages"] / uptime, 3)
+        snapshot["bytes_per_second"] = round(snapshot["bytes"] / uptime, 3)
+        return snapshot
+
+    def to_prometheus(self, snapshot: dict = None) -> str:
+        """
+        Formats the metrics in the Prometheus text exposition format.
+
+        Args:
+            snapshot (dict): The snapshot to format, a new one if None.
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        snapshot = snapshot or self.snapshot()
+        lines = []
+        for name, (kind, description, label) in DEFINITIONS.items():
+            metric = PREFIX + name + ("_total" if kind == "counter" else "")
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} {kind}")
+            samples = (
+                {None: snapshot[name]} if label is None else snapshot[name]
+            ).items()
+            for label_value, value in samples:
+                labels = {} if label is None else {label: label_value}
+                if kind == "histogram":
+                    lines.extend(_histogram_lines(metric, labels, value))
+                elif value is not None:
+                    lines.append(f"{metric}{_format_labels(labels)} {value}")
+        for name, description in (
+            ("uptime_seconds", "Time since the metrics were enabled."),
+            ("pages_per_second", "Average pages fetched per second."),
+            ("bytes_per_second", "Average bytes received per second."),
+        ):
+            lines.append(f"# HELP {PREFIX}{name} {description}")
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            lines.append(f"{PREFIX}{name} {snapshot[name]}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: dict) -> str:
+    """Formats the labels of a Prometheus sample."""
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _histogram_lines(metric: str, labels: dict, histogram: dict) -> list:
+    """Formats the samples of a histogram, with cumulative buckets."""
+    if histogram is None:
+        return []
+    lines = []
+    cumulated = 0
+    for bound, count in histogram["buckets"].items():
+        cumulated += count
+        bucket_labels = _format_labels({**labels, "le": bound})
+        lines.append(f"{metric}_bucket{bucket_labels} {cumulated}")
+    lines.append(f"{metric}_sum{_format_labels(labels)} {histogram['sum']}")
+    lines.append(f"{metric}_count{_format_labels(labels)} {histogram['count']}")
+    return lines
+
+
+def prometheus_path(path: str) -> str:
+    """
+    Returns the path of the Prometheus file saved along a JSON stats file.
+
+    Args:
+        path (str): The path of the JSON file, such as "stats.json".
+
+    Returns:
+        str: The same path with a ".prom" extension, such as "stats.prom".
+    """
+    return os.path.splitext(path)[0] + ".prom"
+
+
+def _write_atomically(path: str, content: str) -> None:
+    """Writes a file under a temporary name and moves it into place."""
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        file.write(content)
+    os.replace(temporary_path, path)
+
+
+class StatsWriter:
+    """
+    Saves metrics every `interval` seconds, and once more when closed, as a
+    JSON file and as a Prometheus text file next to it, see `prometheus_path`.
+    The files are replaced atomically, so readers never see a partial file.
+
+    Attributes:
+        metrics (Metrics): The metrics saved.
+        path (str): The path of the JSON file.
+        interval (float): The number of seconds between two saves.
+    """
+
+    def __init__(self, metrics: Metrics, path: str, interval: float = DEFAULT_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """Saves the metrics until the writer is closed."""
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def write(self) -> None:
+        """Saves the current metrics."""
+        snapshot = self.metrics.snapshot()
+        _write_atomically(self.path, json.dumps(snapshot, indent=2) + "\n")
+        _write_atomically(
+            prometheus_path(self.path), self.metrics.to_prometheus(snapshot)
+        )
+
+    def close(self) -> None:
+        """Stops the periodic saves and saves the final metrics."""
+        self._stopped.set()
+        self._thread.join()
+        self.write()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def configure(metrics: Metrics) -> None:
+    """
+    Enables the collection of the metrics.
+
+    Args:
+        metrics (Metrics): The collector of the crawl. The collection is
+            disabled if None.
+    """
+    global _metrics  # pylint: disable=global-statement
+    _metrics = metrics
+
+
+def increment(name: str, amount: int = 1, label: str = None) -> None:
+    """Adds an amount to a counter of the enabled collector."""
+    if _metrics is not None:
+        _metrics.increment(name, amount, label)
+
+
+def observe(name: str, value: float, label: str = None) -> None:
+    """Adds a duration to a histogram of the enabled collector."""
+    if _metrics is not None:
+        _metrics.observe(name, value, label)
+
+
+def gauge(name: str, function, label: str = None) -> None:
+    """Registers a gauge in the enabled collector."""
+    if _metrics is not None:
+        _metrics.gauge(name, function, label)
+
+
+def remove_gauge(name: str, label: str = None) -> None:
+    """Unregisters a gauge from the enabled collector."""
+    if _metrics is not None:
+        _metrics.remove_gauge(name, label)
@@ -7,14 +7,30 @@ Functions:
 
     range_limited_int_type(arg: str) -> int:
         Type function for argparse - an integer within some predefined bounds.
+
+    positive_int_type(arg: str) -> int:
+        Type function for argparse - a strictly positive integer.
+
+    positive_float_type(arg: str) -> float:
+        Type function for argparse - a strictly positive number.
+
+    rate_type(arg: str) -> float:
+        Type function for argparse - a rate strictly between 0 and 1.
+
+    size_type(arg: str) -> int:
+        Type function for argparse - a size in bytes with an optional K, M or G suffix.
+
+    dimensions_type(arg: str) -> tuple:
+        Type function for argparse - a width and a height, such as 64x64.
 """
 
 import argparse
-import validators
 
 LEVEL_MIN_VAL = 1
 LEVEL_MAX_VAL = 100
 
+SIZE_UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
 
 def url_type(arg):
     """
@@ -31,6 +47,9 @@ def url_type(arg):
         argparse.ArgumentTypeError: If the URL is not valid.
     """
 
+    # validators takes longer to import than the rest of the options
+    import validators  # pylint: disable=import-outside-toplevel
+
     validation = validators.url(arg, public=True)
     if validation:
         return arg
@@ -63,3 +82,130 @@ def range_limited_int_type(arg):
             f"Argument must be < {LEVEL_MAX_VAL} and > {LEVEL_MIN_VAL}"
         )
     return num
+
+
+def positive_int_type(arg):
+    """
+    Type function for argparse - a strictly positive integer.
+
+    Parameters:
+        arg (str): The input integer as a string.
+
+    Returns:
+        int: The integer value if it is greater than 0, otherwise raises an
+        argparse.ArgumentTypeError.
+
+    Raises:
+        argparse.ArgumentTypeError: If the input is not a valid integer or if
+        it is lower than 1.
+    """
+
+    try:
+        num = int(arg)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError("Must be an integer number") from exc
+    if num < 1:
+        raise argparse.ArgumentTypeError("Argument must be > 0")
+    return num
+
+
+def positive_float_type(arg):
+    """
+    Type function for argparse - a strictly positive number.
+
+    Parameters:
+        arg (str): The input number as a string.
+
+    Returns:
+        float: The number if it is greater than 0, otherwise raises an
+        argparse.ArgumentTypeError.
+
+    Raises:
+        argparse.ArgumentTypeError: If the input is not a valid number or if
+        it is not greater than 0.
+    """
+
+    try:
+        num = float(arg)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError("Must be a number") from exc
+    if not num > 0:
+        raise argparse.ArgumentTypeError("Argument must be > 0")
+    return num
+
+
+def rate_type(arg):
+    """
+    Type function for argparse - a rate strictly between 0 and 1.
+
+    Parameters:
+        arg (str): The input rate as a string.
+
+    Returns:
+        float: The rate if it is between 0 and 1, otherwise raises an
+        argparse.ArgumentTypeError.
+
+    Raises:
+        argparse.ArgumentTypeError: If the input is not a valid number or if
+        it is not strictly between 0 and 1.
+    """
+
+    try:
+        num = float(arg)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError("Must be a number") from exc
+    if not 0 < num < 1:
+        raise argparse.ArgumentTypeError("Argument must be > 0 and < 1")
+    return num
+
+
+def size_type(arg):
+    """
+    Type function for argparse - a size in bytes with an optional K, M or G suffix.
+
+    Parameters:
+        arg (str): The input size as a string, such as "512", "10K" or "1.5M".
+
+    Returns:
+        int: The size in bytes, otherwise raises an argparse.ArgumentTypeError.
+
+    Raises:
+        argparse.ArgumentTypeError: If the input is not a valid size.
+    """
+
+    unit = arg[-1:].upper()
+    number = arg[:-1] if unit in SIZE_UNITS else arg
+    try:
+        size = int(float(number) * SIZE_UNITS.get(unit, 1))
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(
+            "Must be a size in bytes, optionally suffixed with K, M or G"
+        ) from exc
+    if size < 0:
+        raise argparse.ArgumentTypeError("Size must be positive")
+    return size
+
+
+def dimensions_type(arg):
+    """
+    Type function for argparse - a width and a height in pixels, such as "64x64".
+
+    Parameters:
+        arg (str): The input dimensions as a string, formatted as WIDTHxHEIGHT.
+
+    Returns:
+        tuple: The width and the height, otherwise raises an argparse.ArgumentTypeError.
+
+    Raises:
+        argparse.ArgumentTypeError: If the input is not valid dimensions.
+    """
+
+    try:
+        width, height = (int(number) for number in arg.lower().split("x"))
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(
+            "Must be a width and a height, such as 64x64"
+        ) from exc
+    if width < 0 or height < 0:
+        raise argparse.ArgumentTypeError("Dimensions must be positive")
+    return width, height
@@ -0,0 +1,113 @@
+"""
+Parse Pool Module
+
+This module moves the parsing of pages out of the crawling process. The
+tokenizing of HTML is pure Python, so parse threads share a single core
+through the GIL however many there are. A `ParsePool` hands the raw bodies
+fetched by the network threads to worker processes, which extract the links
+and the files of each page and send them back.
+
+The transfers between processes are kept small: the body goes out as a single
+`bytes` buffer, never decoded nor split in the crawling process, and the links
+and files come back as two newline-joined strings rather than sets of
+strings, which pickle as one buffer each. The base URL, the depth and the
+compiled `FileMatcher` are sent once to each worker when it starts.
+
+Workers are started with the "spawn" method, as forking a process running
+threads may copy locks held by other threads.
+
+The module includes the following:
+
+1. `ParsePool`: The pool of processes parsing pages.
+"""
+
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from tools import metrics
+from tools.extract import extract_references
+from tools.matcher import FileMatcher
+from tools.scrape import PageResult, extract_files, extract_links
+
+# The scope and the extensions of the crawl, in each worker process
+_crawl = None
+
+
+def _initialize(base_url: str, depth: int, extensions) -> None:
+    """Records the scope and the extensions of the crawl in a worker."""
+    global _crawl  # pylint: disable=global-statement
+    _crawl = (base_url, depth, FileMatcher.of(extensions) if extensions else None)
+
+
+def _parse(body: bytes, encoding: str, webpage: str) -> tuple:
+    """
+    Parses the body of a page in a worker process.
+
+    Returns:
+        tuple: Whether the page declares an HTML doctype, and its links and
+            files joined by newlines.
+    """
+    base_url, depth, matcher = _crawl
+    document, references = extract_references(
+        body.decode(encoding or "utf-8", errors="replace")
+    )
+    files = extract_files(references, webpage, matcher) if matcher else ()
+    links = extract_links(references, webpage, base_url, depth) if document else ()
+    return document, "\n".join(links), "\n".join(files)
+
+
+class ParsePool:
+    """
+    A pool of processes extracting the links and files of fetched pages.
+
+    Attributes:
+        processes (int): The number of worker processes.
+    """
+
+    def __init__(self, processes: int, base_url: str, depth: int, extensions=None):
+        self.processes = processes
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_initialize,
+            initargs=(base_url, depth, extensions),
+        )
+
+    def parse(self, result: PageResult) -> PageResult:
+        """
+        Parses a page fetched with `fetch_page(..., raw=True)` in a worker
+        process, like `parse_page` does in the calling thread. The body is
+        released afterwards.
+
+        Args:
+            result (PageResult): The fetched page.
+
+        Returns:
+            PageResult: The same result, with its links and files.
+        """
+        body, result.body = result.body, b""
+        if not result.html:
+            return result
+
+        start = time.perf_counter()
+        document, links, files = self._executor.submit(
+            _parse, body, result.encoding, result.url
+        ).result()
+        metrics.observe("parse_seconds", time.perf_counter() - start)
+        result.document = document
+        if not document:
+            logging.error("Not HTML for URL: %s", result.url)
+        result.links = set(links.split("\n")) if links else set()
+        result.files = set(files.split("\n")) if files else set()
+        return result
+
+    def close(self) -> None:
+        """Stops the worker processes."""
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
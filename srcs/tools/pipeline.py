@@ -0,0 +1,552 @@
+"""
+Crawl Pipeline Module
+
+This module runs the crawl as three overlapping stages instead of three strict
+phases, so that files are downloaded while pages are still being discovered:
+
+    fetch workers --(bounded queue)--> parse workers --(bounded queue)--> download workers
+          ^                                 |
+          +---------- new in-scope URLs ----+
+
+Each stage has its own pool of threads. The queues between stages are bounded:
+when downloads fall behind, parse workers block, which in turn blocks fetch
+workers, so memory stays bounded. The frontier of URLs to fetch is only bounded
+by the size of the website, as its URLs are kept for deduplication anyway. It
+hands out pages by priority, breadth-first by default: fetch workers wait on a
+queue holding one token per scheduled page, then take the best page left.
+
+Pages may also be parsed by a pool of worker processes instead of the parse
+threads, which then only wait for the results, so that parsing scales with the
+number of cores. The fetch workers then keep the raw bodies for the pool.
+
+In sitemap mode, a seed thread reads the sitemaps of the website while the
+crawl runs and schedules the pages they list one hop away from the base URL,
+skipping the pages unchanged since they were cached.
+
+Each page parsed and each file downloaded may be reported as a `CrawlRecord`
+as soon as it is done, in which case the pages and files need not be
+collected in the result, so that the memory of a crawl does not grow with
+its results. `iter_crawl` yields these records while the crawl runs.
+
+The module includes the following:
+
+1. `PipelineResult`: The pages visited, the files found and downloaded, and
+   the time to the first downloaded file.
+
+2. `run_pipeline`: Crawls a website and downloads its files through the
+   pipeline, optionally checkpointing its progress in a `CrawlState`.
+
+3. `iter_crawl`: Crawls a website through the pipeline, yielding the record
+   of each page and file as it completes.
+"""
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+from tools import metrics
+from tools.scrape import PageResult, fetch_page, parse_page
+from tools.download import FileResult, fetch_file
+from tools.frontier import Frontier
+from tools.matcher import FileMatcher
+from tools.parsepool import ParsePool
+from tools.records import file_record, page_record
+from tools.sitemap import sitemap_pages
+from tools.url_utils import normalize_url
+from tools.visited import make_visited_set
+
+# Marks the end of the work for a worker
+_DONE = None
+
+# Tells a fetch worker that a page was added to the frontier
+_NEXT_PAGE = True
+
+# The number of records waiting to be read from `iter_crawl`
+RECORD_BUFFER = 256
+
+
+@dataclass
+class PipelineResult:
+    """
+    The outcome of a pipelined crawl.
+
+    Attributes:
+        pages (list): The `PageResult` of each visited page, unless they are
+            not collected.
+        files (set): The file URLs found on the pages, unless they are not
+            collected.
+        html_pages (int): The number of HTML pages visited.
+        found_files (int): The number of file URLs found on the pages.
+        requests (int): The number of HTTP requests made for the pages.
+        downloaded (int): The number of files successfully downloaded.
+        first_download (float): The number of seconds between the start of
+            the crawl and the first downloaded file, None if nothing was downloaded.
+        unchanged (int): The number of pages of the sitemaps not fetched as
+            they did not change since they were cached.
+        skipped (int): The number of files rejected by the filter.
+    """
+
+    pages: list = field(default_factory=list)
+    files: set = field(default_factory=set)
+    html_pages: int = 0
+    found_files: int = 0
+    requests: int = 0
+    downloaded: int = 0
+    first_download: float = None
+    unchanged: int = 0
+    skipped: int = 0
+
+
+class _Crawl:  # pylint: disable=too-many-instance-attributes
+    """The state shared by the workers of a pipelined crawl."""
+
+    def __init__(self, base_url, depth, extensions, options):
+        self.base_url = base_url
+        self.depth = depth
+        # The extensions are compiled once for the whole crawl
+        self.extensions = FileMatcher.of(extensions)
+        self.directory = options["directory"]
+        self.max_size = options.get("max_size")
+        self.file_filter = options.get("file_filter")
+        self.per_host = options["per_host"]
+        self.state = options.get("state")
+        self.store = options.get("store")
+        self.parse_pool = options.get("parse_pool")
+        self.on_record = options.get("on_record")
+        self.collect = options.get("collect", True)
+        self.stop = options.get("stop") or threading.Event()
+
+        queue_size = options["queue_size"]
+        # One token per page in the frontier
+        self.to_fetch = queue.Queue()
+        self.to_parse = queue.Queue(maxsize=queue_size)
+        self.to_download = queue.Queue(maxsize=queue_size)
+
+        self.lock = threading.Lock()
+        self.host_limits = {}
+        false_positive_rate = options.get("false_positive_rate")
+        self.visited = make_visited_set(false_positive_rate)
+        self.files = make_visited_set(false_positive_rate)
+        self.frontier = Frontier(
+            options.get("priority"),
+            options.get("max_hops"),
+            make_visited_set(false_positive_rate),
+        )
+        self.pending = 0
+        self.start = time.perf_counter()
+        self.result = PipelineResult()
+
+    def host_limit(self, url: str) -> threading.BoundedSemaphore:
+        """Returns the semaphore bounding the fetches to the host of the URL."""
+        host = urlparse(url).hostname
+        with self.lock:
+            if host not in self.host_limits:
+                self.host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self.host_limits[host]
+
+
+def _fetch_worker(crawl: _Crawl) -> None:
+    """Fetches the pages of the frontier and hands them to the parse stage."""
+    while True:
+        if crawl.to_fetch.get() is _DONE:
+            return
+        with crawl.lock:
+            webpage, hops = crawl.frontier.pop()
+        # A stopped crawl drains the frontier without fetching
+        if crawl.stop.is_set():
+            crawl.to_parse.put((webpage, hops, PageResult(webpage)))
+            continue
+        try:
+            with crawl.host_limit(webpage):
+                page = fetch_page(
+                    webpage,
+                    crawl.base_url,
+                    crawl.depth,
+                    crawl.visited,
+                    raw=crawl.parse_pool is not None,
+                )
+        except Exception:  # pylint: disable=broad-except
+            # A dead worker would stall the pipeline
+            logging.exception("Could not fetch URL: %s", webpage)
+            page = PageResult(webpage)
+        crawl.to_parse.put((webpage, hops, page))
+
+
+def _parse_worker(crawl: _Crawl, fetch_workers: int) -> None:
+    """Parses the fetched pages, feeding the frontier and the download stage."""
+    while True:
+        item = crawl.to_parse.get()
+        if item is _DONE:
+            return
+        webpage, hops, page = item
+        # The pages left when the crawl stops stay scheduled for a resumed crawl
+        stopped = crawl.stop.is_set()
+        try:
+            if crawl.parse_pool is not None:
+                crawl.parse_pool.parse(page)
+            else:
+                parse_page(page, crawl.base_url, crawl.depth, crawl.extensions)
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("Could not parse URL: %s", page.url)
+        finally:
+            with crawl.lock:
+                if not stopped:
+                    crawl.visited.add(normalize_url(webpage))
+                crawl.result.html_pages += page.html
+                crawl.result.requests += page.requests
+
+                new_files = {file for file in page.files if file not in crawl.files}
+                crawl.files.update(new_files)
+                crawl.result.found_files += len(new_files)
+                if crawl.collect:
+                    crawl.result.pages.append(page)
+                    crawl.result.files.update(new_files)
+
+                # Only the base URL is visited without recursion
+                new_links = set() if crawl.depth == 0 else page.links
+                new_links = crawl.frontier.extend(
+                    (url for url in new_links if url not in crawl.visited),
+                    hops + 1,
+                    page,
+                )
+                crawl.pending += len(new_links) - 1
+                finished = crawl.pending == 0
+
+            if crawl.state is not None:
+                crawl.state.schedule(new_links, hops + 1)
+                crawl.state.add_files(new_files)
+                if not stopped:
+                    crawl.state.visit(webpage)
+            if crawl.on_record is not None and not crawl.stop.is_set():
+                crawl.on_record(page_record(page, hops))
+            for _ in new_links:
+                crawl.to_fetch.put(_NEXT_PAGE)
+            # Blocks while the download stage is behind
+            for file in new_files:
+                crawl.to_download.put((file, hops))
+            if finished:
+                for _ in range(fetch_workers):
+                    crawl.to_fetch.put(_DONE)
+
+
+def _seed_worker(crawl: _Crawl, fetch_workers: int) -> None:
+    """Schedules the pages of the sitemaps of the website."""
+    try:
+        for url, unchanged in sitemap_pages(crawl.base_url, crawl.depth):
+            if crawl.stop.is_set():
+                break
+            with crawl.lock:
+                if unchanged:
+                    # Neither fetched now nor when linked from another page
+                    if url not in crawl.frontier:
+                        crawl.frontier.mark_seen(url)
+                        crawl.result.unchanged += 1
+                    continue
+                if normalize_url(url) in crawl.visited or not crawl.frontier.push(
+                    url, 1
+                ):
+                    continue
+                crawl.pending += 1
+            if crawl.state is not None:
+                crawl.state.schedule([url], 1)
+            crawl.to_fetch.put(_NEXT_PAGE)
+    except Exception:  # pylint: disable=broad-except
+        logging.exception("Could not read the sitemaps of %s", crawl.base_url)
+    finally:
+        # The seed thread counts as a pending page until it is done
+        with crawl.lock:
+            crawl.pending -= 1
+            finished = crawl.pending == 0
+        if finished:
+            for _ in range(fetch_workers):
+                crawl.to_fetch.put(_DONE)
+
+
+def _download_worker(crawl: _Crawl) -> None:
+    """Downloads the files found by the parse stage."""
+    while True:
+        item = crawl.to_download.get()
+        if item is _DONE:
+            return
+        file, hops = item
+        if crawl.stop.is_set():
+            continue
+        try:
+            result = fetch_file(
+                crawl.directory,
+                file,
+                crawl.max_size,
+                store=crawl.store,
+                file_filter=crawl.file_filter,
+            )
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("Could not download URL: %s", file)
+            result = FileResult(file)
+        if crawl.on_record is not None:
+            crawl.on_record(file_record(result, hops))
+        if result.skipped is not None:
+            with crawl.lock:
+                crawl.result.skipped += 1
+        if result.saved:
+            if crawl.state is not None:
+                crawl.state.mark_downloaded(file)
+            with crawl.lock:
+                crawl.result.downloaded += 1
+                if crawl.result.first_download is None:
+                    crawl.result.first_download = time.perf_counter() - crawl.start
+
+
+def _start(count: int, target, *args) -> list:
+    """Starts `count` threads running `target`."""
+    threads = [
+        threading.Thread(target=target, args=args, daemon=True) for _ in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def _stop(threads: list, work_queue: queue.Queue) -> None:
+    """Tells the threads reading a queue to stop and waits for them."""
+    for _ in threads:
+        work_queue.put(_DONE)
+    for thread in threads:
+        thread.join()
+
+
+def _restore(crawl: _Crawl) -> list:
+    """
+    Restores the progress saved in the crawl state.
+
+    Args:
+        crawl (_Crawl): The crawl to restore.
+
+    Returns:
+        list: The files left to download.
+    """
+    frontier, visited, files, downloaded = crawl.state.load()
+    if not frontier and not visited:
+        crawl.frontier.push(crawl.base_url)
+        crawl.state.schedule([crawl.base_url])
+        return []
+
+    for url in visited:
+        crawl.visited.add(normalize_url(url))
+        crawl.frontier.mark_seen(url)
+    for url, hops in frontier:
+        crawl.frontier.push(url, hops)
+    crawl.files.update(files)
+    crawl.result.found_files = len(files)
+    if crawl.collect:
+        crawl.result.files.update(files)
+    return sorted(files - downloaded)
+
+
+def run_pipeline(  # pylint: disable=too-many-arguments,too-many-locals
+    base_url: str,
+    depth: int,
+    extensions: list,
+    directory: str,
+    workers: tuple = (1, 1, 4),
+    per_host: int = None,
+    queue_size: int = 64,
+    max_size: int = None,
+    file_filter=None,
+    state=None,
+    store=None,
+    priority=None,
+    max_hops: int = None,
+    false_positive_rate: float = None,
+    sitemap: bool = False,
+    parse_processes: int = 0,
+    on_record=None,
+    collect: bool = True,
+    stop: threading.Event = None,
+) -> PipelineResult:
+    """
+    Crawls the pages within the scope specified by the base URL and depth and
+    downloads the files they reference, running the fetch, parse and download
+    stages concurrently.
+
+    Args:
+        base_url (str): The base URL to start the retrieval from.
+        depth (int): The maximum depth of nested pages to retrieve.
+        extensions (list): A list of file extensions to scrape.
+        directory (str): The directory where the files are downloaded.
+        workers (tuple): The number of fetch, parse and download workers.
+        per_host (int): The maximum number of pages fetched at once from a
+            single host. Defaults to the number of fetch workers.
+        queue_size (int): The capacity of the queues between stages.
+        max_size (int): The maximum size in bytes of a downloaded file.
+        file_filter (FileFilter): The filter the files must pass to be
+            downloaded, checked before their body is transferred.
+        state (CrawlState): The checkpoint of the crawl. The crawl resumes
+            from the progress it holds.
+        store (ContentStore): The content-addressed store where files are
+            saved instead of the directory.
+        priority (callable): The priority function of the frontier.
+            Pages are fetched breadth-first if None.
+        max_hops (int): The maximum number of links followed from the base
+            URL. No limit if None.
+        false_positive_rate (float): The rate of unvisited pages that may be
+            taken for visited ones, to record the URLs seen in a compact
+            structure. Exact sets are used if None, see `make_visited_set`.
+        sitemap (bool): If True, the pages listed by the sitemaps of the
+            website are also crawled, as if linked from the base URL, except
+            those whose `<lastmod>` is older than their cached copy.
+        parse_processes (int): The number of processes parsing the pages.
+            Pages are parsed by the parse workers if 0, otherwise the parse
+            workers hand them to the processes, and there are at least as
+            many parse workers as processes.
+        on_record (callable): Called from the workers with the `CrawlRecord`
+            of each page fetched and each file downloaded, once it is done.
+        collect (bool): If False, the pages and files are only counted in
+            the result, not collected.
+        stop (threading.Event): Stops the crawl when set: the pages and files
+            left are skipped.
+
+    Returns:
+        PipelineResult: The pages visited and the files found and downloaded
+        during this run.
+    """
+    fetch_workers, parse_workers, download_workers = workers
+    parse_pool = None
+    if parse_processes > 0:
+        parse_pool = ParsePool(parse_processes, base_url, depth, extensions)
+        parse_workers = max(parse_workers, parse_processes)
+    options = {
+        "directory": directory,
+        "max_size": max_size,
+        "file_filter": file_filter,
+        "per_host": per_host or fetch_workers,
+        "queue_size": queue_size,
+        "state": state,
+        "store": store,
+        "priority": priority,
+        "max_hops": max_hops,
+        "false_positive_rate": false_positive_rate,
+        "parse_pool": parse_pool,
+        "on_record": on_record,
+        "collect": collect,
+        "stop": stop,
+    }
+    crawl = _Crawl(base_url, depth, extensions, options)
+    files = []
+    if state is not None:
+        files = _restore(crawl)
+    else:
+        crawl.frontier.push(base_url)
+
+    crawl.pending = len(crawl.frontier)
+    for _ in range(crawl.pending):
+        crawl.to_fetch.put(_NEXT_PAGE)
+    # The sitemaps are only read for a recursive crawl
+    sitemap = sitemap and depth > 0
+    if sitemap:
+        crawl.pending += 1
+    if not crawl.pending:
+        for _ in range(fetch_workers):
+            crawl.to_fetch.put(_DONE)
+
+    # The pages waiting to be fetched are the tokens of the frontier
+    gauges = {
+        "fetch": crawl.to_fetch.qsize,
+        "parse": crawl.to_parse.qsize,
+        "download": crawl.to_download.qsize,
+    }
+    for name, function in gauges.items():
+        metrics.gauge("queue_depth", function, name)
+
+    fetchers = _start(fetch_workers, _fetch_worker, crawl)
+    parsers = _start(parse_workers, _parse_worker, crawl, fetch_workers)
+    downloaders = _start(download_workers, _download_worker, crawl)
+    seeders = _start(1 if sitemap else 0, _seed_worker, crawl, fetch_workers)
+
+    # Files found by the interrupted run but not downloaded yet
+    for file in files:
+        crawl.to_download.put((file, None))
+
+    # Parse workers stop the fetch workers once the frontier is exhausted
+    for thread in seeders + fetchers:
+        thread.join()
+    _stop(parsers, crawl.to_parse)
+    _stop(downloaders, crawl.to_download)
+    if parse_pool is not None:
+        parse_pool.close()
+    if state is not None:
+        state.flush()
+    for name in gauges:
+        metrics.remove_gauge("queue_depth", name)
+
+    return crawl.result
+
+
+def iter_crawl(base_url: str, depth: int, extensions: list, directory: str, **options):
+    """
+    Crawls a website through the pipeline like `run_pipeline`, yielding the
+    `CrawlRecord` of each page and file as soon as it is done. The records are
+    handed over through a bounded buffer, so a slow consumer slows the crawl
+    down rather than the records piling up, and the pages and files are not
+    collected. Closing the generator stops the crawl.
+
+    Args:
+        base_url (str): The base URL to start the retrieval from.
+        depth (int): The maximum depth of nested pages to retrieve.
+        extensions (list): A list of file extensions to scrape.
+        directory (str): The directory where the files are downloaded.
+        **options: The other arguments of `run_pipeline`.
+
+    Yields:
+        CrawlRecord: The record of each page and file.
+
+    Returns:
+        PipelineResult: The counts of the crawl, as the value of the
+        `StopIteration`.
+    """
+    records = queue.Queue(maxsize=RECORD_BUFFER)
+    stop = threading.Event()
+    outcome = {}
+
+    def hand_over(record) -> None:
+        # Nobody reads the records once the generator is closed
+        while not stop.is_set():
+            try:
+                records.put(record, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def crawl() -> None:
+        try:
+            outcome["result"] = run_pipeline(
+                base_url,
+                depth,
+                extensions,
+                directory,
+                **options,
+                on_record=hand_over,
+                collect=False,
+                stop=stop,
+            )
+        except BaseException as error:  # pylint: disable=broad-except
+            outcome["error"] = error
+        finally:
+            hand_over(_DONE)
+
+    thread = threading.Thread(target=crawl, daemon=True)
+    thread.start()
+    try:
+        while True:
+            record = records.get()
+            if record is _DONE:
+                break
+            yield record
+    finally:
+        stop.set()
+        # The crawl may still use the state, the store and the callbacks
+        thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
@@ -0,0 +1,509 @@
+"""
+Rate Limiting Module
+
+This module keeps the crawl polite towards each host while getting the most
+sustainable throughput out of it. Every request to a host goes through the
+`HostLimiter` of that host, which:
+
+- checks the `robots.txt` rules of the host, fetched once,
+- spaces the requests with a token bucket, whose rate is capped by the
+  `Crawl-delay` and `Request-rate` of `robots.txt` and by the configured rate,
+- bounds the number of requests in flight, a streamed response being in
+  flight until its body is read, raising the bound while latency stays low
+  and lowering it when latency grows,
+- on `429 Too Many Requests` and `503 Service Unavailable`, halves its rate
+  and concurrency and pauses the host for the time given by `Retry-After`,
+  or for an exponential backoff without it.
+
+The rate and the concurrency grow back slowly after a throttling response, so
+they settle just below what the host accepts instead of alternating bursts
+and bans.
+
+The module includes the following:
+
+1. `DisallowedByRobots`: The error raised for URLs disallowed by robots.txt.
+
+2. `TokenBucket`: A thread-safe token bucket.
+
+3. `HostLimiter`: The robots rules, rate and concurrency of a host.
+
+4. `RateLimiter`: The limiters of all the hosts of a crawl.
+
+5. `parse_retry_after`: Parses the `Retry-After` header.
+
+6. `parse_crawl_delay`: Parses the `Crawl-delay` of a robots.txt.
+"""
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from functools import partial
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+import requests
+
+USER_AGENT = "spider"
+
+# The responses asking the client to slow down
+THROTTLE_CODES = (429, 503)
+
+# The bounds of the pause after a throttling response, in seconds
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 120.0
+
+# The lowest rate a host is slowed down to, in requests per second
+MIN_RATE = 0.1
+
+# The rate grows by this factor after each successful response
+RATE_INCREASE = 1.05
+
+# The latency above which concurrency is lowered, as a multiple of the
+# lowest latency observed on the host
+LATENCY_TOLERANCE = 3.0
+
+# The weight of the last response in the average latency
+LATENCY_SMOOTHING = 0.2
+
+ROBOTS_TIMEOUT = 5
+
+
+class DisallowedByRobots(requests.exceptions.RequestException):
+    """The URL is disallowed by the robots.txt of its host."""
+
+
+def parse_retry_after(value: str) -> float:
+    """
+    Parses the `Retry-After` header, either a number of seconds or a date.
+
+    Args:
+        value (str): The value of the header.
+
+    Returns:
+        float: The number of seconds to wait, None if the value is invalid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - time.time(), 0.0)
+
+
+def parse_crawl_delay(lines: list, user_agent: str = USER_AGENT) -> float:
+    """
+    Parses the `Crawl-delay` of a robots.txt for a user agent.
+    `urllib.robotparser` only reads whole seconds, while fractional delays
+    such as "0.5" are common.
+
+    Args:
+        lines (list): The lines of the robots.txt.
+        user_agent (str): The user agent of the crawler.
+
+    Returns:
+        float: The delay in seconds between two requests, None if there is none.
+    """
+    delays = {}
+    agents, in_rules = [], False
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if ":" not in line:
+            continue
+        name, value = (part.strip() for part in line.split(":", 1))
+        name = name.lower()
+        if name == "user-agent":
+            # A user agent after rules starts a new group
+            if in_rules:
+                agents, in_rules = [], False
+            agents.append(value.lower())
+            continue
+        in_rules = True
+        if name == "crawl-delay":
+            try:
+                delay = float(value)
+            except ValueError:
+                continue
+            for agent in agents:
+                delays.setdefault(agent, delay)
+
+    for agent, delay in delays.items():
+        if agent != "*" and agent in user_agent.lower():
+            return delay
+    return delays.get("*")
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket. Tokens are added at `rate` per second up to
+    `burst` tokens, and each request takes one, waiting for it if needed.
+
+    Attributes:
+        rate (float): The number of tokens added per second, None for no limit.
+        burst (int): The maximum number of tokens.
+    """
+
+    def __init__(self, rate: float = None, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Adds the tokens earned since the last update. The caller holds the lock."""
+        if self.rate is not None:
+            elapsed = now - self._updated
+            self._tokens = min(self._tokens + elapsed * self.rate, self.burst)
+        self._updated = now
+
+    def set_rate(self, rate: float) -> None:
+        """
+        Changes the rate of the bucket.
+
+        Args:
+            rate (float): The new number of tokens per second, None for no limit.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def acquire(self) -> float:
+        """
+        Takes a token, waiting until one is available. Tokens are reserved in
+        order, so waiting threads are served first come, first served.
+
+        Returns:
+            float: The number of seconds waited.
+        """
+        with self._lock:
+            if self.rate is None:
+                return 0.0
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class HostLimiter:  # pylint: disable=too-many-instance-attributes
+    """
+    The politeness state of a host: its robots.txt rules, the token bucket
+    spacing its requests and its adaptive concurrency.
+
+    Attributes:
+        host (str): The scheme and network location of the host.
+        max_rate (float): The highest rate allowed, None for no limit.
+        max_concurrency (int): The highest concurrency allowed, None for no limit.
+        bucket (TokenBucket): The bucket spacing the requests.
+        concurrency (float): The current bound of requests in flight.
+        latency (float): The average latency of the responses, in seconds.
+    """
+
+    def __init__(self, host: str, rate: float = None, concurrency: int = None):
+        self.host = host
+        self.max_rate = rate
+        self.max_concurrency = concurrency
+        self.bucket = TokenBucket(rate)
+        self.concurrency = float(concurrency) if concurrency else None
+        self.latency = None
+        self.robots = None
+
+        self._lowest_latency = None
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._throttled = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        self._robots_lock = threading.Lock()
+
+    def ensure_robots(self, session=requests) -> None:
+        """Loads robots.txt unless it was already loaded by another thread."""
+        with self._robots_lock:
+            if self.robots is None:
+                self.load_robots(session)
+
+    def load_robots(self, session=requests) -> None:
+        """
+        Fetches the robots.txt of the host and applies its `Crawl-delay` and
+        `Request-rate`. Like `urllib.robotparser`, a 401 or 403 disallows the
+        whole host, while a missing file or an error allows it.
+
+        Args:
+            session: The object whose `get` fetches robots.txt.
+        """
+        robots = RobotFileParser(self.host + "/robots.txt")
+        lines = []
+        try:
+            response = session.get(robots.url, timeout=ROBOTS_TIMEOUT)
+        except requests.RequestException as e:
+            logging.error("Could not fetch %s: %s", robots.url, str(e))
+            robots.allow_all = True
+        else:
+            if response.status_code in (401, 403):
+                robots.disallow_all = True
+            elif response.status_code >= 400:
+                robots.allow_all = True
+            else:
+                lines = response.text.splitlines()
+                robots.parse(lines)
+        self.robots = robots
+
+        delay = parse_crawl_delay(lines)
+        request_rate = robots.request_rate(USER_AGENT)
+        rates = [self.max_rate] if self.max_rate else []
+        if delay:
+            rates.append(1 / float(delay))
+        if request_rate and request_rate.requests and request_rate.seconds:
+            rates.append(request_rate.requests / request_rate.seconds)
+        if rates:
+            self.max_rate = min(rates)
+            self.bucket.set_rate(self.max_rate)
+
+    def allowed(self, url: str) -> bool:
+        """
+        Checks a URL against the robots.txt rules of the host.
+
+        Args:
+            url (str): A URL of the host.
+
+        Returns:
+            bool: True if the URL may be fetched, or if robots.txt was not loaded.
+        """
+        return self.robots is None or self.robots.can_fetch(USER_AGENT, url)
+
+    def acquire(self) -> None:
+        """Waits for the host to be available and for a slot and a token."""
+        with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._condition.wait(pause)
+                elif self.concurrency is not None and self._in_flight >= int(
+                    self.concurrency
+                ):
+                    self._condition.wait()
+                else:
+                    break
+            self._in_flight += 1
+        self.bucket.acquire()
+
+    def release(self, status_code: int = None, elapsed: float = None, retry_after=None):
+        """
+        Frees a slot and adapts the rate and concurrency to the response.
+
+        Args:
+            status_code (int): The status of the response, None if the request failed.
+            elapsed (float): The latency of the response, in seconds.
+            retry_after (float): The number of seconds to wait given by the host.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if status_code in THROTTLE_CODES:
+                self._slow_down(retry_after, elapsed)
+            elif status_code is not None and elapsed is not None:
+                self._speed_up(elapsed)
+            self._condition.notify_all()
+
+    def _slow_down(self, retry_after: float, elapsed: float) -> None:
+        """Halves the rate and concurrency and pauses the host. The caller holds the lock."""
+        self._throttled += 1
+        if retry_after is None:
+            retry_after = MIN_BACKOFF * 2 ** (self._throttled - 1)
+        pause = min(retry_after, MAX_BACKOFF)
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+        rate = self.bucket.rate
+        if rate is None:
+            # Little's law: the throughput the host was serving
+            latency = max(self.latency or elapsed or MIN_BACKOFF, 1e-3)
+            rate = (self._in_flight + 1) / latency
+        self.bucket.set_rate(max(rate / 2, MIN_RATE))
+        if self.concurrency is not None:
+            self.concurrency = max(self.concurrency / 2, 1.0)
+        logging.error(
+            "Throttled by %s, pausing %.1fs at %.2f requests/s",
+            self.host,
+            pause,
+            self.bucket.rate,
+        )
+
+    def _speed_up(self, elapsed: float) -> None:
+        """Adapts to a successful response. The caller holds the lock."""
+        self._throttled = 0
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency += LATENCY_SMOOTHING * (elapsed - self.latency)
+        if self._lowest_latency is None or elapsed < self._lowest_latency:
+            self._lowest_latency = elapsed
+
+        # The rate recovers up to the limit given by robots.txt or the user
+        rate = self.bucket.rate
+        if rate is not None:
+            rate *= RATE_INCREASE
+            if self.max_rate is not None:
+                rate = min(rate, self.max_rate)
+            self.bucket.set_rate(rate)
+
+        if self.concurrency is None:
+            return
+        now = time.monotonic()
+        congested = self.latency > LATENCY_TOLERANCE * max(self._lowest_latency, 1e-3)
+        if congested and now - self._last_decrease > self.latency:
+            # Lowered at most once per round trip
+            self.concurrency = max(self.concurrency * 0.75, 1.0)
+            self._last_decrease = now
+        elif not congested:
+            self.concurrency = min(
+                self.concurrency + 1 / self.concurrency, float(self.max_concurrency)
+            )
+
+
+class RateLimiter:
+    """
+    The limiters of the hosts of a crawl.
+
+    Attributes:
+        rate (float): The maximum number of requests per second to a host,
+            None for no limit until the host throttles.
+        concurrency (int): The maximum number of requests in flight to a host,
+            None for no limit.
+        robots (bool): Whether robots.txt is honored.
+        session: The object whose `get` fetches robots.txt, such as the
+            session of the crawl.
+    """
+
+    def __init__(
+        self,
+        rate: float = None,
+        concurrency: int = None,
+        robots=True,
+        session=requests,
+    ):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.robots = robots
+        self.session = session
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def host(self, url: str) -> HostLimiter:
+        """
+        Returns the limiter of the host of a URL, loading its robots.txt the
+        first time the host is seen.
+
+        Args:
+            url (str): The URL to fetch.
+
+        Returns:
+            HostLimiter: The limiter of the host.
+        """
+        parts = urlsplit(url)
+        key = f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+        with self._lock:
+            limiter = self._hosts.get(key)
+            if limiter is None:
+                limiter = HostLimiter(key, self.rate, self.concurrency)
+                self._hosts[key] = limiter
+        if self.robots and limiter.robots is None:
+            # Only one thread fetches robots.txt, the others wait for it
+            limiter.ensure_robots(self.session)
+        return limiter
+
+    @contextmanager
+    def slot(self, url: str):
+        """
+        Waits for the right to send a request to the host of a URL.
+
+        The slot of a streamed response is held until its body is read or
+        the response is closed, so that body transfers count towards the
+        concurrency of the host and its latency covers the whole transfer.
+
+        Args:
+            url (str): The URL to fetch.
+
+        Yields:
+            callable: A function to call with the response, adapting the
+            limiter to it. The slot is freed without adapting if it is not called.
+
+        Raises:
+            DisallowedByRobots: If robots.txt disallows the URL.
+        """
+        limiter = self.host(url)
+        if not limiter.allowed(url):
+            raise DisallowedByRobots(f"Disallowed by robots.txt: {url}")
+
+        limiter.acquire()
+        start = time.monotonic()
+        observed = []
+
+        def observe(response: requests.Response) -> None:
+            observed.append(response)
+
+        try:
+            yield observe
+        finally:
+            if observed:
+                response = observed[0]
+                release = partial(
+                    limiter.release,
+                    response.status_code,
+                    retry_after=parse_retry_after(response.headers.get("retry-after")),
+                )
+                if _is_streaming(response):
+                    _on_body_done(
+                        response, lambda: release(elapsed=time.monotonic() - start)
+                    )
+                else:
+                    release(elapsed=time.monotonic() - start)
+            else:
+                limiter.release()
+
+
+def _is_streaming(response: requests.Response) -> bool:
+    """Whether the body of a response is still to be read from the network."""
+    if getattr(response, "from_cache", False):
+        return False
+    # pylint: disable-next=protected-access
+    return not response._content_consumed and response.raw is not None
+
+
+def _on_body_done(response: requests.Response, callback) -> None:
+    """
+    Calls a function once, when the body of a streamed response was read or
+    the response was closed. The raw body releases its connection in both
+    cases, or closes itself for the bodies of the HTTP/2 adapter.
+    """
+    lock = threading.Lock()
+    pending = [callback]
+
+    def done():
+        with lock:
+            callbacks = pending[:]
+            pending.clear()
+        for function in callbacks:
+            function()
+
+    raw = response.raw
+    for name in ("release_conn", "close"):
+        method = getattr(raw, name, None)
+        if method is not None:
+            setattr(raw, name, _then(method, done))
+
+
+def _then(method, callback):
+    """Wraps a method to call a function after it, even if it fails."""
+
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        finally:
+            callback()
+
+    return wrapper
@@ -0,0 +1,154 @@
+"""
+Crawl Records Module
+
+This module describes each page and file of a crawl as a flat record, emitted
+as soon as the page is parsed or the file downloaded, so that the results of
+a crawl can be streamed to another program instead of being collected in
+memory until it ends.
+
+The module includes the following:
+
+1. `CrawlRecord`: The record of a page or a file.
+
+2. `page_record` and `file_record`: Build the record of a fetched page or of
+   a downloaded file.
+
+3. `ManifestWriter`: Streams records to a JSON Lines file.
+"""
+
+import json
+import time
+import threading
+from dataclasses import asdict, dataclass, field
+from tools.download import FileResult
+from tools.scrape import PageResult
+
+PAGE = "page"
+FILE = "file"
+
+
+@dataclass
+class CrawlRecord:  # pylint: disable=too-many-instance-attributes
+    """
+    The record of a page or a file of a crawl.
+
+    Attributes:
+        kind (str): `PAGE` or `FILE`.
+        url (str): The URL of the page, i.e. the redirection target when the
+            page redirected, or of the file.
+        status (int): The HTTP status of the response, None without response.
+        depth (int): The number of links followed from the base URL to the
+            page, or to the page where the file was found. None for files
+            found by an interrupted run.
+        bytes (int): The size of the body.
+        content_type (str): The Content-Type of the response.
+        seconds (float): The duration of the fetch or of the download.
+        finished (float): When the page or file was done, as a `time.time()`.
+        path (str): The path where the file was saved, None for pages and
+            files which were not saved.
+        links (int): The number of in-scope links of a page.
+        files (int): The number of files referenced by a page.
+        skipped (str): The reason a file was rejected by the filter before
+            being downloaded, None otherwise.
+    """
+
+    kind: str
+    url: str
+    status: int = None
+    depth: int = None
+    bytes: int = 0
+    content_type: str = None
+    seconds: float = 0.0
+    finished: float = field(default_factory=time.time)
+    path: str = None
+    links: int = 0
+    files: int = 0
+    skipped: str = None
+
+    def to_json(self) -> str:
+        """Returns the record as a single line of JSON."""
+        return json.dumps(asdict(self))
+
+
+def page_record(page: PageResult, hops: int) -> CrawlRecord:
+    """
+    Builds the record of a fetched page.
+
+    Args:
+        page (PageResult): The fetched and parsed page.
+        hops (int): The number of links followed to the page.
+
+    Returns:
+        CrawlRecord: The record of the page.
+    """
+    return CrawlRecord(
+        PAGE,
+        page.url,
+        status=page.status,
+        depth=hops,
+        bytes=page.size,
+        content_type=page.content_type,
+        seconds=round(page.seconds, 6),
+        links=len(page.links),
+        files=len(page.files),
+    )
+
+
+def file_record(result: FileResult, hops: int) -> CrawlRecord:
+    """
+    Builds the record of a downloaded file.
+
+    Args:
+        result (FileResult): The outcome of the download.
+        hops (int): The number of links followed to the page of the file.
+
+    Returns:
+        CrawlRecord: The record of the file.
+    """
+    return CrawlRecord(
+        FILE,
+        result.url,
+        status=result.status,
+        depth=hops,
+        bytes=result.size,
+        content_type=result.content_type,
+        seconds=round(result.seconds, 6),
+        path=result.path,
+        skipped=result.skipped,
+    )
+
+
+class ManifestWriter:
+    """
+    Streams crawl records to a JSON Lines file, one record per line. It is
+    thread-safe, so it can be called by the workers of a crawl.
+
+    Attributes:
+        path (str): The path of the manifest.
+        count (int): The number of records written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        # pylint: disable-next=consider-using-with
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, record: CrawlRecord) -> None:
+        """Appends a record to the manifest."""
+        line = record.to_json() + "\n"
+        with self._lock:
+            self._file.write(line)
+            self.count += 1
+
+    def close(self) -> None:
+        """Closes the manifest."""
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,301 @@
+"""
+Retry Module
+
+This module keeps transient failures and slow responses from losing pages or
+stalling the crawl. Every request sent through the `RetryPolicy` of the crawl:
+
+- is sent again after a connection error, a timeout or a `5xx` response, up
+  to `retries` times, waiting an exponential backoff with full jitter so
+  that the retries of many workers do not hit the host at the same time,
+- gets a timeout adapted to its host: until enough responses were observed
+  the timeout of the caller is used, then a multiple of the 99th percentile
+  of the recent latencies of the host, so that a dead connection to a fast
+  host is given up in a fraction of a second instead of the full timeout,
+- is optionally hedged: when the response takes longer than the 95th
+  percentile latency of its host, a second identical request is sent and the
+  first response to arrive is used, the other one being closed.
+
+Only GET requests are sent by the spider, so every request is idempotent and
+can be retried or hedged.
+
+The module includes the following:
+
+1. `LatencyTracker`: The recent latencies of a host and their percentiles.
+
+2. `RetryPolicy`: Retries, adaptive timeouts and hedging of the requests.
+
+3. `backoff_delay`: The exponential backoff with full jitter.
+"""
+
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+import requests
+from tools.ratelimit import THROTTLE_CODES, parse_retry_after
+
+# The server errors after which a request is sent again
+SERVER_ERROR_CODES = (500, 502, 504)
+
+# The responses sent again, as the host may answer the next request
+RETRY_CODES = SERVER_ERROR_CODES + THROTTLE_CODES
+
+# The errors after which a request is sent again
+RETRY_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+# The number of recent latencies kept per host
+LATENCY_WINDOW = 256
+
+# The number of latencies observed on a host before its percentiles are used
+MIN_SAMPLES = 20
+
+# The adaptive timeout, as a multiple of the 99th percentile latency
+TIMEOUT_FACTOR = 4.0
+
+# The bounds of the adaptive timeout, in seconds
+MIN_TIMEOUT = 0.5
+MAX_TIMEOUT = 30.0
+
+# The percentile latency after which a request is hedged
+HEDGE_PERCENTILE = 95
+
+# The number of threads sending hedged requests
+HEDGE_WORKERS = 64
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Returns the delay before a retry, drawn uniformly between 0 and an
+    exponentially growing bound ("full jitter").
+
+    Args:
+        attempt (int): The number of the retry, from 0.
+        base (float): The bound of the first retry, in seconds.
+        cap (float): The largest bound, in seconds.
+
+    Returns:
+        float: The delay in seconds.
+    """
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class LatencyTracker:
+    """
+    The latencies of the last `LATENCY_WINDOW` responses of a host.
+    """
+
+    def __init__(self):
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def record(self, latency: float) -> None:
+        """
+        Records the latency of a response.
+
+        Args:
+            latency (float): The time until the response headers, in seconds.
+        """
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, percent: float) -> float:
+        """
+        Returns a percentile of the recent latencies.
+
+        Args:
+            percent (float): The percentile, between 0 and 100.
+
+        Returns:
+            float: The latency in seconds, or None if fewer than `MIN_SAMPLES`
+                latencies were observed.
+        """
+        with self._lock:
+            if len(self._latencies) < MIN_SAMPLES:
+                return None
+            latencies = sorted(self._latencies)
+        index = min(int(len(latencies) * percent / 100), len(latencies) - 1)
+        return latencies[index]
+
+
+class RetryPolicy:
+    """
+    The retries, adaptive timeouts and hedging of the requests of a crawl.
+
+    Attributes:
+        retries (int): The number of times a failed request is sent again.
+        backoff (float): The bound of the delay before the first retry, in seconds.
+        max_backoff (float): The largest bound of the delay before a retry.
+        max_timeout (float): The largest adaptive timeout, in seconds.
+        hedge (bool): Whether slow requests are hedged.
+        hedged (int): The number of hedged requests sent.
+        retried (int): The number of requests sent again.
+    """
+
+    def __init__(
+        self,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        max_timeout: float = MAX_TIMEOUT,
+        hedge: bool = False,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_timeout = max_timeout
+        self.hedge = hedge
+        self.hedged = 0
+        self.retried = 0
+        self._trackers = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def tracker(self, url: str) -> LatencyTracker:
+        """
+        Returns the latency tracker of the host of a URL.
+
+        Args:
+            url (str): The URL.
+
+        Returns:
+            LatencyTracker: The tracker of the host.
+        """
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            tracker = self._trackers.get(host)
+            if tracker is None:
+                tracker = self._trackers[host] = LatencyTracker()
+            return tracker
+
+    def timeout(self, url: str, default):
+        """
+        Returns the timeout of a request to the host of a URL.
+
+        Args:
+            url (str): The URL.
+            default (float): The timeout given by the caller, used until the
+                latency of the host is known. A (connect, read) tuple is
+                never adapted.
+
+        Returns:
+            float: The timeout in seconds.
+        """
+        if not isinstance(default, (int, float)):
+            return default
+        latency = self.tracker(url).percentile(99)
+        if latency is None:
+            return default
+        return min(max(latency * TIMEOUT_FACTOR, MIN_TIMEOUT), self.max_timeout)
+
+    def send(self, url: str, send, timeout=None, retry_codes=RETRY_CODES):
+        """
+        Sends a request, hedging it if it is slow and sending it again if
+        it fails.
+
+        Args:
+            url (str): The URL requested.
+            send (callable): Sends the request, called with its timeout and
+                returning a `requests.Response`.
+            timeout (float): The timeout given by the caller.
+            retry_codes (tuple): The status codes after which the request is
+                sent again.
+
+        Returns:
+            requests.Response: The response, the last one if every attempt
+                was answered with one of `retry_codes`.
+
+        Raises:
+            requests.RequestException: The error of the last attempt.
+        """
+        timeout = self.timeout(url, timeout)
+        attempt = 0
+        while True:
+            try:
+                response = self._send_hedged(url, send, timeout)
+            except RETRY_ERRORS as e:
+                if attempt == self.retries:
+                    raise
+                logging.warning("Retrying URL %s after error: %s", url, e)
+                if isinstance(e, requests.exceptions.Timeout) and timeout:
+                    # The adaptive timeout may have been too short
+                    timeout = min(timeout * 2, max(self.max_timeout, timeout))
+                delay = backoff_delay(attempt, self.backoff, self.max_backoff)
+            else:
+                if response.status_code not in retry_codes or attempt == self.retries:
+                    return response
+                response.close()
+                logging.warning(
+                    "Retrying URL %s after status %s", url, response.status_code
+                )
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                delay = max(
+                    backoff_delay(attempt, self.backoff, self.max_backoff),
+                    min(retry_after or 0, self.max_backoff),
+                )
+            with self._lock:
+                self.retried += 1
+            time.sleep(delay)
+            attempt += 1
+
+    def _send_timed(self, url: str, send, timeout):
+        """Sends a request and records its latency if it was answered."""
+        start = time.monotonic()
+        response = send(timeout)
+        if response.status_code < 500:
+            self.tracker(url).record(time.monotonic() - start)
+        return response
+
+    def _send_hedged(self, url: str, send, timeout):
+        """Sends a request, and a second one if the first is slow."""
+        delay = self.tracker(url).percentile(HEDGE_PERCENTILE) if self.hedge else None
+        if delay is None:
+            return self._send_timed(url, send, timeout)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=HEDGE_WORKERS, thread_name_prefix="hedge"
+                )
+            executor = self._executor
+
+        first = executor.submit(self._send_timed, url, send, timeout)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        with self._lock:
+            self.hedged += 1
+        pending = {first, executor.submit(self._send_timed, url, send, timeout)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # The slower response is closed once it arrives
+                    for other in pending | (done - {future}):
+                        other.add_done_callback(_close_response)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def close(self) -> None:
+        """Stops the threads sending hedged requests."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def _close_response(future) -> None:
+    """Closes the response of a request that lost the hedging race."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
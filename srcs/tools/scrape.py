@@ -2,28 +2,141 @@
 Web Scraping and URL Retrieval Module
 
 This module provides functions for web scraping and URL retrieval. It utilizes
-various libraries such as requests, BeautifulSoup, and validators to perform
-these tasks efficiently. The module includes the following functions:
+various libraries such as requests and validators, and the streaming
+`LinkExtractor`, to perform these tasks efficiently. The module includes the
+following functions:
 
 1. `scrape_files`: Scrapes file URLs from a webpage based on specified patterns.
 
 2. `get_urls_from_page`: Retrieves URLs from a webpage and its nested pages up to
    a specified depth. It also checks for redirection and validates URLs.
 
-3. `get_urls_from_page_content`: Extracts URLs from the HTML content of a web page
-   using BeautifulSoup.
+3. `get_urls_from_page_content`: Extracts URLs from the HTML content of a web page.
 
 4. `scrape_urls`: Iterates through paths containing a base URL and within
    the specified depth to retrieve more paths, effectively creating a set of nested
    URLs.
+
+5. `scrape_page`: Fetches and parses a web page once, returning both the URLs
+   and the files it references as a `PageResult`. It is made of `fetch_page`
+   and `parse_page`, which can also be run as separate stages.
+
+6. `scrape_pages`: Crawls the website like `scrape_urls`, visiting each page
+   once and yielding a `PageResult` per visit.
 """
 
-import re
+import time
 import logging
+from dataclasses import dataclass, field
 import validators
 import requests
-from bs4 import BeautifulSoup
-from tools.url_utils import clean_url, url_in_scope
+from requests.utils import stream_decode_response_unicode
+from tools import metrics, transport
+from tools.extract import LinkExtractor, iter_references, extract_references
+from tools.frontier import Frontier
+from tools.matcher import FileMatcher
+from tools.sitemap import sitemap_pages
+from tools.url_utils import clean_url, normalize_url, url_in_scope
+from tools.visited import make_visited_set
+
+REDIRECTION_CODES = (301, 302, 307, 308)
+
+PAGE_CHUNK_SIZE = 16 * 1024
+
+# The references followed as links
+LINK_TAGS = ("a", "link")
+LINK_ATTRIBUTE = "href"
+
+
+@dataclass
+class PageResult:  # pylint: disable=too-many-instance-attributes
+    """
+    The result of a single visit of a web page.
+
+    Attributes:
+        url (str): The URL of the page, i.e. the redirection target when the
+            page redirected within scope.
+        html (bool): True if the page was an HTML page and was parsed.
+        links (set): The in-scope URLs referenced by the page.
+        files (set): The file URLs referenced by the page.
+        requests (int): The number of HTTP requests made for this visit.
+        document (bool): True if the page declares an HTML doctype.
+        references (list): The `(tag, attribute, value)` references extracted
+            while fetching the page, until they are filtered by `parse_page`.
+        body (bytes): The raw body of the page when it is fetched to be
+            parsed in another process, until it is parsed.
+        encoding (str): The encoding of the body.
+        status (int): The HTTP status of the last response, None without
+            response.
+        content_type (str): The Content-Type of the last response.
+        size (int): The number of bytes of the body.
+        seconds (float): The duration of the fetch, redirections included.
+    """
+
+    url: str
+    html: bool = False
+    links: set = field(default_factory=set)
+    files: set = field(default_factory=set)
+    requests: int = 0
+    document: bool = False
+    references: list = field(default_factory=list, repr=False)
+    body: bytes = field(default=b"", repr=False)
+    encoding: str = None
+    status: int = None
+    content_type: str = None
+    size: int = 0
+    seconds: float = 0.0
+
+
+def extract_files(references: list, webpage: str, extensions) -> set:
+    """
+    Extracts the file URLs matching the specified extensions from the
+    references of a page.
+
+    Args:
+        references (list): The references of the web page.
+        webpage (str): The URL of the web page.
+        extensions (FileMatcher): The compiled extensions of the files to
+            scrape, or a list of extensions to compile.
+
+    Returns:
+        set: A set of file URLs matching the specified extensions.
+    """
+
+    matcher = FileMatcher.of(extensions)
+    filtered_urls = set()
+    # Every reference may be a file: links, images, sources, styles and metas
+    for value in set(value for _, _, value in references if value):
+        url = clean_url(webpage, value.strip())
+        if matcher.matches(url):
+            filtered_urls.add(url)
+    return filtered_urls
+
+
+def extract_links(references: list, webpage: str, base_url: str, depth: int) -> set:
+    """
+    Extracts the in-scope URLs from the references of a page.
+
+    Args:
+        references (list): The references of the web page.
+        webpage (str): The URL of the web page.
+        base_url (str): The base URL to determine if retrieved URLs are in scope.
+        depth (int): The maximum depth of nested pages to retrieve.
+
+    Returns:
+        set: A set of URLs extracted from the page.
+    """
+
+    subpaths = set()
+    base_key = normalize_url(base_url)
+    # Get all links from a and link
+    for tag, attribute, value in references:
+        if tag not in LINK_TAGS or attribute != LINK_ATTRIBUTE:
+            continue
+        url = clean_url(webpage, value)
+        if url.startswith(base_key) and url_in_scope(url, base_url, depth):
+            subpaths.add(normalize_url(url))
+    return subpaths
 
 
 def scrape_files(webpage: str, extensions: list) -> set:
@@ -33,7 +146,8 @@ def scrape_files(webpage: str, extensions: list) -> set:
 
     Args:
         webpage (str): The URL of the web page to scrape.
-        extensions (list): A list of file extensions to scrape.
+        extensions (list): A list of file extensions to scrape, or a
+            compiled `FileMatcher`.
 
     Returns:
         set: A set of filtered file URLs matching the specified extensions.
@@ -42,31 +156,14 @@ def scrape_files(webpage: str, extensions: list) -> set:
 
     try:
         # Make an HTTP GET request to the page URL
-        response = requests.get(webpage, allow_redirects=True, timeout=5)
-        response.raise_for_status()
-
-        # Parse the HTML content using BeautifulSoup
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        # Gathers the 'src' attribute of all img tags
-        links = set(link.attrs["src"] for link in soup.find_all(["img"], src=True))
-        links.update(
-            set(link.attrs["href"] for link in soup.find_all(["a"], href=True))
-        )
-
-        # Generate the URL pattern based on specified extensions
-        extension_patterns = r"(?:.(?!https?:\/\/))+.({})($|\?)".format(
-            "|".join(extensions)
+        response = transport.get(
+            webpage, allow_redirects=True, timeout=transport.DEFAULT_TIMEOUT
         )
+        response.raise_for_status()
 
-        # Filters links based on the provided pattern
-        filtered_urls = set()
-        for link in links:
-            word = re.search(extension_patterns, link)
-            if word != None:
-                url = clean_url(webpage, word.group(0))
-                filtered_urls.add(url)
-        return filtered_urls
+        # Extract the references without building a tree
+        _, references = extract_references(response.text)
+        return extract_files(references, webpage, extensions)
 
     except requests.exceptions.RequestException as e:
         logging.error("HTTP Error %s for URL: %s", str(e), webpage)
@@ -92,52 +189,17 @@ def get_urls_from_page(
     Returns:
         set: A set of URLs retrieved from the page and its nested pages.
     """
-    # Returns if the url is not valid
-    if not validators.url(webpage):
-        return set()
-
-    try:
-        # Make an HTTP GET request to the page URL
-        response = requests.get(webpage, timeout=5)
-        response.raise_for_status()
-
-        if response.status_code == 200:
-            # Only scrapes HTML pages
-            if response.headers and "text/html" in response.headers.get("content-type"):
-                nested_urls.add(webpage)
-                return get_urls_from_page_content(
-                    response.text, webpage, base_url, depth
-                )
-            logging.error(
-                "Cannot parse content-type %s for URL: %s",
-                response.headers["content-type"],
-                webpage,
-            )
-
-        # Fetch content if redirection within scope
-        elif response.status_code in (301, 302, 307, 308):
-            redirection_url = response.headers.get("Location")
-            if redirection_url and url_in_scope(redirection_url, base_url, depth):
-                if redirection_url.rstrip("/") not in visited:
-                    get_urls_from_page(
-                        redirection_url, base_url, depth, visited, nested_urls
-                    )
-
-                    # Add redirection URL to visited set
-                    visited.add(redirection_url.rstrip("/"))
-            else:
-                logging.error("Redirection to an external URL: %s", redirection_url)
-    except requests.RequestException as e:
-        logging.error("Request Exception: %s", str(e))
-
-    return set()
+    result = scrape_page(webpage, base_url, depth, visited=visited)
+    if result.html:
+        nested_urls.add(result.url)
+    return result.links
 
 
 def get_urls_from_page_content(
     content: str, webpage: str, base_url: str, depth: int
 ) -> set:
     """
-    Extracts URLs from the HTML content of a web page using BeautifulSoup library.
+    Extracts URLs from the HTML content of a web page.
 
     Args:
         content (str): The HTML content of the web page.
@@ -149,21 +211,18 @@ def get_urls_from_page_content(
         set: A set of URLs extracted from the page content.
     """
 
-    subpaths = set()
     if content:
-        if not re.search(r"<!DOCTYPE html>", content):
+        document, references = extract_references(content)
+        if not document:
             logging.error("Not HTML for URL: %s", webpage)
             return set()
-        soup = BeautifulSoup(content, "html.parser")
-        # Get all links from a and link
-        for link in soup.find_all(["link", "a"], href=True):
-            url = clean_url(webpage, link.get("href"))
-            if url.startswith(base_url) and url_in_scope(url, base_url, depth):
-                subpaths.add(url.rstrip("/"))
-    return subpaths
+        return extract_links(references, webpage, base_url, depth)
+    return set()
 
 
-def scrape_urls(base_url: str, depth: int) -> set:
+def scrape_urls(
+    base_url: str, depth: int, false_positive_rate: float = None, sitemap: bool = False
+) -> set:
     """
     Retrieves URLs within the scope specified by the base URL and depth.
     Each page visited is scraped for URLs. If the newly found URLs are within scope,
@@ -172,6 +231,12 @@ def scrape_urls(base_url: str, depth: int) -> set:
     Args:
         base_url (str): The base URL to start the retrieval from.
         depth (int): The maximum depth of nested pages to retrieve.
+        false_positive_rate (float): The rate of unvisited pages that may be
+            taken for visited ones, to record visited pages in a compact
+            structure. Exact sets are used if None.
+        sitemap (bool): If True, the pages listed by the sitemaps of the
+            website are visited too. Those whose `<lastmod>` is older than
+            their cached copy are retrieved without being visited.
 
     Returns:
         set: A set of nested URLs retrieved within the specified depth.
@@ -180,18 +245,233 @@ def scrape_urls(base_url: str, depth: int) -> set:
     if depth == 0:
         return set([base_url])
 
-    visited = set()
+    visited = make_visited_set(false_positive_rate)
     nested_urls = set()
-    to_visit = set([base_url])
+    frontier = Frontier(seen=make_visited_set(false_positive_rate))
+    frontier.push(base_url)
+    if sitemap:
+        for url, unchanged in sitemap_pages(base_url, depth):
+            if unchanged and url not in frontier:
+                frontier.mark_seen(url)
+                nested_urls.add(url)
+            else:
+                frontier.push(url, 1)
 
-    while to_visit:
-        webpage = to_visit.pop()
+    while frontier:
+        webpage, hops = frontier.pop()
+        # Redirection targets are visited with the page redirecting to them
+        if normalize_url(webpage) in visited:
+            continue
         retrieved_urls = get_urls_from_page(
             webpage, base_url, depth, visited, nested_urls
         )
-        if retrieved_urls:
-            to_visit.update(retrieved_urls)
-        visited.add(webpage.rstrip("/"))
-        to_visit.difference_update(visited)
+        frontier.extend(retrieved_urls, hops + 1)
+        visited.add(normalize_url(webpage))
 
     return nested_urls
+
+
+def fetch_page(
+    webpage: str, base_url: str, depth: int, visited: set = None, raw: bool = False
+) -> PageResult:
+    """
+    Fetches a web page. If the webpage redirects to another page, the
+    redirection is followed when it is in the scope of the base URL and depth.
+    The body of HTML pages is streamed through a `LinkExtractor` as it
+    arrives, so only its references are kept in the result until they are
+    filtered with `parse_page`.
+
+    Args:
+        webpage (str): The URL of the web page to fetch.
+        base_url (str): The base URL to determine if retrieved URLs are in scope.
+        depth (int): The maximum depth of nested pages to retrieve.
+        visited (set): A set of visited URLs to prevent revisiting.
+        raw (bool): If True, the body is kept as bytes instead of being
+            parsed, to be parsed by a `ParsePool`.
+
+    Returns:
+        PageResult: The fetched page, with its references if it is an HTML page.
+    """
+    result = PageResult(webpage)
+    start = time.perf_counter()
+    if visited is None:
+        visited = set()
+
+    # Returns if the url is not valid
+    if not validators.url(webpage):
+        return result
+
+    try:
+        # Make an HTTP GET request to the page URL
+        result.requests += 1
+        with transport.get(
+            webpage, timeout=transport.DEFAULT_TIMEOUT, stream=True
+        ) as response:
+            result.status = response.status_code
+            result.content_type = response.headers.get("content-type")
+            response.raise_for_status()
+
+            if response.status_code == 200:
+                metrics.increment("pages")
+                # Only scrapes HTML pages
+                content_type = response.headers.get("content-type", "")
+                if "text/html" in content_type and raw:
+                    result.html = True
+                    result.encoding = response.encoding
+                    result.body = b"".join(
+                        transport.iter_content(response, PAGE_CHUNK_SIZE)
+                    )
+                    result.size = len(result.body)
+                elif "text/html" in content_type:
+                    result.html = True
+                    # Extract the references while the body is downloaded
+                    extractor = LinkExtractor()
+                    chunks = stream_decode_response_unicode(
+                        _count_size(
+                            transport.iter_content(response, PAGE_CHUNK_SIZE), result
+                        ),
+                        response,
+                    )
+                    result.references = list(iter_references(chunks, extractor))
+                    result.document = extractor.document
+                else:
+                    logging.error(
+                        "Cannot parse content-type %s for URL: %s",
+                        content_type,
+                        webpage,
+                    )
+
+        # Fetch content if redirection within scope
+        if response.status_code in REDIRECTION_CODES:
+            redirection_url = response.headers.get("Location")
+            if redirection_url and url_in_scope(redirection_url, base_url, depth):
+                if normalize_url(redirection_url) not in visited:
+                    redirection = fetch_page(
+                        redirection_url, base_url, depth, visited, raw
+                    )
+                    redirection.requests += result.requests
+                    redirection.seconds = time.perf_counter() - start
+
+                    # Add redirection URL to visited set
+                    visited.add(normalize_url(redirection_url))
+                    return redirection
+            else:
+                logging.error("Redirection to an external URL: %s", redirection_url)
+    except requests.RequestException as e:
+        logging.error("Request Exception: %s", str(e))
+
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def _count_size(chunks, result: PageResult):
+    """Adds the size of the chunks of a body to the size of the page."""
+    for chunk in chunks:
+        result.size += len(chunk)
+        yield chunk
+
+
+def parse_page(
+    result: PageResult, base_url: str, depth: int, extensions: list = None
+) -> PageResult:
+    """
+    Filters the references of a fetched page into the in-scope URLs and the
+    file URLs it references. The references are released afterwards.
+
+    Args:
+        result (PageResult): The page returned by `fetch_page`.
+        base_url (str): The base URL to determine if retrieved URLs are in scope.
+        depth (int): The maximum depth of nested pages to retrieve.
+        extensions (list): A list of file extensions to scrape. No files are
+            scraped if None.
+
+    Returns:
+        PageResult: The same result, with its links and files.
+    """
+    references, result.references = result.references, []
+    if not result.html:
+        return result
+
+    if not result.document:
+        logging.error("Not HTML for URL: %s", result.url)
+
+    start = time.perf_counter()
+    if extensions:
+        result.files = extract_files(references, result.url, extensions)
+    if result.document:
+        result.links = extract_links(references, result.url, base_url, depth)
+    metrics.observe("parse_seconds", time.perf_counter() - start)
+    return result
+
+
+def scrape_page(
+    webpage: str,
+    base_url: str,
+    depth: int,
+    extensions: list = None,
+    visited: set = None,
+) -> PageResult:
+    """
+    Fetches and parses a web page once, extracting both the in-scope URLs and
+    the file URLs it references.
+
+    Args:
+        webpage (str): The URL of the web page to scrape.
+        base_url (str): The base URL to determine if retrieved URLs are in scope.
+        depth (int): The maximum depth of nested pages to retrieve.
+        extensions (list): A list of file extensions to scrape. No files are
+            scraped if None.
+        visited (set): A set of visited URLs to prevent revisiting.
+
+    Returns:
+        PageResult: The URLs and files found on the page.
+    """
+    result = fetch_page(webpage, base_url, depth, visited)
+    return parse_page(result, base_url, depth, extensions)
+
+
+def scrape_pages(
+    base_url: str,
+    depth: int,
+    extensions: list = None,
+    priority=None,
+    max_hops: int = None,
+    false_positive_rate: float = None,
+):
+    """
+    Visits the pages within the scope specified by the base URL and depth,
+    fetching and parsing each page only once. Pages are visited breadth-first
+    unless another priority is given.
+
+    Args:
+        base_url (str): The base URL to start the retrieval from.
+        depth (int): The maximum depth of nested pages to retrieve.
+        extensions (list): A list of file extensions to scrape.
+        priority (callable): The priority function of the frontier.
+        max_hops (int): The maximum number of links followed from the base
+            URL. No limit if None.
+        false_positive_rate (float): The rate of unvisited pages that may be
+            taken for visited ones, see `make_visited_set`.
+
+    Yields:
+        PageResult: The result of each visited page.
+    """
+
+    # The extensions are compiled once for the whole crawl
+    extensions = FileMatcher.of(extensions)
+    if depth == 0:
+        yield scrape_page(base_url, base_url, depth, extensions)
+        return
+
+    visited = make_visited_set(false_positive_rate)
+    frontier = Frontier(priority, max_hops, make_visited_set(false_positive_rate))
+    frontier.push(base_url)
+
+    while frontier:
+        webpage, hops = frontier.pop()
+        if normalize_url(webpage) in visited:
+            continue
+        result = scrape_page(webpage, base_url, depth, extensions, visited)
+        yield result
+        frontier.extend(result.links, hops + 1, result)
+        visited.add(normalize_url(webpage))
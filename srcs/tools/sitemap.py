@@ -0,0 +1,194 @@
+"""
+Sitemap Module
+
+This module discovers the pages of a website from its sitemaps instead of
+following its links. The sitemaps listed by `Sitemap:` lines in the
+`robots.txt` of the host are read, or `/sitemap.xml` if it lists none.
+Sitemap indexes are followed to the sitemaps they list.
+
+Sitemaps are parsed as they are downloaded with an incremental XML parser,
+and gzipped sitemaps (`.xml.gz`) are decompressed on the fly, so a sitemap is
+never held in memory: each `<url>` element is released once read, and only
+the sitemaps left to read are remembered. A sitemap larger than
+`MAX_SITEMAP_SIZE` once decompressed, the limit of the sitemaps protocol,
+is cut short.
+
+The `<lastmod>` date of a page is compared with the time its copy in the
+HTTP cache was stored, so that pages unchanged since the previous crawl can
+be skipped.
+
+The module includes the following:
+
+1. `parse_lastmod`: Parses a W3C datetime.
+
+2. `robots_sitemaps`: Lists the sitemaps of a host.
+
+3. `iter_sitemap`: Parses a sitemap or a sitemap index as it is downloaded.
+
+4. `sitemap_pages`: Lists the in-scope pages of the sitemaps of a website.
+"""
+
+import zlib
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from urllib.parse import urljoin
+from xml.etree import ElementTree
+import requests
+from tools import transport
+from tools.url_utils import clean_url, normalize_url, url_in_scope
+
+# The largest uncompressed sitemap, per the sitemaps protocol
+MAX_SITEMAP_SIZE = 50 * 1024 * 1024
+
+SITEMAP_CHUNK_SIZE = 64 * 1024
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def parse_lastmod(value: str) -> float:
+    """
+    Parses the `<lastmod>` of a sitemap, a W3C datetime such as `2023-10-02`
+    or `2023-10-02T08:00:00+00:00`. Dates without a time zone are UTC.
+
+    Args:
+        value (str): The date.
+
+    Returns:
+        float: The POSIX timestamp, or None if the date is invalid.
+    """
+    try:
+        moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def robots_sitemaps(base_url: str) -> list:
+    """
+    Lists the sitemaps of the host of a URL from the `Sitemap:` lines of its
+    robots.txt.
+
+    Args:
+        base_url (str): A URL of the host.
+
+    Returns:
+        list: The URLs of the sitemaps, `/sitemap.xml` if robots.txt lists none.
+    """
+    sitemaps = []
+    try:
+        with transport.get(
+            urljoin(base_url, "/robots.txt"), timeout=transport.DEFAULT_TIMEOUT
+        ) as response:
+            if response.status_code == 200:
+                for line in response.text.splitlines():
+                    field, _, value = line.partition(":")
+                    if field.strip().lower() == "sitemap" and value.strip():
+                        sitemaps.append(value.strip())
+    except requests.RequestException as e:
+        logging.error("Could not read robots.txt of %s: %s", base_url, str(e))
+    return sitemaps or [urljoin(base_url, "/sitemap.xml")]
+
+
+def _local_name(tag: str) -> str:
+    """Returns an XML tag without its namespace."""
+    return tag.rpartition("}")[2]
+
+
+def _iter_xml(response: requests.Response):
+    """Yields the bytes of a sitemap, decompressed if it is gzipped."""
+    decompressor = None
+    size = 0
+    for chunk in transport.iter_content(response, SITEMAP_CHUNK_SIZE):
+        if decompressor is None and size == 0 and chunk.startswith(GZIP_MAGIC):
+            decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        if decompressor is not None:
+            # Never inflates more than the size left, against gzip bombs
+            chunk = decompressor.decompress(chunk, MAX_SITEMAP_SIZE - size + 1)
+        size += len(chunk)
+        if size > MAX_SITEMAP_SIZE:
+            logging.error(
+                "Sitemap larger than %d bytes: %s", MAX_SITEMAP_SIZE, response.url
+            )
+            return
+        yield chunk
+
+
+def iter_sitemap(url: str):
+    """
+    Parses a sitemap or a sitemap index as it is downloaded.
+
+    Args:
+        url (str): The URL of the sitemap.
+
+    Yields:
+        tuple: `("url", location, lastmod)` for each page of a sitemap and
+            `("sitemap", location, lastmod)` for each sitemap of an index,
+            lastmod being a timestamp or None.
+    """
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    root = None
+    fields = {}
+    try:
+        with transport.get(
+            url, timeout=transport.DEFAULT_TIMEOUT, stream=True
+        ) as response:
+            response.raise_for_status()
+            for chunk in _iter_xml(response):
+                parser.feed(chunk)
+                for event, element in parser.read_events():
+                    name = _local_name(element.tag)
+                    if event == "start":
+                        if root is None:
+                            root = element
+                    elif name in ("loc", "lastmod"):
+                        fields[name] = (element.text or "").strip()
+                    elif name in ("url", "sitemap"):
+                        if fields.get("loc"):
+                            lastmod = parse_lastmod(fields.get("lastmod"))
+                            yield name, fields["loc"], lastmod
+                        fields = {}
+                        # Releases the entries read so far
+                        root.clear()
+            parser.close()
+    except requests.RequestException as e:
+        logging.error("Could not fetch sitemap %s: %s", url, str(e))
+    except ElementTree.ParseError as e:
+        logging.error("Invalid sitemap %s: %s", url, str(e))
+
+
+def sitemap_pages(base_url: str, depth: int, sitemaps: list = None):
+    """
+    Lists the pages of the sitemaps of a website within the scope of the base
+    URL and depth, following sitemap indexes.
+
+    Args:
+        base_url (str): The base URL defining the scope.
+        depth (int): The maximum depth of the pages.
+        sitemaps (list): The URLs of the sitemaps to read. Defaults to the
+            sitemaps listed by the robots.txt of the host.
+
+    Yields:
+        tuple: The URL of each page and whether it is unchanged, its
+            `<lastmod>` being older than its copy in the HTTP cache.
+    """
+    to_read = deque(sitemaps or robots_sitemaps(base_url))
+    read = set()
+    base_key = normalize_url(base_url)
+    while to_read:
+        sitemap = to_read.popleft()
+        if normalize_url(sitemap) in read:
+            continue
+        read.add(normalize_url(sitemap))
+
+        for kind, location, lastmod in iter_sitemap(sitemap):
+            if kind == "sitemap":
+                to_read.append(urljoin(sitemap, location))
+                continue
+            url = clean_url(sitemap, location)
+            if not url.startswith(base_key) or not url_in_scope(url, base_url, depth):
+                continue
+            stored = transport.cached_since(url)
+            yield url, lastmod is not None and stored is not None and lastmod < stored
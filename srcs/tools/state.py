@@ -0,0 +1,174 @@
+"""
+Crawl State Module
+
+This module checkpoints the progress of a crawl in a SQLite database so that an
+interrupted crawl can be resumed instead of restarted from zero. It records:
+
+- the frontier: the pages scheduled but not visited yet, with their hop depth,
+- the visited pages,
+- the file URLs found on the pages,
+- the files already downloaded.
+
+Writes are buffered and flushed in a single transaction every `batch_size`
+changes or every `interval` seconds, so checkpointing does not slow the crawl
+down.
+
+The module includes the following:
+
+1. `CrawlState`: The checkpoint database.
+"""
+
+import time
+import sqlite3
+import threading
+from itertools import groupby
+from operator import itemgetter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY, visited INTEGER NOT NULL, hops INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS files (url TEXT PRIMARY KEY, downloaded INTEGER NOT NULL);
+"""
+
+_SCHEDULE = "INSERT OR IGNORE INTO pages (url, visited, hops) VALUES (?, 0, ?)"
+_VISIT = (
+    "INSERT INTO pages (url, visited) VALUES (?, 1) "
+    "ON CONFLICT (url) DO UPDATE SET visited = 1"
+)
+_ADD_FILE = "INSERT OR IGNORE INTO files (url, downloaded) VALUES (?, 0)"
+_DOWNLOADED = "INSERT OR REPLACE INTO files (url, downloaded) VALUES (?, 1)"
+
+
+class CrawlState:
+    """
+    A SQLite checkpoint of the frontier, the visited pages, the files found
+    and the files downloaded by a crawl.
+
+    Attributes:
+        path (str): The path of the database.
+        batch_size (int): The number of buffered changes triggering a flush.
+        interval (float): The maximum number of seconds between two flushes.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, interval: float = 2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        # Databases written before hop depths were recorded
+        columns = [
+            row[1] for row in self._connection.execute("PRAGMA table_info(pages)")
+        ]
+        if "hops" not in columns:
+            self._connection.execute(
+                "ALTER TABLE pages ADD COLUMN hops INTEGER NOT NULL DEFAULT 0"
+            )
+
+    def start(self, base_url: str, depth: int, resume: bool) -> None:
+        """
+        Starts a crawl, either from scratch or from the saved progress.
+
+        Args:
+            base_url (str): The base URL of the crawl.
+            depth (int): The maximum depth of the crawl.
+            resume (bool): If False, the saved progress is discarded.
+
+        Raises:
+            ValueError: If the saved progress belongs to another crawl.
+        """
+        with self._lock, self._connection:
+            saved = dict(self._connection.execute("SELECT key, value FROM meta"))
+            crawl = {"base_url": base_url, "depth": str(depth)}
+            if resume and saved and saved != crawl:
+                raise ValueError(
+                    f"{self.path} holds the crawl of {saved.get('base_url')} "
+                    f"with depth {saved.get('depth')}"
+                )
+            if not resume:
+                self._connection.execute("DELETE FROM pages")
+                self._connection.execute("DELETE FROM files")
+            self._connection.execute("DELETE FROM meta")
+            self._connection.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)", crawl.items()
+            )
+
+    def load(self) -> tuple:
+        """
+        Loads the saved progress.
+
+        Returns:
+            tuple: The frontier (list of `(url, hops)`), the visited pages
+            (set), the files found (set) and the files downloaded (set).
+        """
+        self.flush()
+        with self._lock:
+            pages = self._connection.execute("SELECT url, visited, hops FROM pages")
+            frontier, visited = [], set()
+            for url, is_visited, hops in pages:
+                if is_visited:
+                    visited.add(url)
+                else:
+                    frontier.append((url, hops))
+
+            files, downloaded = set(), set()
+            for url, is_downloaded in self._connection.execute(
+                "SELECT url, downloaded FROM files"
+            ):
+                files.add(url)
+                if is_downloaded:
+                    downloaded.add(url)
+        return frontier, visited, files, downloaded
+
+    def _record(self, statement: str, rows) -> None:
+        """Buffers changes, flushing them when the batch is full or old."""
+        with self._lock:
+            self._buffer.extend((statement, row) for row in rows)
+            if (
+                len(self._buffer) < self.batch_size
+                and time.monotonic() - self._last_flush < self.interval
+            ):
+                return
+        self.flush()
+
+    def schedule(self, urls, hops: int = 0) -> None:
+        """Records pages added to the frontier at the given hop depth."""
+        self._record(_SCHEDULE, ((url, hops) for url in urls))
+
+    def visit(self, url: str) -> None:
+        """Records a visited page."""
+        self._record(_VISIT, [(url,)])
+
+    def add_files(self, urls) -> None:
+        """Records file URLs found on a page."""
+        self._record(_ADD_FILE, ((url,) for url in urls))
+
+    def mark_downloaded(self, url: str) -> None:
+        """Records a downloaded file."""
+        self._record(_DOWNLOADED, [(url,)])
+
+    def flush(self) -> None:
+        """Writes the buffered changes in a single transaction."""
+        with self._lock:
+            buffer, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if not buffer:
+                return
+            with self._connection:
+                # Consecutive changes of the same kind are written at once
+                for statement, changes in groupby(buffer, key=itemgetter(0)):
+                    self._connection.executemany(statement, (row for _, row in changes))
+
+    def close(self) -> None:
+        """Flushes the buffered changes and closes the database."""
+        self.flush()
+        with self._lock:
+            self._connection.close()
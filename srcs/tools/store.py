@@ -0,0 +1,144 @@
+"""
+Content-Addressed Store Module
+
+This module stores downloaded files by the SHA-256 of their content instead of
+their name, so the same bytes served from many URLs are stored only once:
+
+    <directory>/ab/cd/abcdef....png
+    <directory>/manifest.jsonl
+
+Files are sharded over two levels of directories named after the first four
+hexadecimal digits of their hash, which keeps directories small with hundreds
+of thousands of files. The manifest maps each URL to the hash of its content,
+one JSON object per line. The paths already stored are kept in memory, so
+adding a file never scans the disk.
+
+The module includes the following:
+
+1. `ContentStore`: The content-addressed store.
+"""
+
+import os
+import json
+import logging
+import threading
+
+MANIFEST = "manifest.jsonl"
+
+
+class ContentStore:
+    """
+    A content-addressed store of downloaded files with a URL manifest.
+
+    Attributes:
+        directory (str): The root directory of the store.
+        urls (dict): The hash of the content of each URL in the manifest.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.urls = {}
+        self._paths = set()
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as manifest:
+                for line in manifest:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # The last line of an interrupted run may be truncated
+                        continue
+                    self.urls[record["url"]] = record["sha256"]
+                    self._paths.add(record["path"])
+        # pylint: disable-next=consider-using-with
+        self._manifest = open(manifest_path, "a", encoding="utf-8")
+
+    def relative_path(self, digest: str, extension: str) -> str:
+        """
+        Returns the path of a content relative to the root of the store.
+
+        Args:
+            digest (str): The hexadecimal SHA-256 of the content.
+            extension (str): The extension of the file, such as ".png".
+
+        Returns:
+            str: The sharded path "ab/cd/<digest><extension>".
+        """
+        return os.path.join(digest[:2], digest[2:4], digest + extension.lower())
+
+    def contains(self, digest: str, extension: str) -> bool:
+        """
+        Checks whether a content is already stored.
+
+        Args:
+            digest (str): The hexadecimal SHA-256 of the content.
+            extension (str): The extension of the file.
+
+        Returns:
+            bool: True if the content is stored.
+        """
+        with self._lock:
+            return self.relative_path(digest, extension) in self._paths
+
+    def add(self, url: str, temporary_path: str, digest: str) -> str:
+        """
+        Moves a downloaded file into the store, or discards it if the same
+        content is already stored, and records its URL in the manifest.
+
+        Args:
+            url (str): The URL the file was downloaded from.
+            temporary_path (str): The path of the downloaded file.
+            digest (str): The hexadecimal SHA-256 of the file.
+
+        Returns:
+            str: The path of the stored file.
+        """
+        extension = os.path.splitext(os.path.basename(url))[1]
+        relative_path = self.relative_path(digest, extension)
+        fullpath = os.path.join(self.directory, relative_path)
+
+        with self._lock:
+            if relative_path in self._paths or os.path.exists(fullpath):
+                os.remove(temporary_path)
+            else:
+                os.makedirs(os.path.dirname(fullpath), exist_ok=True)
+                os.replace(temporary_path, fullpath)
+            self._record(url, digest, relative_path)
+        return fullpath
+
+    def record(self, url: str, digest: str, extension: str) -> str:
+        """
+        Records in the manifest a URL whose content is already stored.
+
+        Args:
+            url (str): The URL of the file.
+            digest (str): The hexadecimal SHA-256 of the content.
+            extension (str): The extension of the file.
+
+        Returns:
+            str: The path of the stored file.
+        """
+        relative_path = self.relative_path(digest, extension)
+        with self._lock:
+            self._record(url, digest, relative_path)
+        return os.path.join(self.directory, relative_path)
+
+    def _record(self, url: str, digest: str, relative_path: str) -> None:
+        """Adds a URL to the manifest. The caller holds the lock."""
+        self._paths.add(relative_path)
+        if self.urls.get(url) == digest:
+            return
+        self.urls[url] = digest
+        record = {"url": url, "sha256": digest, "path": relative_path}
+        try:
+            self._manifest.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logging.error("Could not write the manifest: %s", str(e))
+
+    def close(self) -> None:
+        """Closes the manifest."""
+        with self._lock:
+            self._manifest.close()
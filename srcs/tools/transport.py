@@ -0,0 +1,365 @@
+"""
+HTTP Transport Module
+
+This module is the single place where the spider sends HTTP requests. Every
+page and file is fetched through `get`, which mirrors `requests.get` and adds
+the optional layers configured for the crawl. Requests are sent through a
+session shared by the threads of the process, which keeps the connections to
+each host open and caches the addresses of the hosts, see `make_session`.
+
+Functions:
+    configure(cache: str, rate: float, per_host: int, robots: bool, retries: int, hedge: bool,
+              pool_hosts: int, pool_size: int, dns_ttl: float, http2: str) -> None:
+        Configures every layer at once from plain options, such as in the
+        worker processes of a crawl.
+
+    configure_connections(pool_hosts: int, pool_size: int, dns_ttl: float, http2: str) -> None:
+        Replaces the session with one keeping other numbers of connections
+        open, caching addresses for another time or sending requests over HTTP/2.
+
+    configure_cache(directory: str) -> None:
+        Enables the on-disk HTTP cache, or disables it if directory is None.
+
+    configure_rate_limit(limiter: RateLimiter) -> None:
+        Enables the per-host rate limiting, or disables it if limiter is None.
+
+    configure_retries(policy: RetryPolicy) -> None:
+        Enables the retries, adaptive timeouts and hedging, or disables them
+        if policy is None.
+
+    get(url: str, **kwargs) -> requests.Response:
+        Sends a GET request, revalidating cached responses, waiting for the
+        rate limit of the host and retrying transient failures.
+
+    iter_content(response: requests.Response, chunk_size: int):
+        Iterates over a streamed body, caching it as it is read.
+
+    cached_since(url: str) -> float:
+        Returns when the cached copy of a URL was stored.
+
+    store_download(url: str, response: requests.Response, path: str, digest: str) -> None:
+        Records a downloaded file in the cache.
+
+    is_saved_copy_current(response: requests.Response, directory: str) -> bool:
+        Checks whether a cached file is still saved unmodified in a directory.
+"""
+
+import os
+import time
+from urllib.parse import urlsplit
+import requests
+from tools import metrics
+from tools.cache import HTTPCache
+from tools.connections import DNS_TTL, POOL_HOSTS, POOL_SIZE, make_session
+from tools.ratelimit import RateLimiter, THROTTLE_CODES
+from tools.retry import RetryPolicy, RETRY_CODES, SERVER_ERROR_CODES
+
+# The timeout of a request in seconds, until the latency of its host is known
+DEFAULT_TIMEOUT = 5
+
+# The number of times a throttled request is sent again once the host allows it
+THROTTLE_RETRIES = 3
+
+_cache = None
+_limiter = None
+_retry = None
+_session = make_session()
+
+
+def configure(  # pylint: disable=too-many-arguments
+    cache: str = None,
+    rate: float = None,
+    per_host: int = 1,
+    robots: bool = True,
+    retries: int = 0,
+    hedge: bool = False,
+    pool_hosts: int = POOL_HOSTS,
+    pool_size: int = None,
+    dns_ttl: float = DNS_TTL,
+    http2: str = None,
+) -> None:
+    """
+    Configures the connections, the cache, the rate limiting and the retries
+    from plain options, which can be sent to another process.
+
+    Parameters:
+        cache (str): The directory of the cache, None to disable it.
+        rate (float): The maximum number of requests per second to a host.
+        per_host (int): The maximum number of requests in flight to a host.
+        robots (bool): Whether robots.txt is honored.
+        retries (int): The number of retries of a failed request.
+        hedge (bool): Whether slow requests are hedged.
+        pool_hosts (int): The number of hosts whose connections are kept open.
+        pool_size (int): The number of connections kept open per host, by
+            default `POOL_SIZE` or `per_host` if higher.
+        dns_ttl (float): The number of seconds the addresses of a host are
+            cached, 0 to resolve them on every connection.
+        http2 (str): The HTTP/2 mode, see `tools.http2`. HTTP/1.1 is used
+            if None.
+
+    Raises:
+        OSError: If the directory of the cache cannot be created.
+        ImportError: If HTTP/2 is requested without the packages it needs.
+    """
+    if pool_size is None:
+        pool_size = max(POOL_SIZE, per_host or 0)
+    configure_connections(pool_hosts, pool_size, dns_ttl, http2)
+    configure_rate_limit(
+        RateLimiter(rate=rate, concurrency=per_host, robots=robots, session=_session)
+    )
+    configure_retries(
+        RetryPolicy(retries=retries, hedge=hedge) if retries > 0 or hedge else None
+    )
+    configure_cache(cache)
+
+
+def configure_connections(
+    pool_hosts: int = POOL_HOSTS,
+    pool_size: int = POOL_SIZE,
+    dns_ttl: float = DNS_TTL,
+    http2: str = None,
+) -> None:
+    """
+    Replaces the session sending the requests, closing the connections of
+    the previous one.
+
+    Parameters:
+        pool_hosts (int): The number of hosts whose connections are kept open.
+        pool_size (int): The number of connections kept open per host.
+        dns_ttl (float): The number of seconds the addresses of a host are
+            cached, 0 to resolve them on every connection.
+        http2 (str): The HTTP/2 mode, see `tools.http2`. HTTP/1.1 is used
+            if None.
+
+    Raises:
+        ImportError: If HTTP/2 is requested without the packages it needs.
+    """
+    global _session  # pylint: disable=global-statement
+    previous = _session
+    _session = make_session(pool_hosts, pool_size, dns_ttl, http2)
+    previous.close()
+
+
+def configure_cache(directory: str) -> None:
+    """
+    Enables the on-disk HTTP cache.
+
+    Parameters:
+        directory (str): The directory of the cache. The cache is disabled if None.
+    """
+    global _cache  # pylint: disable=global-statement
+    _cache = HTTPCache(directory) if directory else None
+
+
+def configure_rate_limit(limiter: RateLimiter) -> None:
+    """
+    Enables the per-host rate limiting.
+
+    Parameters:
+        limiter (RateLimiter): The limiter of the crawl. The rate limiting is
+            disabled if None.
+    """
+    global _limiter  # pylint: disable=global-statement
+    _limiter = limiter
+
+
+def configure_retries(policy: RetryPolicy) -> None:
+    """
+    Enables the retries, adaptive timeouts and hedging of the requests.
+
+    Parameters:
+        policy (RetryPolicy): The retry policy of the crawl. Failed requests
+            are not retried if None.
+    """
+    global _retry  # pylint: disable=global-statement
+    if _retry is not None and _retry is not policy:
+        _retry.close()
+    _retry = policy
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """
+    Sends a GET request. When the cache is enabled, the validators of the
+    cached response are sent along, and a `304 Not Modified` is answered with
+    the cached response, flagged with a `from_cache` attribute.
+
+    When the rate limiting is enabled, the request waits for its host to be
+    available, and a throttled request is sent again once the host allows it,
+    up to `THROTTLE_RETRIES` times.
+
+    When the retries are enabled, the timeout is adapted to the latency of
+    the host, a request failing with a connection error, a timeout or a
+    server error is sent again after a backoff, and a slow request may be
+    hedged with a second one, see `RetryPolicy`.
+
+    Parameters:
+        url (str): The URL to fetch.
+        **kwargs: The arguments of `requests.get`.
+
+    Returns:
+        requests.Response: The response.
+
+    Raises:
+        DisallowedByRobots: If the robots.txt of the host disallows the URL.
+    """
+    if _retry is None:
+        return _get_limited(url, **kwargs)
+
+    def send(timeout):
+        return _get_limited(url, **{**kwargs, "timeout": timeout})
+
+    # Throttled requests are already sent again by the rate limiting
+    retry_codes = RETRY_CODES if _limiter is None else SERVER_ERROR_CODES
+    return _retry.send(url, send, kwargs.get("timeout"), retry_codes)
+
+
+def _get_limited(url: str, **kwargs) -> requests.Response:
+    """Sends a GET request once the host is available."""
+    if _limiter is None:
+        return _send(url, **kwargs)
+
+    for attempt in range(THROTTLE_RETRIES + 1):
+        with _limiter.slot(url) as observe:
+            response = _send(url, **kwargs)
+            observe(response)
+        if response.status_code not in THROTTLE_CODES or attempt == THROTTLE_RETRIES:
+            break
+        response.close()
+    return response
+
+
+def _send(url: str, **kwargs) -> requests.Response:
+    """Sends a GET request through the cache."""
+    if _cache is None:
+        return _request(url, **kwargs)
+
+    entry = _cache.lookup(url)
+    if entry:
+        kwargs["headers"] = {
+            **kwargs.get("headers", {}),
+            **_cache.conditional_headers(entry),
+        }
+
+    response = _request(url, **kwargs)
+    if response.status_code == 304 and entry:
+        response.close()
+        return _cache.response(url, entry, stream=kwargs.get("stream", False))
+
+    # A redirected response is stored under the requested URL, looked up next time
+    response.cache_url = url
+    # Streamed bodies are cached by the caller once saved, see store_download
+    if not kwargs.get("stream") and _cache.is_cacheable(response):
+        _cache.store(url, response, body=response.content)
+    return response
+
+
+def _request(url: str, **kwargs) -> requests.Response:
+    """Sends a GET request, recording its latency, status or error."""
+    start = time.perf_counter()
+    try:
+        response = _session.get(url, **kwargs)
+    except Exception as error:
+        metrics.increment("errors", label=type(error).__name__)
+        raise
+    parts = urlsplit(url)
+    host = f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+    metrics.observe("fetch_seconds", time.perf_counter() - start, host)
+    metrics.increment("responses", label=str(response.status_code))
+    if response.status_code >= 400:
+        metrics.increment("errors", label=f"HTTP {response.status_code // 100}xx")
+    return response
+
+
+def iter_content(response: requests.Response, chunk_size: int):
+    """
+    Iterates over the body of a streamed response. When the cache is enabled,
+    the body is stored in the cache as it is read, so that a streamed page is
+    revalidated on the next crawl like a buffered one.
+
+    Parameters:
+        response (requests.Response): A response returned by `get` with `stream=True`.
+        chunk_size (int): The size of the chunks to read.
+
+    Yields:
+        bytes: The chunks of the body.
+    """
+    chunks = response.iter_content(chunk_size=chunk_size)
+    if not getattr(response, "from_cache", False):
+        chunks = _count_bytes(chunks)
+    if (
+        _cache is None
+        or getattr(response, "from_cache", False)
+        or not _cache.is_cacheable(response)
+    ):
+        yield from chunks
+    else:
+        url = getattr(response, "cache_url", response.url)
+        yield from _cache.store_stream(url, response, chunks)
+
+
+def _count_bytes(chunks):
+    """Counts the bytes of the chunks received from the network."""
+    for chunk in chunks:
+        metrics.increment("bytes", len(chunk))
+        yield chunk
+
+
+def cached_since(url: str) -> float:
+    """
+    Returns when the cached copy of a URL was stored, so that a page known to
+    be older can be skipped.
+
+    Parameters:
+        url (str): The URL.
+
+    Returns:
+        float: The POSIX timestamp, or None if the URL is not cached or the
+            cache is disabled.
+    """
+    if _cache is None:
+        return None
+    return _cache.stored_at(url)
+
+
+def store_download(
+    url: str, response: requests.Response, path: str, digest: str = None
+) -> None:
+    """
+    Records a streamed response saved to a file in the cache.
+
+    Parameters:
+        url (str): The URL of the file.
+        response (requests.Response): The response the file was streamed from.
+        path (str): The path where the file was saved.
+        digest (str): The SHA-256 of the file.
+    """
+    if _cache is not None and _cache.is_cacheable(response):
+        _cache.store(url, response, path=path, digest=digest)
+
+
+def is_saved_copy_current(response: requests.Response, directory: str) -> bool:
+    """
+    Checks whether a response served from the cache was already saved in a
+    directory by a previous run and was not modified since, its size and
+    modification time being those recorded in the cache, in which case there
+    is nothing to write.
+
+    Parameters:
+        response (requests.Response): The response returned by `get`.
+        directory (str): The directory where the file would be saved.
+
+    Returns:
+        bool: True if the saved copy is current.
+    """
+    entry = getattr(response, "cache_entry", None)
+    if _cache is None or not entry or not entry.get("path"):
+        return False
+
+    path = entry["path"]
+    if os.path.dirname(os.path.abspath(path)) != os.path.abspath(directory):
+        return False
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return entry.get("saved") == [stat.st_size, stat.st_mtime_ns]
@@ -1,23 +1,180 @@
 """
 This module provides utility functions for working with URLs.
 
+URLs are parsed once into canonical `URL` objects, kept in a bounded cache
+shared by the whole crawl, so the same string is never parsed twice while it
+is still used. The canonical form lowercases the scheme and host, drops the
+default port, removes the dot segments of the path and normalizes its
+percent-encoding, so that equivalent URLs have the same `key`.
+
+Classes:
+    URL:
+        A parsed and canonicalized URL.
+
 Functions:
+    parse_url(url: str) -> URL:
+        Parses a URL into its canonical form, memoized.
+
+    normalize_url(url: str) -> str:
+        Returns the canonical key of a URL, used to deduplicate pages.
+
     clean_url(base_url: str, url: str) -> str:
-        Cleans the given URL by removing any query parameters while preserving
-        scheme, netloc, and path. Converts relative URLs to absolute URLs using
+        Cleans the given URL by removing any parameters, query and fragment
+        while preserving scheme, netloc, and path. Converts relative URLs to absolute URLs using
         the base URL.
 
     url_in_scope(url: str, base_url: str, depth: int) -> bool:
         Check if the given URL is within the scope of the base URL based on depth.
 """
 
-from urllib.parse import urlparse, urljoin
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit, urljoin
+
+# The number of parsed URLs kept in memory
+PARSE_CACHE_SIZE = 65536
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+_PERCENT_ENCODED = re.compile(r"%([0-9A-Fa-f]{2})")
+
+_UNRESERVED = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~"
+)
+
 
+def _normalize_percent_encoding(value: str) -> str:
+    """Decodes the unreserved characters and uppercases the other escapes."""
+    if "%" not in value:
+        return value
 
+    def replace(match):
+        character = chr(int(match.group(1), 16))
+        if character in _UNRESERVED:
+            return character
+        return "%" + match.group(1).upper()
+
+    return _PERCENT_ENCODED.sub(replace, value)
+
+
+def _remove_dot_segments(path: str) -> str:
+    """Resolves the "." and ".." segments of a path."""
+    if "." not in path:
+        return path
+    segments = path.split("/")
+    output = []
+    for segment in segments:
+        if segment == "..":
+            # The leading empty segment of an absolute path is the root
+            if len(output) > 1:
+                output.pop()
+        elif segment != ".":
+            output.append(segment)
+    if segments[-1] in (".", ".."):
+        output.append("")
+    return "/".join(output)
+
+
+class URL:
+    """
+    A parsed and canonicalized URL. Instances are shared through the parse
+    cache and must not be modified.
+
+    Attributes:
+        scheme (str): The lowercase scheme.
+        host (str): The lowercase host name, empty for relative URLs.
+        port (int): The port, or None for the default port of the scheme.
+        path (str): The path, "/" for the root of absolute URLs.
+        query (str): The query, without the "?".
+        url (str): The canonical URL, without fragment.
+        key (str): The canonical URL without trailing slash, identifying the
+            page in visited and scheduled sets.
+    """
+
+    __slots__ = ("scheme", "host", "port", "path", "query", "url", "key")
+
+    def __init__(self, url: str):
+        parts = urlsplit(url.strip())
+        self.scheme = parts.scheme.lower()
+        self.host = (parts.hostname or "").rstrip(".")
+        try:
+            port = parts.port
+        except ValueError:
+            port = None
+        self.port = None if port == DEFAULT_PORTS.get(self.scheme) else port
+
+        path = _remove_dot_segments(_normalize_percent_encoding(parts.path))
+        if self.host and not path:
+            path = "/"
+        self.path = path
+        self.query = _normalize_percent_encoding(parts.query)
+
+        netloc = f"[{self.host}]" if ":" in self.host else self.host
+        if parts.username is not None:
+            netloc = parts.netloc.rpartition("@")[0] + "@" + netloc
+        if self.port is not None:
+            netloc += f":{self.port}"
+        prefix = f"{self.scheme}:" if self.scheme else ""
+        if netloc or self.scheme in DEFAULT_PORTS:
+            prefix += f"//{netloc}"
+        query = f"?{self.query}" if self.query else ""
+
+        self.url = prefix + path + query
+        self.key = prefix + (path.rstrip("/") if self.host else path) + query
+
+    @property
+    def depth(self) -> int:
+        """The number of segments of the path."""
+        return self.path.rstrip("/").count("/")
+
+    def __str__(self) -> str:
+        return self.url
+
+    def __repr__(self) -> str:
+        return f"URL({self.url!r})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, URL) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_url(url: str) -> URL:
+    """
+    Parses a URL into its canonical form. The result is cached, so parsing a
+    URL seen before is a dictionary lookup.
+
+    Parameters:
+        url (str): The URL to parse.
+
+    Returns:
+        URL: The canonical URL.
+    """
+    return URL(url)
+
+
+def normalize_url(url: str) -> str:
+    """
+    Returns the key identifying a page: two URLs with the same key are the
+    same page, whatever their host case, default port, percent-encoding, dot
+    segments, fragment or trailing slash.
+
+    Parameters:
+        url (str): The URL to normalize.
+
+    Returns:
+        str: The canonical URL without fragment nor trailing slash.
+    """
+    return parse_url(url).key
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def clean_url(base_url: str, url: str) -> str:
     """
-    Cleans the given URL by removing any query parameters while preserving
-    scheme, netloc and path.
+    Cleans the given URL by removing any parameters, query and fragment while
+    preserving scheme, netloc and path, in their canonical form.
     Converts relative URLs to absolute URLs using the base URL.
 
     Parameters:
@@ -28,15 +185,11 @@ def clean_url(base_url: str, url: str) -> str:
         str: The cleaned absolute URL.
     """
 
-    # Clean the absolute URL by removing query parameters and trailing
-    # slashes
-    url_parts = urlparse(url)
-
-    if not url_parts.netloc:
-        # If the provided URL is relative, make it absolute using the base URL
-        return urljoin(base_url, url)
-
-    return url_parts.geturl()
+    # Resolve relative URLs, then drop the parameters, query and fragment
+    absolute_url = urljoin(base_url, url.strip())
+    for separator in (";", "?", "#"):
+        absolute_url = absolute_url.split(separator, 1)[0]
+    return parse_url(absolute_url).url
 
 
 def url_in_scope(url: str, base_url: str, depth: int) -> bool:
@@ -53,11 +206,11 @@ def url_in_scope(url: str, base_url: str, depth: int) -> bool:
         bool: True if the URL is within scope; otherwise, false.
     """
 
-    url_path = urlparse(url).path.rstrip("/")
-    base_url_path = urlparse(base_url).path.rstrip("/")
+    parsed_url = parse_url(url)
+    parsed_base_url = parse_url(base_url)
+    url_path = parsed_url.path.rstrip("/")
+    base_url_path = parsed_base_url.path.rstrip("/")
 
-    if urlparse(base_url).hostname == urlparse(url).hostname and url_path.startswith(
-        base_url_path
-    ):
-        return depth >= url_path.count("/") - base_url_path.count("/")
+    if parsed_base_url.host == parsed_url.host and url_path.startswith(base_url_path):
+        return depth >= parsed_url.depth - parsed_base_url.depth
     return False
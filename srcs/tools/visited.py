@@ -0,0 +1,330 @@
+"""
+Visited Set Module
+
+This module provides compact replacements for the sets of URL strings that
+record the pages already seen by a crawl. A Python set of URLs costs well over
+a hundred bytes per URL, several gigabytes for a crawl of millions of pages.
+Both structures below store a hash of the normalized URL instead:
+
+- `FingerprintSet` keeps a 64-bit fingerprint per URL in an open-addressing
+  hash table backed by an `array`, 11 to 23 bytes per URL depending on how
+  full the table is since it last doubled. Two URLs are only
+  confused when their fingerprints collide, with a probability around
+  n / 2**64 per lookup.
+
+- `ScalableBloomFilter` keeps a few bits per URL, about 1.2 bytes per URL
+  for a 1% false-positive rate once its filters are full, and grows by adding filters with tighter
+  error rates so that its overall error rate holds however many URLs are
+  added.
+
+A false positive makes the crawl skip a page it has not visited, so the
+structure is chosen from the false-positive rate the crawl accepts, see
+`make_visited_set`.
+
+The module includes the following:
+
+1. `url_hash`: Hashes a URL into 128 bits.
+
+2. `FingerprintSet`: The array-backed set of 64-bit fingerprints.
+
+3. `BloomFilter`: A fixed-capacity Bloom filter.
+
+4. `ScalableBloomFilter`: A Bloom filter growing with the number of URLs.
+
+5. `make_visited_set`: Creates the visited set of a crawl.
+"""
+
+import math
+import hashlib
+import threading
+from array import array
+
+# Below this false-positive rate, 64-bit fingerprints use less memory than
+# the number of bits per URL a Bloom filter would need
+FINGERPRINT_RATE = 1e-6
+
+# The maximum ratio of used slots in the fingerprint table
+MAX_LOAD = 0.7
+
+
+def url_hash(url: str) -> int:
+    """
+    Hashes a URL into 128 bits.
+
+    Args:
+        url (str): The URL, normalized by the caller.
+
+    Returns:
+        int: The 128-bit hash.
+    """
+    return int.from_bytes(hashlib.blake2b(url.encode(), digest_size=16).digest(), "big")
+
+
+class FingerprintSet:
+    """
+    A set of URLs storing a 64-bit fingerprint per URL in an open-addressing
+    hash table with linear probing.
+
+    Attributes:
+        capacity (int): The number of slots of the table, a power of two.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = 1 << max(capacity - 1, 1).bit_length()
+        self._table = array("Q", bytes(8 * self.capacity))
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _fingerprint(url: str) -> int:
+        """Returns the fingerprint of a URL, never 0 as 0 marks empty slots."""
+        return (url_hash(url) >> 64) or 1
+
+    def _slot(self, fingerprint: int) -> int:
+        """Returns the slot holding a fingerprint, or the empty slot for it."""
+        mask = self.capacity - 1
+        index = fingerprint & mask
+        table = self._table
+        while table[index] and table[index] != fingerprint:
+            index = (index + 1) & mask
+        return index
+
+    def _grow(self) -> None:
+        """Doubles the number of slots."""
+        old_table = self._table
+        self.capacity *= 2
+        self._table = array("Q", bytes(8 * self.capacity))
+        for fingerprint in old_table:
+            if fingerprint:
+                self._table[self._slot(fingerprint)] = fingerprint
+
+    def add(self, url: str) -> None:
+        """
+        Adds a URL.
+
+        Args:
+            url (str): The URL to add.
+        """
+        fingerprint = self._fingerprint(url)
+        with self._lock:
+            index = self._slot(fingerprint)
+            if self._table[index]:
+                return
+            self._table[index] = fingerprint
+            self._size += 1
+            if self._size > MAX_LOAD * self.capacity:
+                self._grow()
+
+    def update(self, urls) -> None:
+        """
+        Adds several URLs.
+
+        Args:
+            urls (iterable): The URLs to add.
+        """
+        for url in urls:
+            self.add(url)
+
+    def __contains__(self, url: str) -> bool:
+        fingerprint = self._fingerprint(url)
+        with self._lock:
+            return self._table[self._slot(fingerprint)] == fingerprint
+
+    def memory_size(self) -> int:
+        """
+        Returns the number of bytes used by the table.
+
+        Returns:
+            int: The size of the table in bytes.
+        """
+        return self._table.itemsize * len(self._table)
+
+
+def _check_rate(error_rate: float) -> None:
+    """Raises a ValueError unless a false-positive rate is between 0 and 1."""
+    if not 0 < error_rate < 1:
+        raise ValueError(
+            f"The false-positive rate must be between 0 and 1: {error_rate}"
+        )
+
+
+class BloomFilter:
+    """
+    A Bloom filter holding up to `capacity` URLs with a false-positive rate
+    of `error_rate`. The bit positions are derived from a single 128-bit hash
+    by double hashing.
+
+    Attributes:
+        capacity (int): The number of URLs the filter is sized for.
+        error_rate (float): The false-positive rate at full capacity.
+        bit_count (int): The number of bits of the filter.
+        hash_count (int): The number of bits set per URL.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        _check_rate(error_rate)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bit_count = max(
+            int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)), 8
+        )
+        self.hash_count = max(int(round(self.bit_count / capacity * math.log(2))), 1)
+        self.count = 0
+        self._bits = bytearray((self.bit_count + 7) // 8)
+
+    def _positions(self, url_digest: int):
+        """Yields the bit positions of a URL hash."""
+        first, second = url_digest >> 64, (url_digest & (2**64 - 1)) | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.bit_count
+
+    def add(self, url_digest: int) -> bool:
+        """
+        Adds a URL hash.
+
+        Args:
+            url_digest (int): The hash of the URL, from `url_hash`.
+
+        Returns:
+            bool: True if the hash was not in the filter yet.
+        """
+        added = False
+        bits = self._bits
+        for position in self._positions(url_digest):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def contains(self, url_digest: int) -> bool:
+        """
+        Checks whether a URL hash may be in the filter.
+
+        Args:
+            url_digest (int): The hash of the URL, from `url_hash`.
+
+        Returns:
+            bool: False if the hash was never added.
+        """
+        bits = self._bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(url_digest)
+        )
+
+    def memory_size(self) -> int:
+        """
+        Returns the number of bytes used by the bits.
+
+        Returns:
+            int: The size of the filter in bytes.
+        """
+        return len(self._bits)
+
+
+class ScalableBloomFilter:
+    """
+    A Bloom filter growing with the number of URLs. When a filter is full, a
+    filter twice as large with half its error rate is added, so the overall
+    false-positive rate stays below `error_rate`.
+
+    Attributes:
+        error_rate (float): The overall false-positive rate.
+        initial_capacity (int): The capacity of the first filter.
+    """
+
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(self, error_rate: float = 0.001, initial_capacity: int = 1 << 16):
+        _check_rate(error_rate)
+        self.error_rate = error_rate
+        self.initial_capacity = initial_capacity
+        self._filters = []
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, url: str) -> None:
+        """
+        Adds a URL.
+
+        Args:
+            url (str): The URL to add.
+        """
+        url_digest = url_hash(url)
+        with self._lock:
+            # The last filter holds most of the URLs
+            if any(bloom.contains(url_digest) for bloom in reversed(self._filters)):
+                return
+            if (
+                not self._filters
+                or self._filters[-1].count >= self._filters[-1].capacity
+            ):
+                # The error rates of the filters sum up to at most error_rate
+                index = len(self._filters)
+                self._filters.append(
+                    BloomFilter(
+                        self.initial_capacity * self.GROWTH**index,
+                        self.error_rate
+                        * (1 - self.TIGHTENING)
+                        * self.TIGHTENING**index,
+                    )
+                )
+            if self._filters[-1].add(url_digest):
+                self._size += 1
+
+    def update(self, urls) -> None:
+        """
+        Adds several URLs.
+
+        Args:
+            urls (iterable): The URLs to add.
+        """
+        for url in urls:
+            self.add(url)
+
+    def __contains__(self, url: str) -> bool:
+        url_digest = url_hash(url)
+        with self._lock:
+            return any(bloom.contains(url_digest) for bloom in reversed(self._filters))
+
+    def memory_size(self) -> int:
+        """
+        Returns the number of bytes used by the filters.
+
+        Returns:
+            int: The size of the filters in bytes.
+        """
+        return sum(bloom.memory_size() for bloom in self._filters)
+
+
+def make_visited_set(false_positive_rate: float = None):
+    """
+    Creates the structure recording the URLs seen by a crawl.
+
+    Args:
+        false_positive_rate (float): The rate of unseen URLs the crawl accepts
+            to skip. A Python set is used if None, 64-bit fingerprints below
+            `FINGERPRINT_RATE`, and a scalable Bloom filter otherwise.
+
+    Returns:
+        set: An object supporting `add`, `update`, `in` and `len`.
+
+    Raises:
+        ValueError: If the rate is not between 0 and 1.
+    """
+    if false_positive_rate is None:
+        return set()
+    _check_rate(false_positive_rate)
+    if false_positive_rate < FINGERPRINT_RATE:
+        return FingerprintSet()
+    return ScalableBloomFilter(false_positive_rate)
@@ -0,0 +1,295 @@
+"""
+Crawl Workers Module
+
+This module runs the workers of a crawl shared through a `WorkQueue`. A
+worker claims pages and files from the queue, fetches and parses the pages or
+downloads the files, and queues back the pages and files it finds. Any number
+of workers may crawl together, in processes started on this host by
+`run_workers` or by running the spider against the same queue file on other
+hosts sharing it. A crawl started again with the same queue resumes it.
+
+The module includes the following:
+
+1. `WorkerResult`: The work done by a worker.
+
+2. `run_worker`: Runs a worker in this process until the crawl is done.
+
+3. `run_workers`: Runs several workers in processes of this host.
+"""
+
+import os
+import logging
+import collections
+import multiprocessing
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from tools import metrics, transport
+from tools.download import FileResult, fetch_file
+from tools.filters import FileFilter
+from tools.matcher import FileMatcher
+from tools.scrape import PageResult, fetch_page, parse_page
+from tools.workqueue import PAGE, WorkQueue
+
+# The number of seconds an idle worker waits before claiming work again
+POLL_INTERVAL = 0.2
+
+# The smallest number of URLs a worker claims at once for its threads
+CLAIM_BATCH = 8
+
+
+@dataclass
+class WorkerResult:
+    """
+    The work done by one or several workers.
+
+    Attributes:
+        pages (int): The number of pages fetched.
+        files (int): The number of files found on these pages.
+        downloaded (int): The number of files successfully downloaded.
+        requests (int): The number of HTTP requests made for the pages.
+        skipped (int): The number of files rejected by the filter.
+    """
+
+    pages: int = 0
+    files: int = 0
+    downloaded: int = 0
+    requests: int = 0
+    skipped: int = 0
+
+    def add(self, other: "WorkerResult") -> None:
+        """Adds the work done by another worker."""
+        self.pages += other.pages
+        self.files += other.files
+        self.downloaded += other.downloaded
+        self.requests += other.requests
+        self.skipped += other.skipped
+
+
+class _Worker:  # pylint: disable=too-few-public-methods
+    """The state shared by the threads of a worker."""
+
+    def __init__(self, work_queue, depth, extensions, options):
+        self.queue = work_queue
+        self.depth = depth
+        # The extensions are compiled once for the whole crawl
+        self.extensions = FileMatcher.of(extensions)
+        self.directory = options["directory"]
+        self.max_size = options.get("max_size")
+        self.file_filter = options.get("file_filter")
+        self.max_hops = options.get("max_hops")
+        self.lock = threading.Lock()
+        self.result = WorkerResult()
+        # The work claimed at once for all the threads, one batch at a time
+        self.batch_size = options.get("batch_size", 1)
+        self.claimed = collections.deque()
+        self.claim_lock = threading.Lock()
+
+    def next_work(self) -> tuple:
+        """Returns the next claimed URL, claiming a batch when none is left."""
+        with self.claim_lock:
+            if not self.claimed:
+                self.claimed.extend(self.queue.claim(self.batch_size))
+            return self.claimed.popleft() if self.claimed else None
+
+    def crawl_page(self, webpage: str, hops: int, base_url: str) -> None:
+        """Fetches and parses a page and queues the pages and files it references."""
+        try:
+            page = fetch_page(webpage, base_url, self.depth)
+            parse_page(page, base_url, self.depth, self.extensions)
+        except Exception:  # pylint: disable=broad-except
+            # The page is done anyway, a failing page would be claimed forever
+            logging.exception("Could not fetch URL: %s", webpage)
+            page = PageResult(webpage)
+
+        # Only the base URL is visited without recursion
+        links = page.links
+        if self.depth == 0 or (self.max_hops is not None and hops >= self.max_hops):
+            links = ()
+        self.queue.complete(webpage, links, page.files, hops + 1, base_url)
+        with self.lock:
+            self.result.pages += 1
+            self.result.files += len(page.files)
+            self.result.requests += page.requests
+
+    def download(self, file: str) -> None:
+        """Downloads a file."""
+        try:
+            result = fetch_file(
+                self.directory, file, self.max_size, file_filter=self.file_filter
+            )
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("Could not download URL: %s", file)
+            result = FileResult(file)
+        self.queue.complete(file)
+        with self.lock:
+            if result.saved:
+                self.result.downloaded += 1
+            if result.skipped is not None:
+                self.result.skipped += 1
+
+
+def _work(worker: _Worker) -> None:
+    """Claims and processes work until nothing is left in the queue."""
+    while True:
+        work = worker.next_work()
+        if work is None:
+            # Other workers may still find pages, or crash and leave some
+            if worker.queue.remaining() == 0:
+                return
+            time.sleep(POLL_INTERVAL)
+            continue
+        url, kind, hops, base_url = work
+        if kind == PAGE:
+            worker.crawl_page(url, hops, base_url)
+        else:
+            worker.download(url)
+
+
+def _renew(work_queue: WorkQueue, done: threading.Event) -> None:
+    """Renews the leases of a worker until it is done."""
+    # Several renewals fit in a lease, so that a late one does not lose it
+    while not done.wait(work_queue.lease / 3):
+        try:
+            work_queue.renew()
+        except sqlite3.Error:
+            logging.exception("Could not renew the leases of %s", work_queue.worker)
+
+
+def run_worker(  # pylint: disable=too-many-arguments
+    path: str,
+    depth: int,
+    extensions: list,
+    directory: str,
+    concurrency: int = 1,
+    lease: float = 60.0,
+    max_size: int = None,
+    max_hops: int = None,
+    file_filter: FileFilter = None,
+) -> WorkerResult:
+    """
+    Crawls the pages and downloads the files of a shared queue, in this
+    process, until no work is left in the queue.
+
+    Args:
+        path (str): The path of the `WorkQueue` database.
+        depth (int): The maximum depth of nested pages to retrieve.
+        extensions (list): A list of file extensions to scrape.
+        directory (str): The directory where the files are downloaded.
+        concurrency (int): The number of pages and files fetched at once.
+        lease (float): The number of seconds after which the work claimed by
+            a worker is handed out again if the worker stopped renewing it.
+        max_size (int): The maximum size in bytes of a downloaded file.
+        max_hops (int): The maximum number of links followed from the base
+            URL. No limit if None.
+        file_filter (FileFilter): The filter the files must pass to be
+            downloaded.
+
+    Returns:
+        WorkerResult: The work done by this worker.
+    """
+    work_queue = WorkQueue(path, lease=lease)
+    options = {
+        "directory": directory,
+        "max_size": max_size,
+        "max_hops": max_hops,
+        "file_filter": file_filter,
+        "batch_size": max(concurrency, CLAIM_BATCH),
+    }
+    worker = _Worker(work_queue, depth, extensions, options)
+    threads = [
+        threading.Thread(target=_work, args=(worker,), daemon=True)
+        for _ in range(concurrency)
+    ]
+    # Pages and files taking longer than the lease keep being leased
+    done = threading.Event()
+    heartbeat = threading.Thread(target=_renew, args=(work_queue, done), daemon=True)
+    metrics.gauge("queue_depth", work_queue.remaining, "shared")
+    try:
+        heartbeat.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        done.set()
+        heartbeat.join()
+        metrics.remove_gauge("queue_depth", "shared")
+        work_queue.close()
+    return worker.result
+
+
+def _run_configured(transport_options: dict, stats: tuple, *args) -> WorkerResult:
+    """
+    Configures the transport and the metrics of a worker process and runs the
+    worker. Each process saves its metrics to its own files.
+    """
+    transport.configure(**transport_options)
+    if stats is None:
+        return run_worker(*args)
+
+    path, interval = stats
+    root, extension = os.path.splitext(path)
+    collector = metrics.Metrics()
+    metrics.configure(collector)
+    with metrics.StatsWriter(collector, f"{root}.{os.getpid()}{extension}", interval):
+        return run_worker(*args)
+
+
+def run_workers(  # pylint: disable=too-many-arguments
+    count: int,
+    path: str,
+    depth: int,
+    extensions: list,
+    directory: str,
+    concurrency: int = 1,
+    lease: float = 60.0,
+    max_size: int = None,
+    max_hops: int = None,
+    file_filter: FileFilter = None,
+    transport_options: dict = None,
+    stats: tuple = None,
+) -> WorkerResult:
+    """
+    Runs workers in processes of this host, see `run_worker`. A single worker
+    runs in this process with its transport and metrics as configured.
+
+    Args:
+        count (int): The number of worker processes.
+        transport_options (dict): The arguments of `transport.configure` in
+            each worker process.
+        stats (tuple): The path and the interval of the metrics saved by
+            each worker process, whose process ID is added to the path, such
+            as "stats.1234.json". No metrics are saved if None.
+        The other arguments are those of `run_worker`.
+
+    Returns:
+        WorkerResult: The work done by all the workers.
+    """
+    args = (
+        path,
+        depth,
+        extensions,
+        directory,
+        concurrency,
+        lease,
+        max_size,
+        max_hops,
+        file_filter,
+    )
+    if count == 1:
+        return run_worker(*args)
+
+    result = WorkerResult()
+    with ProcessPoolExecutor(
+        max_workers=count, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = [
+            executor.submit(_run_configured, transport_options or {}, stats, *args)
+            for _ in range(count)
+        ]
+        for future in futures:
+            result.add(future.result())
+    return result
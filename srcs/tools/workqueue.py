@@ -0,0 +1,376 @@
+"""
+Work Queue Module
+
+This module lets several spider workers, in one or several processes and on
+one or several machines sharing a file system, crawl together through a
+SQLite database. The database is both the shared queue of the pages and files
+to fetch and the store deduplicating them: a URL is queued once, whichever
+worker finds it.
+
+URLs are sharded by a hash of their host. A worker only takes URLs from the
+shards it leases, and a shard is leased by one worker at a time, so each host
+is fetched by a single worker, which keeps its rate limit and robots.txt
+rules. Idle workers lease the shards that have work and no live owner, and a
+worker holding more than its share of the shards gives back those it is not
+working on, so the hosts spread over the workers.
+
+Claimed URLs are leased too. A worker renews its leases each time it claims
+more work, and periodically while it works on long transfers; when it
+crashes, its leases expire and its shards and URLs are handed out again to
+the other workers.
+
+The number of URLs left in each shard is kept up to date by triggers, so
+that neither claiming nor rebalancing scans the queue, whose size grows with
+the crawl. Workers rebalance their shards when theirs run out of work, when
+workers join or leave, and at least once per lease, not on every claim.
+
+The module includes the following:
+
+1. `shard_of`: The shard of a URL.
+
+2. `WorkQueue`: The queue shared by the workers.
+"""
+
+import os
+import math
+import time
+import socket
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlsplit
+from tools.url_utils import normalize_url
+
+# The number of shards the hosts are spread over
+SHARDS = 1024
+
+# The kinds of work
+PAGE = 0
+FILE = 1
+
+# The status of a URL
+PENDING = 0
+LEASED = 1
+DONE = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    url TEXT PRIMARY KEY,
+    kind INTEGER NOT NULL,
+    shard INTEGER NOT NULL,
+    hops INTEGER NOT NULL,
+    base_url TEXT NOT NULL,
+    status INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS queue_claim ON queue (shard, status, kind DESC, hops);
+CREATE TABLE IF NOT EXISTS shard_counts (
+    shard INTEGER PRIMARY KEY, remaining INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS queue_added AFTER INSERT ON queue BEGIN
+    INSERT INTO shard_counts (shard, remaining) VALUES (new.shard, 1)
+    ON CONFLICT (shard) DO UPDATE SET remaining = remaining + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS queue_done AFTER UPDATE OF status ON queue
+WHEN new.status = 2 AND old.status != 2 BEGIN
+    UPDATE shard_counts SET remaining = remaining - 1 WHERE shard = new.shard;
+END;
+CREATE TABLE IF NOT EXISTS shards (
+    shard INTEGER PRIMARY KEY, worker TEXT NOT NULL, lease_until REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (name TEXT PRIMARY KEY, seen REAL NOT NULL);
+"""
+
+_ENQUEUE = (
+    "INSERT OR IGNORE INTO queue (url, kind, shard, hops, base_url) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+
+# The work of a shard whose lease expired, handed out again first
+_EXPIRED = (
+    "SELECT url, kind, hops, base_url FROM queue "
+    "WHERE shard = ? AND status = 1 AND lease_until < ? LIMIT ?"
+)
+
+# The pending work of a shard, files first then by hop depth, read in the
+# order of the claim index
+_PENDING = (
+    "SELECT url, kind, hops, base_url FROM queue "
+    "WHERE shard = ? AND status = 0 ORDER BY kind DESC, hops LIMIT ?"
+)
+
+
+def shard_of(url: str) -> int:
+    """
+    Returns the shard of the host of a URL.
+
+    Args:
+        url (str): The URL.
+
+    Returns:
+        int: The shard, between 0 and `SHARDS` - 1.
+    """
+    host = urlsplit(url).netloc.lower()
+    return (
+        int.from_bytes(hashlib.blake2b(host.encode(), digest_size=8).digest(), "big")
+        % SHARDS
+    )
+
+
+class WorkQueue:
+    """
+    The queue of pages and files shared by the workers of a crawl.
+
+    Attributes:
+        path (str): The path of the database.
+        worker (str): The name of this worker, unique among the workers.
+        lease (float): The number of seconds a claim or a shard is leased for.
+    """
+
+    def __init__(self, path: str, worker: str = None, lease: float = 60.0):
+        self.path = path
+        self.worker = worker or f"{socket.gethostname()}-{os.getpid()}-{id(self)}"
+        self.lease = lease
+        self._lock = threading.Lock()
+        # When the shards were last rebalanced, and among how many workers
+        self._rebalanced = (0.0, 0)
+        self._connection = sqlite3.connect(
+            path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def _transaction(self):
+        """Starts a transaction holding the write lock of the database."""
+        self._connection.execute("BEGIN IMMEDIATE")
+        return self._connection
+
+    def seed(self, url: str) -> None:
+        """
+        Queues the base URL of a crawl, unless it was already queued.
+
+        Args:
+            url (str): The base URL, defining the scope of the pages found
+                from it.
+        """
+        url = normalize_url(url)
+        with self._lock:
+            self._connection.execute(_ENQUEUE, (url, PAGE, shard_of(url), 0, url))
+
+    def claim(self, limit: int) -> list:
+        """
+        Claims work for this worker, renewing its leases. When its shards do
+        not have enough work, or when workers joined or left, or at least
+        once per lease, the shards are rebalanced: shards with work and
+        without a live owner are leased up to the fair share of this worker,
+        and the shards beyond it are given back.
+
+        Args:
+            limit (int): The maximum number of URLs to claim.
+
+        Returns:
+            list: The `(url, kind, hops, base_url)` claimed.
+        """
+        with self._lock:
+            now = time.time()
+            until = now + self.lease
+            connection = self._transaction()
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO workers (name, seen) VALUES (?, ?)",
+                    (self.worker, now),
+                )
+                connection.execute(
+                    "UPDATE shards SET lease_until = ? WHERE worker = ?",
+                    (until, self.worker),
+                )
+                claimed = self._claim_held(connection, now, until, limit)
+                live_workers = connection.execute(
+                    "SELECT COUNT(*) FROM workers WHERE seen >= ?", (now - self.lease,)
+                ).fetchone()[0]
+                rebalanced_at, workers = self._rebalanced
+                if (
+                    len(claimed) < limit
+                    or live_workers != workers
+                    or now - rebalanced_at >= self.lease / 3
+                ):
+                    self._rebalance(connection, now, until, live_workers)
+                    self._rebalanced = (now, live_workers)
+                    claimed += self._claim_held(
+                        connection, now, until, limit - len(claimed)
+                    )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def _claim_held(self, connection, now: float, until: float, limit: int) -> list:
+        """Claims the work of the shards leased by this worker."""
+        claimed = []
+        shards = connection.execute(
+            "SELECT shard FROM shards JOIN shard_counts USING (shard) "
+            "WHERE worker = ? AND remaining > 0",
+            (self.worker,),
+        ).fetchall()
+        for (shard,) in shards:
+            if len(claimed) < limit:
+                claimed += connection.execute(
+                    _EXPIRED, (shard, now, limit - len(claimed))
+                ).fetchall()
+            if len(claimed) < limit:
+                claimed += connection.execute(
+                    _PENDING, (shard, limit - len(claimed))
+                ).fetchall()
+        connection.executemany(
+            "UPDATE queue SET status = 1, worker = ?, lease_until = ? WHERE url = ?",
+            ((self.worker, until, url) for url, _, _, _ in claimed),
+        )
+        return claimed
+
+    def renew(self) -> None:
+        """
+        Renews the leases of the shards and of the URLs this worker claimed,
+        so that they are not handed out again while it is still working on
+        them.
+        """
+        with self._lock:
+            now = time.time()
+            until = now + self.lease
+            connection = self._transaction()
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO workers (name, seen) VALUES (?, ?)",
+                    (self.worker, now),
+                )
+                connection.execute(
+                    "UPDATE shards SET lease_until = ? WHERE worker = ?",
+                    (until, self.worker),
+                )
+                # The claimed URLs are in the shards of this worker, which
+                # only gives back shards without work in flight
+                connection.execute(
+                    "UPDATE queue SET lease_until = ? WHERE status = 1 AND worker = ? "
+                    "AND shard IN (SELECT shard FROM shards WHERE worker = ?)",
+                    (until, self.worker, self.worker),
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _rebalance(
+        self, connection, now: float, until: float, live_workers: int
+    ) -> None:
+        """Leases or gives back shards so that this worker holds its share."""
+        # The shards whose hosts are done are given back first
+        connection.execute(
+            "DELETE FROM shards WHERE worker = ? AND shard IN "
+            "(SELECT shard FROM shard_counts WHERE remaining = 0)",
+            (self.worker,),
+        )
+        busy_shards = connection.execute(
+            "SELECT COUNT(*) FROM shard_counts WHERE remaining > 0"
+        ).fetchone()[0]
+        share = max(math.ceil(busy_shards / max(live_workers, 1)), 1)
+        held = [
+            shard
+            for (shard,) in connection.execute(
+                "SELECT shard FROM shards WHERE worker = ?", (self.worker,)
+            )
+        ]
+
+        if len(held) > share:
+            # Gives back the shards where this worker has nothing in flight
+            idle = [
+                shard
+                for shard in held
+                if not connection.execute(
+                    "SELECT 1 FROM queue WHERE shard = ? AND status = 1 "
+                    "AND worker = ? AND lease_until >= ? LIMIT 1",
+                    (shard, self.worker, now),
+                ).fetchone()
+            ]
+            connection.executemany(
+                "DELETE FROM shards WHERE shard = ? AND worker = ?",
+                ((shard, self.worker) for shard in idle[: len(held) - share]),
+            )
+            return
+
+        free_shards = connection.execute(
+            "SELECT shard FROM shard_counts WHERE remaining > 0 AND shard NOT IN "
+            "(SELECT shard FROM shards WHERE lease_until >= ?) LIMIT ?",
+            (now, share - len(held)),
+        ).fetchall()
+        connection.executemany(
+            "INSERT OR REPLACE INTO shards (shard, worker, lease_until) VALUES (?, ?, ?)",
+            ((shard, self.worker, until) for (shard,) in free_shards),
+        )
+
+    def complete(
+        self, url: str, links=(), files=(), hops: int = 0, base_url: str = None
+    ) -> None:
+        """
+        Marks a claimed URL as done and queues the pages and files found on it.
+
+        Args:
+            url (str): The claimed URL.
+            links (iterable): The pages linked from the page.
+            files (iterable): The files referenced by the page.
+            hops (int): The hop depth of the linked pages.
+            base_url (str): The base URL of the crawl of the page.
+        """
+        rows = [(link, PAGE, shard_of(link), hops, base_url) for link in links]
+        rows += [(file, FILE, shard_of(file), hops, base_url) for file in files]
+        with self._lock:
+            connection = self._transaction()
+            try:
+                connection.executemany(_ENQUEUE, rows)
+                connection.execute(
+                    "UPDATE queue SET status = 2 WHERE url = ? AND worker = ?",
+                    (url, self.worker),
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def remaining(self) -> int:
+        """
+        Returns the number of URLs not done yet, claimed or not.
+
+        Returns:
+            int: The number of URLs left.
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COALESCE(SUM(remaining), 0) FROM shard_counts"
+            ).fetchone()[0]
+
+    def counts(self) -> dict:
+        """
+        Returns the number of URLs of each kind and status.
+
+        Returns:
+            dict: The counts keyed by `(kind, status)`.
+        """
+        with self._lock:
+            return {
+                (kind, status): count
+                for kind, status, count in self._connection.execute(
+                    "SELECT kind, status, COUNT(*) FROM queue GROUP BY kind, status"
+                )
+            }
+
+    def close(self) -> None:
+        """Gives back the shards of this worker and closes the database."""
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM shards WHERE worker = ?", (self.worker,)
+            )
+            self._connection.execute(
+                "DELETE FROM workers WHERE name = ?", (self.worker,)
+            )
+            self._connection.close()
@@ -0,0 +1,78 @@
+import os
+from benchmarks.site import serve_site
+from tools import transport
+from tools.pipeline import run_pipeline
+
+
+def test_recrawl_is_served_from_cache(tmp_path):
+    directory = tmp_path / "data"
+    directory.mkdir()
+    counter = {}
+    transport.configure_cache(str(tmp_path / "cache"))
+    try:
+        with serve_site(counter=counter, pages=20, fanout=3) as base_url:
+            first = run_pipeline(base_url, 5, ["png"], str(directory))
+            second = run_pipeline(base_url, 5, ["png"], str(directory))
+    finally:
+        transport.configure_cache(None)
+
+    assert first.downloaded == second.downloaded == 20
+    assert len(second.pages) == len(first.pages)
+    # Every page and image of the second crawl was revalidated
+    assert counter["304"] == 40
+    # Unchanged files are not written again
+    assert len(os.listdir(directory)) == 20
+
+
+def test_cached_file_saved_to_another_directory(tmp_path):
+    transport.configure_cache(str(tmp_path / "cache"))
+    try:
+        with serve_site(pages=3) as base_url:
+            for directory in ("first", "second"):
+                os.mkdir(tmp_path / directory)
+                run_pipeline(base_url, 0, ["png"], str(tmp_path / directory))
+    finally:
+        transport.configure_cache(None)
+
+    assert os.listdir(tmp_path / "second") == ["0.png"]
+    with open(tmp_path / "second" / "0.png", "rb") as file:
+        assert file.read(8) == b"\x89PNG\r\n\x1a\n"
+
+
+def test_redirected_pages_are_revalidated(tmp_path):
+    counter = {}
+    transport.configure_cache(str(tmp_path / "cache"))
+    try:
+        with serve_site(counter=counter, pages=20, fanout=3, redirect_every=3) as url:
+            first = run_pipeline(url, 5, ["png"], str(tmp_path))
+            second = run_pipeline(url, 5, ["png"], str(tmp_path))
+    finally:
+        transport.configure_cache(None)
+
+    assert first.downloaded == second.downloaded == 20
+    # The pages reached through a redirection were revalidated too
+    assert counter["304"] == 40
+
+
+def test_editing_a_saved_file_keeps_the_cached_body(tmp_path):
+    directory = tmp_path / "data"
+    directory.mkdir()
+    transport.configure_cache(str(tmp_path / "cache"))
+    try:
+        with serve_site(pages=1) as base_url:
+            run_pipeline(base_url, 0, ["png"], str(directory))
+            with open(directory / "0.png", "r+b") as file:
+                original = file.read()
+                file.seek(0)
+                file.write(b"edited")
+            cached = transport.get(f"{base_url}/img/0.png")
+            assert cached.from_cache and cached.content == original
+
+            # The edited file is not taken for the cached one and kept
+            run_pipeline(base_url, 0, ["png"], str(directory))
+    finally:
+        transport.configure_cache(None)
+
+    (name,) = set(os.listdir(directory)) - {"0.png"}
+    with open(directory / name, "rb") as file:
+        assert file.read() == original
@@ -0,0 +1,69 @@
+import socket
+from benchmarks.site import serve_site
+from tools import metrics
+from tools.connections import DNSCache, make_session
+
+
+def fake_resolver(monkeypatch, addresses: list, calls: list):
+    """Resolves every host name to the addresses, recording the lookups."""
+
+    def getaddrinfo(host, port, *args):
+        calls.append(host)
+        return [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))
+            for address in addresses
+        ]
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+
+
+def test_dns_cache_ttl(monkeypatch):
+    calls = []
+    fake_resolver(monkeypatch, ["10.0.0.1", "10.0.0.2", "10.0.0.1"], calls)
+    cache = DNSCache(ttl=60)
+    assert cache.resolve("example.test", 80) == ["10.0.0.1", "10.0.0.2"]
+    assert cache.resolve("example.test", 80) == ["10.0.0.1", "10.0.0.2"]
+    assert cache.resolve("127.0.0.1", 80) == ["127.0.0.1"]
+    assert calls == ["example.test"]
+
+    # Expired entries are looked up again
+    cache = DNSCache(ttl=0)
+    cache.resolve("example.test", 80)
+    cache.resolve("example.test", 80)
+    assert calls == ["example.test"] * 3
+
+
+def test_connections_reused():
+    counter = {}
+    collector = metrics.Metrics()
+    metrics.configure(collector)
+    session = make_session()
+    try:
+        with serve_site(counter=counter, pages=5, keep_alive=True) as base_url:
+            for number in range(5):
+                response = session.get(f"{base_url}/page/{number}", timeout=5)
+                assert response.status_code == 200
+    finally:
+        metrics.configure(None)
+        session.close()
+
+    assert counter["connections"] == 1
+    assert collector.snapshot()["connections"] == {"opened": 1, "reused": 4}
+
+
+def test_unreachable_address_skipped(monkeypatch):
+    calls = []
+    session = make_session()
+    try:
+        with serve_site(pages=3, keep_alive=True) as base_url:
+            port = base_url.rsplit(":", 1)[1]
+            # The server only listens on the second address
+            fake_resolver(monkeypatch, ["127.0.0.2", "127.0.0.1"], calls)
+            for number in range(3):
+                response = session.get(f"http://site.test:{port}/page/{number}")
+                assert response.status_code == 200
+    finally:
+        session.close()
+
+    # The addresses are then only looked up by urllib3 to build the sockets
+    assert calls.count("site.test") == 1
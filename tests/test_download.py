@@ -1,4 +1,5 @@
-from tools.download import generate_unique_filename
+from tools.download import generate_unique_filename, download_file
+from benchmarks.site import serve_site
 import os
 import shutil
 
@@ -20,3 +21,35 @@ def test_unique_name():
 
     assert len(generated_names) == iteration
     shutil.rmtree(download_directory)
+
+
+def test_streamed_download(tmp_path):
+    with serve_site(pages=3, image_size=300_000) as base_url:
+        assert download_file(str(tmp_path), f"{base_url}/img/2.png", chunk_size=4096)
+
+    assert os.listdir(tmp_path) == ["2.png"]
+    assert os.path.getsize(tmp_path / "2.png") == 300_000
+
+
+def test_download_larger_than_max_size(tmp_path):
+    with serve_site(pages=3, image_size=300_000) as base_url:
+        assert not download_file(str(tmp_path), f"{base_url}/img/2.png", 100_000)
+
+    # Neither the file nor its temporary file are left behind
+    assert os.listdir(tmp_path) == []
+
+
+def test_download_without_hard_links(tmp_path, monkeypatch):
+    def link(source, destination):
+        raise PermissionError(1, "Operation not permitted", destination)
+
+    monkeypatch.setattr(os, "link", link)
+    (tmp_path / "2.png").write_bytes(b"taken")
+    with serve_site(pages=3, image_size=1000) as base_url:
+        assert download_file(str(tmp_path), f"{base_url}/img/2.png")
+
+    # The file is saved under the next free name, without its temporary file
+    assert len(os.listdir(tmp_path)) == 2
+    assert (tmp_path / "2.png").read_bytes() == b"taken"
+    saved = [name for name in os.listdir(tmp_path) if name != "2.png"]
+    assert os.path.getsize(tmp_path / saved[0]) == 1000
@@ -0,0 +1,53 @@
+from tools.extract import LinkExtractor, extract_references, iter_references
+
+
+def test_same_references_in_chunks():
+    with open("assets/page.html", "r") as f:
+        webpage = f.read()
+
+    document, references = extract_references(webpage)
+    chunks = [webpage[i : i + 7] for i in range(0, len(webpage), 7)]
+
+    assert document is True
+    assert list(iter_references(chunks)) == references
+
+
+def test_references_emitted_before_the_end():
+    extractor = LinkExtractor()
+    assert extractor.feed("<!DOCTYPE html><html><body><a hr") == []
+    assert extractor.feed('ef="/a">A</a><img src="/b.png"><p>') == [
+        ("a", "href", "/a"),
+        ("img", "src", "/b.png"),
+    ]
+    assert extractor.document is True
+    assert extractor.close() == []
+
+
+def test_responsive_styled_and_meta_images():
+    page = """<!DOCTYPE html><html><head>
+    <meta property="og:image" content="https://42.fr/og.png">
+    <meta name="description" content="not-an-image.png">
+    <style>.hero { background: url('/hero.jpg') } .logo { background: url(logo.svg) }</style>
+    </head><body>
+    <picture>
+      <source srcset="/wide.webp 1200w, /narrow.webp 600w" type="image/webp">
+      <img src="/fallback.jpg" srcset="/small.jpg 1x, /large.jpg 2x">
+    </picture>
+    <div style="background-image: url(&quot;/tile.gif&quot;)"></div>
+    </body></html>"""
+
+    _, references = extract_references(page)
+    chunks = [page[i : i + 5] for i in range(0, len(page), 5)]
+
+    assert list(iter_references(chunks)) == references
+    assert set(references) == {
+        ("meta", "content", "https://42.fr/og.png"),
+        ("style", "url", "/hero.jpg"),
+        ("style", "url", "logo.svg"),
+        ("source", "srcset", "/wide.webp"),
+        ("source", "srcset", "/narrow.webp"),
+        ("img", "src", "/fallback.jpg"),
+        ("img", "srcset", "/small.jpg"),
+        ("img", "srcset", "/large.jpg"),
+        ("div", "style", "/tile.gif"),
+    }
@@ -0,0 +1,102 @@
+import os
+import struct
+from tools.download import fetch_file
+from tools.filters import FileFilter, image_dimensions, sniff_type
+from benchmarks.site import serve_site
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0\0\0\rIHDR" + struct.pack(">II", 640, 480)
+GIF = b"GIF89a" + struct.pack("<HH", 16, 16)
+BMP = b"BM" + b"\0" * 16 + struct.pack("<ii", 300, -200)
+WEBP = b"RIFF\0\0\0\0WEBPVP8X" + b"\0" * 8 + (99).to_bytes(3, "little") * 2
+# An APP0 segment, then a DHT segment which is not a frame, then a SOF2 frame
+JPEG = (
+    b"\xff\xd8"
+    + b"\xff\xe0\x00\x10JFIF\0"
+    + b"\0" * 9
+    + b"\xff\xc4\x00\x04\0\0"
+    + b"\xff\xc2\x00\x11\x08"
+    + struct.pack(">HH", 1080, 1920)
+)
+
+
+def test_image_dimensions():
+    assert image_dimensions(PNG) == (640, 480)
+    assert image_dimensions(GIF) == (16, 16)
+    assert image_dimensions(BMP) == (300, 200)
+    assert image_dimensions(WEBP) == (100, 100)
+    assert image_dimensions(JPEG) == (1920, 1080)
+    # Truncated or unknown heads have no dimensions
+    assert image_dimensions(PNG[:20]) is None
+    assert image_dimensions(b"\xff\xd8\xff\xe0") is None
+    assert image_dimensions(b"<html></html>") is None
+
+
+def test_check_head():
+    file_filter = FileFilter(min_dimensions=(32, 32), verify_type=True)
+    assert sniff_type(b"  <!DOCTYPE html><html>") == "html"
+    assert sniff_type(b'<?xml version="1.0"?>\n<svg>') == "svg"
+
+    assert file_filter.check_head("https://a.com/photo.png", PNG) is None
+    assert file_filter.check_head("https://a.com/icon.gif", GIF).startswith(
+        "dimensions:"
+    )
+    assert file_filter.check_head("https://a.com/photo.jpg", PNG) == (
+        "type: content is png, not jpeg"
+    )
+    assert file_filter.check_head("https://a.com/photo.png", b"<html>") == (
+        "type: content is html, not png"
+    )
+    # Only extensions expecting a type are checked, and text is not always
+    # recognized
+    assert file_filter.check_head("https://a.com/file", b"<html>") is None
+    assert file_filter.check_head("https://a.com/file.raw", b"\0\1") is None
+    assert file_filter.check_head("https://a.com/file.png", b"\0\1") is not None
+    assert file_filter.check_head("https://a.com/page.html", b"<html>") is None
+    assert file_filter.check_head("https://a.com/page.htm", b"<p>Hi</p>") is None
+    assert file_filter.check_head("https://a.com/notes.txt", b"notes") is None
+    assert file_filter.check_head("https://a.com/notes.txt", PNG) is not None
+
+
+def test_check_headers():
+    file_filter = FileFilter(min_bytes=1024, verify_type=True)
+    assert file_filter.check_headers(
+        "https://a.com/photo.png", {"content-length": "100"}
+    ).startswith("size:")
+    assert file_filter.check_headers(
+        "https://a.com/photo.png",
+        {"content-length": "2048", "content-type": "text/html; charset=utf-8"},
+    ) == ("type: served as text/html, not png")
+    assert (
+        file_filter.check_headers(
+            "https://a.com/photo.png", {"content-type": "image/png"}
+        )
+        is None
+    )
+    # The requested text files are accepted
+    for url, content_type in (
+        ("https://a.com/page.html", "text/html; charset=utf-8"),
+        ("https://a.com/notes.txt", "text/plain"),
+        ("https://a.com/download", "text/html"),
+    ):
+        headers = {"content-length": "2048", "content-type": content_type}
+        assert file_filter.check_headers(url, headers) is None
+    assert file_filter.check_headers(
+        "https://a.com/notes.txt", {"content-type": "text/html"}
+    ) == ("type: served as text/html, not text")
+
+
+def test_fetch_file_filtered(tmp_path):
+    with serve_site(pages=3, image_size=500) as base_url:
+        url = f"{base_url}/img/1.png"
+        result = fetch_file(str(tmp_path), url, file_filter=FileFilter(min_bytes=1000))
+        assert not result.saved
+        assert result.skipped == "size: smaller than 1000 bytes"
+
+        # The signature matches and the dimensions are unknown
+        file_filter = FileFilter(min_dimensions=(64, 64), verify_type=True)
+        result = fetch_file(str(tmp_path), url, chunk_size=16, file_filter=file_filter)
+        assert result.saved and result.skipped is None
+
+    # The bytes read by the filter are saved with the rest of the body
+    assert os.listdir(tmp_path) == ["1.png"]
+    assert os.path.getsize(tmp_path / "1.png") == 500
@@ -0,0 +1,52 @@
+from benchmarks.site import serve_site
+from tools.frontier import Frontier, prefer_files
+from tools.pipeline import run_pipeline
+from tools.scrape import PageResult, scrape_pages
+
+
+def test_breadth_first_order():
+    frontier = Frontier()
+    frontier.push("https://42.fr")
+    frontier.extend(["https://42.fr/b", "https://42.fr/a"], 2)
+    frontier.extend(["https://42.fr/c", "https://42.fr/a/"], 1)
+
+    order = [frontier.pop() for _ in range(len(frontier))]
+
+    assert order == [
+        ("https://42.fr", 0),
+        ("https://42.fr/c", 1),
+        ("https://42.fr/a", 2),
+        ("https://42.fr/b", 2),
+    ]
+
+
+def test_prefer_pages_linked_from_files():
+    frontier = Frontier(prefer_files, max_hops=2)
+    frontier.extend(["https://42.fr/text"], 1, PageResult("https://42.fr"))
+    gallery = PageResult("https://42.fr/gallery", files={"https://42.fr/a.png"})
+    frontier.extend(["https://42.fr/gallery/2"], 2, gallery)
+    frontier.extend(["https://42.fr/too/deep"], 3, gallery)
+
+    assert frontier.pop() == ("https://42.fr/text", 1)
+    assert frontier.pop() == ("https://42.fr/gallery/2", 2)
+    assert not frontier
+
+
+def test_pages_are_crawled_by_hop_depth():
+    with serve_site(pages=40, fanout=3) as base_url:
+        pages = list(scrape_pages(base_url, 5, max_hops=2))
+
+    # The root page, its 3 children and their 9 children, in that order
+    numbers = [int(page.url.rsplit("/", 1)[1]) for page in pages[1:]]
+    assert len(pages) == 13
+    assert pages[0].url == base_url
+    assert sorted(numbers[:3]) == [1, 2, 3]
+    assert sorted(numbers[3:]) == list(range(4, 13))
+
+
+def test_pipeline_max_hops(tmp_path):
+    with serve_site(pages=40, fanout=3) as base_url:
+        result = run_pipeline(base_url, 5, ["png"], str(tmp_path), max_hops=1)
+
+    assert len(result.pages) == 4
+    assert result.downloaded == 4
@@ -0,0 +1,77 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from benchmarks.site import SiteConfig, page_path, render_page, serve_site
+from tools import transport
+from tools.connections import make_session
+from tools.pipeline import run_pipeline
+
+
+def test_compressed_pages(tmp_path):
+    options = {"pages": 20, "fanout": 3, "markup": 100, "compress": True}
+    counter = {}
+    with serve_site(counter=counter, **options) as base_url:
+        result = run_pipeline(base_url, 5, ["png"], str(tmp_path), workers=(4, 1, 2))
+
+    # The pages are decoded as they are streamed to the parser
+    assert result.html_pages == 20
+    assert result.downloaded == 20
+    config = SiteConfig(**options)
+    page_bytes = sum(len(render_page(number, config)) for number in range(20))
+    assert counter["bytes"] < page_bytes / 5
+
+
+def test_http2_multiplexed(tmp_path):
+    pytest.importorskip("httpx")
+    pytest.importorskip("h2")
+    # pylint: disable-next=import-outside-toplevel
+    from benchmarks.h2site import serve_h2_site
+
+    counter = {}
+    transport.configure_connections(http2="prior-knowledge")
+    try:
+        with serve_h2_site(
+            counter=counter, pages=30, fanout=3, latency=0.01, redirect_every=7
+        ) as base_url:
+            result = run_pipeline(
+                base_url, 5, ["png"], str(tmp_path), workers=(8, 1, 4)
+            )
+    finally:
+        transport.configure_connections()
+
+    assert result.html_pages == 30
+    assert result.downloaded == 30
+    assert len(os.listdir(tmp_path)) == 30
+    # Every page and file was requested over a single connection
+    assert counter["connections"] == 1
+
+
+def test_http2_shared_by_threads(caplog):
+    pytest.importorskip("httpx")
+    pytest.importorskip("h2")
+    # pylint: disable-next=import-outside-toplevel
+    from benchmarks.h2site import serve_h2_site
+
+    # The traces logged between the steps of a request widen the windows in
+    # which threads sharing a connection could interleave
+    caplog.set_level(logging.DEBUG, logger="httpcore")
+
+    counter = {}
+    options = {"pages": 40, "markup": 20, "latency": 0.01}
+    config = SiteConfig(**options)
+    session = make_session(http2="prior-knowledge")
+    try:
+        with serve_h2_site(counter=counter, **options) as base_url:
+
+            def fetch(number: int) -> bytes:
+                return session.get(base_url + page_path(number), timeout=10).content
+
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                bodies = list(executor.map(fetch, list(range(40)) * 5))
+    finally:
+        session.close()
+
+    # Every stream of the connection got its own response
+    assert bodies == [render_page(number % 40, config) for number in range(200)]
+    assert counter["connections"] == 1
@@ -0,0 +1,42 @@
+from tools.matcher import FileMatcher
+from tools.scrape import extract_files
+
+
+def test_matches_path_suffix():
+    matcher = FileMatcher(["png", "JPG", ".tar.gz"])
+
+    assert matcher.matches("https://42.fr/a/image.png")
+    assert matcher.matches("https://42.fr/image.PNG?size=2#top")
+    assert matcher.matches("https://42.fr/photo.jpg")
+    assert matcher.matches("https://42.fr/archive.v1.tar.gz")
+    assert not matcher.matches("https://42.fr/archive.gz")
+    assert not matcher.matches("https://42.fr/png")
+    assert not matcher.matches("https://42.fr/image.png/view")
+    assert not matcher.matches("https://42.fr/page?file=image.png")
+    assert not matcher.matches("data:image/png;base64,iVBORw0KGgo=")
+
+
+def test_matcher_is_compiled_once():
+    matcher = FileMatcher.of(["png"])
+
+    assert FileMatcher.of(matcher) is matcher
+    assert not FileMatcher.of(None)
+
+
+def test_extract_files_from_every_reference():
+    references = [
+        ("a", "href", "/page"),
+        ("img", "srcset", "/large.png"),
+        ("source", "srcset", "https://cdn.42.fr/wide.png"),
+        ("meta", "content", "https://42.fr/og.png"),
+        ("div", "style", "tile.png"),
+    ]
+
+    files = extract_files(references, "https://42.fr/dir/", ["png"])
+
+    assert files == {
+        "https://42.fr/large.png",
+        "https://cdn.42.fr/wide.png",
+        "https://42.fr/og.png",
+        "https://42.fr/dir/tile.png",
+    }
@@ -0,0 +1,58 @@
+import json
+from benchmarks.site import serve_site
+from tools import metrics
+from tools.metrics import Histogram, Metrics, StatsWriter, prometheus_path
+from tools.pipeline import run_pipeline
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    assert histogram.percentile(50) is None
+    for value in [0.001] * 90 + [0.2] * 9 + [60]:
+        histogram.observe(value)
+
+    assert histogram.percentile(50) == 0.005
+    assert histogram.percentile(99) == 0.25
+    assert histogram.percentile(100) == float("inf")
+    assert histogram.to_dict()["buckets"]["+Inf"] == 1
+
+
+def test_prometheus_format():
+    collector = Metrics()
+    collector.increment("pages", 3)
+    collector.increment("errors", label='Conn"Error')
+    collector.observe("fetch_seconds", 0.02, "http://a.fr")
+    collector.gauge("queue_depth", lambda: 7, "fetch")
+    text = collector.to_prometheus()
+
+    assert "# TYPE spider_pages_total counter\nspider_pages_total 3\n" in text
+    assert 'spider_errors_total{class="Conn\\"Error"} 1' in text
+    assert 'spider_fetch_seconds_bucket{host="http://a.fr",le="0.01"} 0' in text
+    assert 'spider_fetch_seconds_bucket{host="http://a.fr",le="+Inf"} 1' in text
+    assert 'spider_fetch_seconds_count{host="http://a.fr"} 1' in text
+    assert 'spider_queue_depth{queue="fetch"} 7' in text
+    assert "spider_parse_seconds_count" not in text
+
+
+def test_crawl_metrics(tmp_path):
+    collector = Metrics()
+    metrics.configure(collector)
+    path = str(tmp_path / "stats.json")
+    try:
+        with serve_site(pages=20, fanout=3) as base_url:
+            with StatsWriter(collector, path, interval=0.05):
+                run_pipeline(base_url, 5, ["png"], str(tmp_path), (2, 1, 2))
+    finally:
+        metrics.configure(None)
+
+    with open(path, encoding="utf-8") as file:
+        stats = json.load(file)
+    assert stats["pages"] == 20
+    assert stats["files"] == 20
+    assert stats["bytes"] > 0 and stats["pages_per_second"] > 0
+    assert stats["responses"] == {"200": 40}
+    assert stats["fetch_seconds"][base_url]["count"] == 40
+    assert stats["parse_seconds"]["count"] == 20
+    assert stats["queue_depth"] == {}
+    with open(prometheus_path(path), encoding="utf-8") as file:
+        assert "spider_pages_total 20" in file.read()
@@ -0,0 +1,34 @@
+from tools.url_utils import normalize_url, parse_url
+
+
+def test_equivalent_urls_have_the_same_key():
+    variants = [
+        "https://github.com/louisabricot",
+        "HTTPS://GitHub.COM/louisabricot/",
+        "https://github.com:443/louisabricot",
+        "https://github.com/%6C%6Fuisabricot",
+        "https://github.com/a/../louisabricot/.",
+        "https://github.com/louisabricot#readme",
+    ]
+    assert set(normalize_url(url) for url in variants) == {
+        "https://github.com/louisabricot"
+    }
+
+
+def test_distinct_urls_keep_distinct_keys():
+    assert normalize_url("http://github.com/a") != normalize_url("https://github.com/a")
+    assert normalize_url("https://github.com:8443/a") == "https://github.com:8443/a"
+    assert normalize_url("https://github.com/a?b=1") == "https://github.com/a?b=1"
+    assert normalize_url("https://github.com/a%2fb") == "https://github.com/a%2Fb"
+
+
+def test_root_url():
+    url = parse_url("https://GitHub.com")
+
+    assert url.url == "https://github.com/"
+    assert url.key == "https://github.com"
+    assert url.depth == 0
+
+
+def test_parsed_urls_are_cached():
+    assert parse_url("https://github.com/a") is parse_url("https://github.com/a")
@@ -0,0 +1,38 @@
+from benchmarks.site import serve_site
+from tools.extract import extract_references
+from tools.parsepool import ParsePool
+from tools.pipeline import run_pipeline
+from tools.scrape import PageResult, parse_page
+
+
+def test_pool_parses_like_parse_page():
+    with open("assets/page.html", "rb") as file:
+        body = file.read()
+    extensions = ["png", "jpg", "svg"]
+
+    expected = PageResult("https://42.fr", html=True)
+    expected.document, expected.references = extract_references(body.decode())
+    parse_page(expected, "https://42.fr", 5, extensions)
+
+    with ParsePool(2, "https://42.fr", 5, extensions) as pool:
+        page = pool.parse(
+            PageResult("https://42.fr", html=True, body=body, encoding="utf-8")
+        )
+        not_html = pool.parse(PageResult("https://42.fr/a.txt", body=b"text"))
+
+    assert page.links == expected.links
+    assert page.files == expected.files
+    assert page.document and page.body == b""
+    assert not_html.links == set() and not_html.body == b""
+
+
+def test_pipeline_with_parse_processes(tmp_path):
+    counter = {}
+    with serve_site(counter=counter, pages=40, fanout=3) as base_url:
+        result = run_pipeline(
+            base_url, 5, ["png"], str(tmp_path), (4, 1, 2), parse_processes=2
+        )
+
+    assert len([page for page in result.pages if page.html]) == 40
+    assert result.downloaded == 40
+    assert set(counter.values()) == {1}
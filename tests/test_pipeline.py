@@ -0,0 +1,26 @@
+import os
+from benchmarks.site import serve_site
+from tools.pipeline import run_pipeline
+
+
+def test_pipeline_downloads_every_file(tmp_path):
+    counter = {}
+    with serve_site(counter=counter, pages=40, fanout=3) as base_url:
+        result = run_pipeline(
+            base_url, 5, ["png"], str(tmp_path), workers=(4, 2, 3), queue_size=2
+        )
+
+    assert len([page for page in result.pages if page.html]) == 40
+    assert len(result.files) == 40
+    assert result.downloaded == 40
+    assert len(os.listdir(tmp_path)) == 40
+    assert set(counter.values()) == {1}
+    assert result.first_download is not None
+
+
+def test_pipeline_depth_zero(tmp_path):
+    with serve_site(pages=40, fanout=3) as base_url:
+        result = run_pipeline(base_url, 0, ["png"], str(tmp_path))
+
+    assert len(result.pages) == 1
+    assert os.listdir(tmp_path) == ["0.png"]
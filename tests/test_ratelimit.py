@@ -0,0 +1,140 @@
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchmarks.site import serve_site
+from tools import transport
+from tools.download import fetch_file
+from tools.pipeline import run_pipeline
+from tools.ratelimit import (
+    RateLimiter,
+    TokenBucket,
+    parse_crawl_delay,
+    parse_retry_after,
+)
+
+
+def test_token_bucket_spaces_requests():
+    bucket = TokenBucket(rate=50)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+
+    # The first token is available at once, the 5 others every 20ms
+    assert time.monotonic() - start >= 0.09
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120
+    assert 25 < parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_parse_crawl_delay():
+    robots = [
+        "User-agent: googlebot",
+        "Crawl-delay: 10",
+        "",
+        "User-agent: *",
+        "Disallow: /private",
+        "Crawl-delay: 0.5  # seconds",
+    ]
+    assert parse_crawl_delay(robots) == 0.5
+    assert parse_crawl_delay(robots, "Googlebot/2.1") == 10
+    assert parse_crawl_delay(["User-agent: *", "Disallow:"]) is None
+
+
+def test_robots_txt_is_honored(tmp_path):
+    counter = {}
+    robots = "User-agent: *\nDisallow: /page/2\nCrawl-delay: 0.01\n"
+    limiter = RateLimiter()
+    transport.configure_rate_limit(limiter)
+    try:
+        with serve_site(counter=counter, pages=10, fanout=3, robots=robots) as base_url:
+            result = run_pipeline(base_url, 5, ["png"], str(tmp_path), (4, 1, 2))
+            host = limiter.host(base_url)
+    finally:
+        transport.configure_rate_limit(None)
+
+    # Page 2 and its children 7, 8 and 9 are not reachable
+    assert "/page/2" not in counter
+    assert len([page for page in result.pages if page.html]) == 6
+    assert counter["/robots.txt"] == 1
+    assert host.max_rate == 100
+
+
+def test_throttled_requests_are_sent_again(tmp_path):
+    counter = {}
+    limiter = RateLimiter(concurrency=4)
+    transport.configure_rate_limit(limiter)
+    try:
+        with serve_site(counter=counter, pages=10, fanout=3, throttle=3) as base_url:
+            result = run_pipeline(base_url, 5, ["png"], str(tmp_path), (4, 1, 2))
+            host = limiter.host(base_url)
+    finally:
+        transport.configure_rate_limit(None)
+
+    assert counter["429"] == 3
+    assert len(result.pages) == 10
+    assert result.downloaded == 10
+    # The host was slowed down
+    assert host.bucket.rate is not None
+
+
+class _SlowBodyHandler(BaseHTTPRequestHandler):
+    """Sends the headers at once and the body slowly, counting the bodies in flight."""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        server = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", "4")
+        self.end_headers()
+        self.wfile.flush()
+        with server.lock:
+            server.in_flight += 1
+            server.peak = max(server.peak, server.in_flight)
+        try:
+            for _ in range(4):
+                time.sleep(0.05)
+                self.wfile.write(b"x")
+                self.wfile.flush()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+def test_streamed_bodies_hold_their_host_slot(tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowBodyHandler)
+    server.lock, server.in_flight, server.peak = threading.Lock(), 0, 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    limiter = RateLimiter(concurrency=2, robots=False)
+    transport.configure_rate_limit(limiter)
+    try:
+        threads = [
+            threading.Thread(
+                target=fetch_file, args=(str(tmp_path), f"{base_url}/{number}.png")
+            )
+            for number in range(6)
+        ]
+        for fetch in threads:
+            fetch.start()
+        for fetch in threads:
+            fetch.join()
+    finally:
+        transport.configure_rate_limit(None)
+        server.shutdown()
+        server.server_close()
+
+    assert len(list(tmp_path.iterdir())) == 6
+    # Only two bodies were transferred at once, the others waited for a slot
+    assert server.peak == 2
+    # The latency covers the transfer of the body
+    assert limiter.host(base_url).latency >= 0.2
@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+from benchmarks.site import serve_site
+from tools.download import fetch_file
+from tools.pipeline import iter_crawl, run_pipeline
+from tools.records import FILE, PAGE, ManifestWriter
+from tools.state import CrawlState
+
+
+def test_iter_crawl_yields_records(tmp_path):
+    with serve_site(pages=40, fanout=3) as base_url:
+        records = list(
+            iter_crawl(base_url, 5, ["png"], str(tmp_path), workers=(4, 1, 2))
+        )
+
+    pages = [record for record in records if record.kind == PAGE]
+    files = [record for record in records if record.kind == FILE]
+    assert len(pages) == 40 and len(files) == 40
+    assert {record.status for record in records} == {200}
+    assert {record.depth for record in pages} == {0, 1, 2, 3}
+    root = next(record for record in pages if record.depth == 0)
+    assert root.links == 3 and root.files == 1 and root.bytes > 0
+    assert root.content_type.startswith("text/html")
+    assert all(os.path.exists(record.path) for record in files)
+    assert {record.bytes for record in files} == {1024}
+
+
+def test_closing_iter_crawl_stops_the_crawl(tmp_path):
+    counter = {}
+    with serve_site(counter=counter, pages=200, fanout=3) as base_url:
+        before = set(threading.enumerate())
+        records = iter_crawl(base_url, 10, ["png"], str(tmp_path))
+        next(records)
+        records.close()
+        # The threads of the crawl ended before close returned
+        crawling = [
+            thread
+            for thread in set(threading.enumerate()) - before
+            if thread.name.endswith(("_worker)", "(crawl)"))
+        ]
+
+    assert sum(counter.values()) < 100
+    assert crawling == []
+
+
+def test_closed_iter_crawl_resumes(tmp_path):
+    counter = {}
+    path = str(tmp_path / "state.db")
+    with serve_site(counter=counter, pages=200, fanout=3) as base_url:
+        state = CrawlState(path)
+        state.start(base_url, 10, resume=False)
+        records = iter_crawl(base_url, 10, ["png"], str(tmp_path), state=state)
+        next(records)
+        records.close()
+        # The crawl is over once the generator is closed
+        state.close()
+        stopped_after = sum(counter.values())
+
+        state = CrawlState(path)
+        state.start(base_url, 10, resume=True)
+        run_pipeline(base_url, 10, ["png"], str(tmp_path), state=state)
+    frontier, visited, _, _ = state.load()
+    state.close()
+
+    # The pages left by the closed crawl were fetched by the resumed one
+    pages = [url for url in counter if url == "/" or url.startswith("/page/")]
+    assert stopped_after < 100
+    assert len(pages) == 200
+    assert frontier == [] and len(visited) == 200
+
+
+def test_manifest_without_collecting(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    with serve_site(pages=10, fanout=3) as base_url:
+        with ManifestWriter(str(path)) as writer:
+            result = run_pipeline(
+                base_url,
+                5,
+                ["png"],
+                str(tmp_path),
+                on_record=writer.write,
+                collect=False,
+            )
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(lines) == 20 and writer.count == 20
+    assert result.pages == [] and result.files == set()
+    assert (result.html_pages, result.found_files, result.downloaded) == (10, 10, 10)
+    assert result.requests == 10
+
+
+def test_fetch_file_result(tmp_path):
+    with serve_site(pages=2, image_size=2048) as base_url:
+        result = fetch_file(str(tmp_path), f"{base_url}/img/1.png")
+        missing = fetch_file(str(tmp_path), f"{base_url}/img/5.png")
+
+    assert result.saved and result.status == 200 and result.size == 2048
+    assert result.content_type == "image/png" and result.seconds > 0
+    assert os.path.getsize(result.path) == 2048
+    assert not missing.saved and missing.status == 404 and missing.path is None
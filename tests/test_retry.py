@@ -0,0 +1,69 @@
+import time
+from benchmarks.site import serve_site
+from tools import transport
+from tools.pipeline import run_pipeline
+from tools.retry import MIN_TIMEOUT, RetryPolicy, backoff_delay
+
+
+def test_backoff_delay_grows_with_full_jitter():
+    delays = [backoff_delay(3, 0.5, 30) for _ in range(200)]
+    assert all(0 <= delay <= 4 for delay in delays)
+    assert max(delays) > 2
+    assert all(backoff_delay(20, 0.5, 30) <= 30 for _ in range(20))
+
+
+def test_timeout_adapts_to_host_latency():
+    policy = RetryPolicy()
+    url = "http://example.com/page"
+    assert policy.timeout(url, 5) == 5
+    for _ in range(30):
+        policy.tracker(url).record(0.01)
+    assert policy.timeout(url, 5) == MIN_TIMEOUT
+    # Hosts are tracked separately
+    assert policy.timeout("http://other.example.com/", 5) == 5
+
+    for _ in range(30):
+        policy.tracker(url).record(10.0)
+    assert policy.timeout(url, 5) == policy.max_timeout
+
+
+def test_dropped_connections_are_retried(tmp_path):
+    counter = {}
+    transport.configure_retries(RetryPolicy(backoff=0.01))
+    try:
+        with serve_site(counter=counter, pages=10, fanout=3, reset_every=4) as base_url:
+            result = run_pipeline(base_url, 5, ["png"], str(tmp_path), (4, 1, 2))
+    finally:
+        transport.configure_retries(None)
+
+    assert counter["reset"] >= 5
+    assert len(result.pages) == 10
+    assert result.downloaded == 10
+
+
+def test_dropped_connections_lose_pages_without_retries(tmp_path):
+    with serve_site(pages=10, fanout=3, reset_every=4) as base_url:
+        result = run_pipeline(base_url, 5, ["png"], str(tmp_path), (4, 1, 2))
+
+    assert result.downloaded < 10
+
+
+def test_slow_requests_are_hedged():
+    policy = RetryPolicy(hedge=True)
+    transport.configure_retries(policy)
+    try:
+        with serve_site(pages=10, tail_every=50, tail_latency=2.0) as base_url:
+            for _ in range(20):
+                transport.get(base_url, timeout=5).close()
+
+            slowest = 0
+            for _ in range(40):
+                start = time.monotonic()
+                transport.get(base_url, timeout=5).close()
+                slowest = max(slowest, time.monotonic() - start)
+    finally:
+        transport.configure_retries(None)
+
+    # The 50th request took 2 seconds, its hedge answered at once
+    assert policy.hedged >= 1
+    assert slowest < 1
@@ -0,0 +1,93 @@
+import os
+import sys
+import pytest
+import scorpio
+from scorpio import find_files, parse_files, read_file
+
+
+def make_tree(root):
+    for path in ["b.jpg", "a.PNG", "notes.txt", "sub/c.jpg", "sub/deeper/d.jpg"]:
+        os.makedirs(os.path.dirname(root / path), exist_ok=True)
+        (root / path).write_bytes(b"")
+
+
+def test_find_files(tmp_path):
+    make_tree(tmp_path)
+    extra = tmp_path / "notes.txt"
+
+    assert find_files([str(tmp_path)]) == [
+        str(tmp_path / name) for name in ["a.PNG", "b.jpg", "notes.txt"]
+    ]
+    # Files given are kept whatever the filters, in their order
+    assert find_files(
+        [str(extra), str(tmp_path), str(tmp_path / "missing")],
+        recursive=True,
+        extensions=["jpg", ".png"],
+    ) == [
+        str(extra),
+        str(tmp_path / "a.PNG"),
+        str(tmp_path / "b.jpg"),
+        str(tmp_path / "sub" / "c.jpg"),
+        str(tmp_path / "sub" / "deeper" / "d.jpg"),
+    ]
+    assert find_files([str(tmp_path)], recursive=True, patterns=["[bc].*"]) == [
+        str(tmp_path / "b.jpg"),
+        str(tmp_path / "sub" / "c.jpg"),
+    ]
+
+
+def test_parse_files_in_order(tmp_path, monkeypatch):
+    image = pytest.importorskip("PIL.Image")
+    # The workers log the files which are not images to scorpio.log
+    monkeypatch.chdir(tmp_path)
+    paths = []
+    for number in range(12):
+        path = tmp_path / f"{number:02}.png"
+        image.new("RGB", (number + 1, 10)).save(path)
+        paths.append(str(path))
+    paths.append(str(tmp_path / "notes.txt"))
+    (tmp_path / "notes.txt").write_text("not an image")
+
+    serial = list(parse_files(paths, thumbnail=False))
+    parallel = list(parse_files(paths, thumbnail=False, jobs=3))
+
+    assert [info["resolution"][0] for info in parallel[:-1]] == list(range(1, 13))
+    assert [info["filename"] for info in parallel] == [
+        info["filename"] for info in serial
+    ]
+    assert "format" not in parallel[-1]
+
+
+def test_options_do_not_swallow_files(tmp_path, monkeypatch, capsys):
+    pytest.importorskip("PIL.Image")
+    make_tree(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        sys, "argv", ["scorpio", "-r", "-e", "jpg", "-e", "png", "-g", "[ac].*", "."]
+    )
+    scorpio.parse()
+
+    # The directory following the options is parsed
+    names = [
+        line.split()[1]
+        for line in capsys.readouterr().out.splitlines()
+        if line.startswith("Filename")
+    ]
+    assert names == ["./a", os.path.join(".", "sub", "c")]
+
+
+def test_unwritable_thumbnail(tmp_path, monkeypatch, caplog):
+    image = pytest.importorskip("PIL.Image")
+    exifread = pytest.importorskip("exifread")
+    exif = image.Exif()
+    exif[0x010F] = "Camera"  # Make
+    image.new("RGB", (8, 8)).save(tmp_path / "photo.jpg", exif=exif.tobytes())
+    monkeypatch.setattr(
+        exifread, "process_file", lambda file: {"JPEGThumbnail": b"\xff\xd8"}
+    )
+    # The thumbnail cannot be written where a directory stands
+    (tmp_path / "photo_thumbnail.jpg").mkdir()
+
+    information = read_file(str(tmp_path / "photo.jpg"), thumbnail=True)
+    assert information["resolution"] == (8, 8)
+    assert "Could not write" in caplog.text
@@ -0,0 +1,34 @@
+from benchmarks.site import serve_site
+from tools.scrape import scrape_pages, scrape_urls
+from tools.pipeline import run_pipeline
+
+
+def test_each_page_is_fetched_once():
+    counter = {}
+    with serve_site(counter=counter, pages=30, fanout=3) as base_url:
+        pages = list(scrape_pages(base_url, 5, ["png"]))
+
+    page_requests = {path: n for path, n in counter.items() if "/img/" not in path}
+    assert len(page_requests) == 30
+    assert set(page_requests.values()) == {1}
+    assert sum(page.requests for page in pages) == 30
+
+    files = {file for page in pages for file in page.files}
+    assert len(files) == 30
+    assert f"{base_url}/img/29.png" in files
+
+
+def test_same_pages_as_scrape_urls(tmp_path):
+    with serve_site(pages=30, fanout=3) as base_url:
+        urls = scrape_urls(base_url, 5)
+        result = run_pipeline(base_url, 5, ["png"], str(tmp_path), workers=(8, 1, 4))
+
+    assert {page.url for page in result.pages if page.html} == urls
+
+
+def test_depth_zero_visits_base_url_only():
+    with serve_site(pages=30, fanout=3) as base_url:
+        pages = list(scrape_pages(base_url, 0, ["png"]))
+
+    assert len(pages) == 1
+    assert pages[0].files == {f"{base_url}/img/0.png"}
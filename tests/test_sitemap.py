@@ -0,0 +1,59 @@
+from benchmarks.site import serve_site
+from tools import transport
+from tools.pipeline import run_pipeline
+from tools.scrape import scrape_urls
+from tools.sitemap import parse_lastmod, sitemap_pages
+
+
+def test_parse_lastmod():
+    assert parse_lastmod("2023-10-02") == 1696204800
+    assert parse_lastmod("2023-10-02T08:00:00Z") == 1696204800 + 8 * 3600
+    assert parse_lastmod("2023-10-02T10:00:00+02:00") == 1696204800 + 8 * 3600
+    assert parse_lastmod("yesterday") is None
+    assert parse_lastmod(None) is None
+
+
+def test_sitemap_index_of_gzipped_sitemaps():
+    with serve_site(pages=30, fanout=0, sitemap=8) as base_url:
+        pages = list(sitemap_pages(base_url, 5))
+        scoped = list(sitemap_pages(base_url + "/page", 1))
+
+    assert len(pages) == 30
+    assert not any(unchanged for _, unchanged in pages)
+    assert (base_url + "/page/29", False) in pages
+    # Only the pages within the scope of the base URL are listed
+    assert len(scoped) == 29
+
+
+def test_sitemap_seeds_unlinked_pages(tmp_path):
+    (tmp_path / "linked").mkdir()
+    (tmp_path / "seeded").mkdir()
+    with serve_site(pages=30, fanout=0, sitemap=8) as base_url:
+        linked = run_pipeline(base_url, 5, ["png"], str(tmp_path / "linked"))
+        seeded = run_pipeline(
+            base_url, 5, ["png"], str(tmp_path / "seeded"), (4, 1, 2), sitemap=True
+        )
+        urls = scrape_urls(base_url, 5, sitemap=True)
+
+    assert len(linked.pages) == 1
+    assert len(seeded.pages) == 30
+    assert seeded.downloaded == 30
+    assert len(urls) == 30
+
+
+def test_unchanged_pages_are_skipped(tmp_path):
+    counter = {}
+    transport.configure_cache(str(tmp_path / "cache"))
+    try:
+        with serve_site(counter=counter, pages=30, fanout=0, sitemap=8) as base_url:
+            first = run_pipeline(base_url, 5, ["png"], str(tmp_path), sitemap=True)
+            second = run_pipeline(base_url, 5, ["png"], str(tmp_path), sitemap=True)
+    finally:
+        transport.configure_cache(None)
+
+    assert len(first.pages) == 30
+    assert first.unchanged == 0
+    # Only the base URL is fetched again, the other pages are older than their copy
+    assert len(second.pages) == 1
+    assert second.unchanged == 29
+    assert counter["/page/1"] == 1
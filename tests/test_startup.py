@@ -0,0 +1,39 @@
+import sys
+import subprocess
+from benchmarks.bench_startup import SRCS, parse_importtime
+
+# The dependencies only imported once a crawl starts or a file is parsed
+HEAVY = ["requests", "urllib3", "bs4", "validators", "httpx", "PIL", "exifread"]
+
+
+def test_entry_points_import_lazily():
+    code = (
+        "import sys, spider, scorpio; "
+        f"print(','.join(name for name in {HEAVY} if name in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=SRCS,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+    assert output.strip() == ""
+
+
+def test_parse_importtime():
+    output = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       100 |        100 |   _abc",
+            "import time:       200 |        300 | abc",
+            "import time:        50 |         50 | json",
+            "some other output",
+        ]
+    )
+
+    total, modules = parse_importtime(output)
+
+    assert total == 350
+    assert modules == {"_abc": 100, "abc": 300, "json": 50}
@@ -0,0 +1,57 @@
+import pytest
+from benchmarks.site import serve_site
+from tools.pipeline import run_pipeline
+from tools.state import CrawlState
+
+
+def test_completed_crawl_is_not_fetched_again(tmp_path):
+    counter = {}
+    state = CrawlState(str(tmp_path / "state.db"), batch_size=7)
+    with serve_site(counter=counter, pages=20, fanout=3) as base_url:
+        state.start(base_url, 5, resume=False)
+        first = run_pipeline(base_url, 5, ["png"], str(tmp_path), state=state)
+        requests = sum(counter.values())
+
+        state.start(base_url, 5, resume=True)
+        second = run_pipeline(base_url, 5, ["png"], str(tmp_path), state=state)
+    state.close()
+
+    assert first.downloaded == 20
+    assert second.downloaded == 0
+    assert second.pages == []
+    assert sum(counter.values()) == requests
+
+
+def test_resume_interrupted_crawl(tmp_path):
+    counter = {}
+    state = CrawlState(str(tmp_path / "state.db"))
+    with serve_site(counter=counter, pages=13, fanout=3) as base_url:
+        # The root page was visited, its image and children were not
+        state.start(base_url, 5, resume=False)
+        state.schedule([base_url])
+        state.visit(base_url)
+        state.add_files([f"{base_url}/img/0.png"])
+        state.schedule([f"{base_url}/page/1"])
+        state.close()
+
+        state = CrawlState(str(tmp_path / "state.db"))
+        state.start(base_url, 5, resume=True)
+        result = run_pipeline(base_url, 5, ["png"], str(tmp_path), state=state)
+    frontier, visited, files, downloaded = state.load()
+    state.close()
+
+    # Page 1 and its children 4, 5 and 6
+    assert len(result.pages) == 4
+    assert "/" not in counter
+    assert result.downloaded == 5
+    assert frontier == []
+    assert len(visited) == 5
+    assert files == downloaded
+
+
+def test_resume_another_crawl(tmp_path):
+    state = CrawlState(str(tmp_path / "state.db"))
+    state.start("https://42.fr", 5, resume=False)
+    with pytest.raises(ValueError):
+        state.start("https://example.com", 5, resume=True)
+    state.close()
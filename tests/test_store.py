@@ -0,0 +1,42 @@
+import json
+import os
+from benchmarks.site import serve_site
+from tools.download import download_file
+from tools.store import ContentStore
+
+
+def write(path, content):
+    with open(path, "wb") as file:
+        file.write(content)
+    return str(path)
+
+
+def test_identical_files_are_stored_once(tmp_path):
+    store = ContentStore(str(tmp_path / "store"))
+    digest = "ab" * 32
+    first = store.add("https://42.fr/a/logo.png", write(tmp_path / "1", b"x"), digest)
+    second = store.add("https://42.fr/b/logo.PNG", write(tmp_path / "2", b"x"), digest)
+    store.close()
+
+    assert first == second == str(tmp_path / "store" / "ab" / "ab" / f"{digest}.png")
+    assert not os.path.exists(tmp_path / "1") and not os.path.exists(tmp_path / "2")
+    with open(tmp_path / "store" / "manifest.jsonl", encoding="utf-8") as manifest:
+        urls = [json.loads(line)["url"] for line in manifest]
+    assert urls == ["https://42.fr/a/logo.png", "https://42.fr/b/logo.PNG"]
+
+    # The index is restored from the manifest
+    store = ContentStore(str(tmp_path / "store"))
+    assert store.contains(digest, ".png")
+    assert store.urls["https://42.fr/b/logo.PNG"] == digest
+    store.close()
+
+
+def test_download_to_store(tmp_path):
+    store = ContentStore(str(tmp_path))
+    with serve_site(pages=3) as base_url:
+        for _ in range(2):
+            assert download_file(str(tmp_path), f"{base_url}/img/1.png", store=store)
+    store.close()
+
+    digest = store.urls[f"{base_url}/img/1.png"]
+    assert os.listdir(tmp_path / digest[:2] / digest[2:4]) == [f"{digest}.png"]
@@ -0,0 +1,47 @@
+import json
+from benchmarks.suite import load_previous, report, run
+
+OPTIONS = {
+    "pages": 30,
+    "fanout": 3,
+    "depth": 2,
+    "latency": 0.0,
+    "image_size": 1024,
+    "redirect_every": 4,
+    "error_every": 5,
+    "concurrency": 2,
+    "files": 2,
+    "file_size": 4096,
+}
+
+
+def test_suite_runs_scenarios():
+    results = run(OPTIONS, ["scrape_urls", "download_file"])
+
+    # The pages of the first 2 levels, with their redirections and missing pages
+    assert results["scrape_urls"]["pages"] == 13
+    assert results["scrape_urls"]["requests"] == 13 + 3 + 2
+    assert results["download_file"]["requests"] == 2
+    assert results["download_file"]["mb_per_second"] > 0
+    assert results["download_file"]["peak_rss_mb"] > 0
+
+
+def test_suite_compares_with_previous_run(tmp_path):
+    history = tmp_path / "history.jsonl"
+    result = {
+        "pages_per_second": 50.0,
+        "mb_per_second": 2.0,
+        "peak_rss_mb": 30.0,
+        "requests": 10,
+    }
+    records = [
+        {"options": {**OPTIONS, "pages": 10}, "results": {}},
+        {"options": OPTIONS, "results": {"scrape_urls": result}},
+    ]
+    history.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+    previous = load_previous(str(history), OPTIONS)
+    lines = report({"scrape_urls": {**result, "pages_per_second": 55.0}}, previous)
+
+    assert "pages_per_second=55.0 (+10.0%)" in lines
+    assert "requests=10 (+0.0%)" in lines
@@ -0,0 +1,63 @@
+import argparse
+import pytest
+from benchmarks.site import serve_site
+from tools.parse_utils import rate_type
+from tools.pipeline import run_pipeline
+from tools.scrape import scrape_urls
+from tools.visited import (
+    BloomFilter,
+    FingerprintSet,
+    ScalableBloomFilter,
+    make_visited_set,
+)
+
+
+def urls(count, offset=0):
+    return [f"https://42.fr/page/{number}" for number in range(offset, offset + count)]
+
+
+def test_fingerprint_set_is_exact():
+    visited = FingerprintSet(capacity=16)
+    visited.update(urls(5000))
+    visited.add("https://42.fr/page/0")
+
+    assert len(visited) == 5000
+    assert all(url in visited for url in urls(5000))
+    assert not any(url in visited for url in urls(5000, 5000))
+
+
+def test_bloom_filter_grows_within_its_error_rate():
+    visited = ScalableBloomFilter(error_rate=0.01, initial_capacity=500)
+    visited.update(urls(10000))
+
+    false_positives = sum(url in visited for url in urls(10000, 10000))
+    assert all(url in visited for url in urls(10000))
+    assert false_positives / 10000 < 0.01
+
+
+def test_false_positive_rate_selects_the_structure():
+    assert isinstance(make_visited_set(), set)
+    assert isinstance(make_visited_set(1e-9), FingerprintSet)
+    assert isinstance(make_visited_set(1e-3), ScalableBloomFilter)
+    for rate in (0, 1, 5, -1e-9):
+        with pytest.raises(ValueError):
+            make_visited_set(rate)
+    with pytest.raises(ValueError):
+        BloomFilter(1000, 1.5)
+
+    assert rate_type("1e-3") == 0.001
+    for arg in ("0", "1", "5", "rate"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            rate_type(arg)
+
+
+def test_crawl_with_compact_visited_sets(tmp_path):
+    with serve_site(pages=30, fanout=3) as base_url:
+        expected = scrape_urls(base_url, 5)
+        assert scrape_urls(base_url, 5, false_positive_rate=1e-9) == expected
+        result = run_pipeline(
+            base_url, 5, ["png"], str(tmp_path), false_positive_rate=1e-9
+        )
+
+    assert len(result.pages) == 30
+    assert result.downloaded == 30
@@ -0,0 +1,169 @@
+import os
+import sqlite3
+import threading
+import time
+from benchmarks.site import serve_site
+from tools.workers import run_worker
+from tools.workqueue import FILE, PAGE, WorkQueue, shard_of
+
+
+def test_claim_and_complete(tmp_path):
+    work_queue = WorkQueue(str(tmp_path / "queue.db"))
+    work_queue.seed("https://42.fr")
+
+    assert work_queue.claim(10) == [("https://42.fr", PAGE, 0, "https://42.fr")]
+    assert work_queue.claim(10) == []
+    work_queue.complete(
+        "https://42.fr",
+        ["https://42.fr/a"],
+        ["https://42.fr/a.png"],
+        1,
+        "https://42.fr",
+    )
+
+    # Files are claimed first, and a URL is only queued once
+    assert [url for url, *_ in work_queue.claim(10)] == [
+        "https://42.fr/a.png",
+        "https://42.fr/a",
+    ]
+    work_queue.complete("https://42.fr/a", ["https://42.fr"], [], 2, "https://42.fr")
+    work_queue.complete("https://42.fr/a.png")
+    assert work_queue.remaining() == 0
+    assert work_queue.counts() == {(PAGE, 2): 2, (FILE, 2): 1}
+    work_queue.close()
+
+
+def test_remaining_urls_are_counted_by_shard(tmp_path):
+    work_queue = WorkQueue(str(tmp_path / "queue.db"))
+    work_queue.seed("https://42.fr")
+    work_queue.seed("https://42.fr")
+    assert work_queue.remaining() == 1
+
+    [(url, *_)] = work_queue.claim(10)
+    links = ["https://42.fr/a", "https://a.fr", "https://b.fr", "https://42.fr"]
+    work_queue.complete(url, links, [], 1, url)
+    work_queue.complete(url)
+    assert work_queue.remaining() == 3
+    with sqlite3.connect(tmp_path / "queue.db") as connection:
+        counts = dict(connection.execute("SELECT shard, remaining FROM shard_counts"))
+    assert counts[shard_of("https://42.fr")] == 1
+    assert counts[shard_of("https://a.fr")] == 1
+
+    # The three hosts are claimed in one batch
+    claimed = work_queue.claim(10)
+    assert len(claimed) == 3
+    for url, *_ in claimed:
+        work_queue.complete(url)
+    assert work_queue.remaining() == 0
+    work_queue.close()
+
+
+def test_host_is_leased_by_one_worker(tmp_path):
+    path = str(tmp_path / "queue.db")
+    first, second = WorkQueue(path, "first"), WorkQueue(path, "second")
+    first.seed("https://42.fr")
+    first.claim(1)
+    first.complete(
+        "https://42.fr",
+        ["https://42.fr/a", "https://42.fr/b"],
+        [],
+        1,
+        "https://42.fr",
+    )
+
+    assert second.claim(10) == []
+    assert len(first.claim(10)) == 2
+
+
+def test_stopped_worker_work_is_handed_out_again(tmp_path):
+    path = str(tmp_path / "queue.db")
+    stopped, other = WorkQueue(path, "stopped", 0.2), WorkQueue(path, "other", 0.2)
+    stopped.seed("https://42.fr")
+    assert len(stopped.claim(1)) == 1
+
+    assert other.claim(1) == []
+    time.sleep(0.3)
+    assert other.claim(1) == [("https://42.fr", PAGE, 0, "https://42.fr")]
+
+
+def test_shards_spread_over_workers(tmp_path):
+    path = str(tmp_path / "queue.db")
+    first, second = WorkQueue(path, "first"), WorkQueue(path, "second")
+    hosts = [f"https://{name}.fr" for name in ("a", "b", "c", "d")]
+    assert len({shard_of(host) for host in hosts}) == 4
+    for host in hosts:
+        first.seed(host)
+
+    assert len(first.claim(1)) == 1
+    # The second worker joins while the first one holds every host
+    assert second.claim(4) == []
+    first.claim(1)
+    assert len(second.claim(4)) == 2
+
+
+def test_workers_crawl_sites_together(tmp_path):
+    counters = [{}, {}, {}]
+    path = str(tmp_path / "queue.db")
+    with serve_site(counter=counters[0], pages=20, fanout=3) as first_url:
+        with serve_site(counter=counters[1], pages=20, fanout=3) as second_url:
+            with serve_site(counter=counters[2], pages=20, fanout=3) as third_url:
+                work_queue = WorkQueue(path)
+                for url in (first_url, second_url, third_url):
+                    work_queue.seed(url)
+                results = []
+                threads = [
+                    threading.Thread(
+                        target=lambda: results.append(
+                            run_worker(path, 5, ["png"], str(tmp_path), 2, 5.0)
+                        )
+                    )
+                    for _ in range(2)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+    assert sum(result.pages for result in results) == 60
+    assert sum(result.downloaded for result in results) == 60
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".png")]) == 60
+    for counter in counters:
+        assert set(counter.values()) == {1}
+    assert work_queue.remaining() == 0
+    work_queue.close()
+
+
+def test_renewed_work_is_not_handed_out_again(tmp_path):
+    path = str(tmp_path / "queue.db")
+    working, other = WorkQueue(path, "working", 0.2), WorkQueue(path, "other", 0.2)
+    working.seed("https://42.fr")
+    assert len(working.claim(1)) == 1
+
+    for _ in range(3):
+        time.sleep(0.1)
+        working.renew()
+    assert other.claim(1) == []
+
+
+def test_slow_work_keeps_its_lease(tmp_path):
+    counter = {}
+    path = str(tmp_path / "queue.db")
+    # Every request takes longer than the lease
+    with serve_site(counter=counter, pages=3, fanout=2, latency=0.3) as base_url:
+        WorkQueue(path).seed(base_url)
+        threads = [
+            threading.Thread(
+                target=run_worker,
+                args=(path, 5, ["png"], str(tmp_path), 1, 0.1),
+                daemon=True,
+            )
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        # Workers taking each other's work would never finish
+        for thread in threads:
+            thread.join(timeout=10)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert set(counter.values()) == {1}